@@ -1,49 +1,313 @@
 #!/usr/bin/env python3
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file
 import subprocess
 import uuid
 import threading
 import os
+import sys
+import glob
+import time
+import shutil
+import socket
+import fnmatch
+import json
+import signal
 
 app = Flask(__name__)
 SECRET_KEY = "mySecret123"
 tasks = {}
-# task.status ∈ {initializing, ready, running, finished, error}
-
-def run_command(cmd, workdir, prefix=""):
-    proc = subprocess.run(cmd, shell=True, cwd=workdir,
-                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    for stream, suffix in (("stdout", "output"), ("stderr", "error")):
-        data = getattr(proc, stream).decode("utf-8")
-        fname = f"{prefix + '_' if prefix else ''}{suffix}.log"
-        with open(os.path.join(workdir, fname), "w") as f:
-            f.write(data)
+# task.status ∈ {initializing, ready, armed, running, finished, error, cancelled, timeout}
+FINAL_STATUSES = ("finished", "error", "cancelled", "timeout")
+# Stopped tasks keep their partial output, for diagnosis.
+RESULT_STATUSES = ("finished", "cancelled", "timeout")
+captures = {}
+# capture.status ∈ {running, stopped}
+
+# The agent runs the orchestrator's /proc sampler from the same checkout,
+# and relays requests with the orchestrator's client.
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server")
+SAMPLER = os.path.join(SERVER_DIR, "sampler.py")
+sys.path.append(SERVER_DIR)
+from benchmark_api import AgentPool, OPERATIONS, DEFAULT_PORT
+from plugins import SUMMARY_FILE
+from reducer import reduce_dir
+from sampler import ProcReader, live_rates
+from profiles import ProfileManager, PROFILE_FILE, resolve as resolve_profile, issues as profile_issues
+
+# Node performance settings applied for tasks, restored after the last one.
+profiles = ProfileManager()
+
+API_PORT = int(os.environ.get("API_PORT", DEFAULT_PORT))
+
+# A stopped task's process group gets SIGTERM, then SIGKILL after KILL_GRACE seconds.
+KILL_GRACE = 5.0
+SSH = ["ssh", "-o", "StrictHostKeyChecking=no", "-o", "UserKnownHostsFile=/dev/null",
+       "-o", "BatchMode=yes", "-o", "ConnectTimeout=5"]
+
+# Event streams send at most this many new lines of a log per event.
+EVENT_LINES = 50
+
+# Armed launches sleep until this many seconds before their deadline, then spin.
+SPIN_MARGIN = 0.005
+
+# Phase timings are measured on the monotonic clock and reported as wall-clock
+# times through this offset, taken once at startup.
+CLOCK_OFFSET = time.time() - time.monotonic()
+
+# Hardware facts are read once; load, memory and disk are re-read at most every INVENTORY_TTL seconds.
+INVENTORY_TTL = 2.0
+inventory = {"static": None, "dynamic": None, "refreshed": 0.0}
+inventory_lock = threading.Lock()
+
+def parse_cpulist(cpulist):
+    """'0-3,8-11' -> [0, 1, 2, 3, 8, 9, 10, 11]"""
+    cpus = []
+    for part in cpulist.strip().split(","):
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.extend(range(int(lo), int(hi) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+def read_meminfo(keys):
+    values = {}
+    with open("/proc/meminfo") as f:
+        for line in f:
+            name, rest = line.split(":", 1)
+            if name in keys:
+                values[name] = int(rest.split()[0])
+    return values
+
+def static_inventory():
+    cpus = sorted(os.sched_getaffinity(0))
+    numa = []
+    for path in sorted(glob.glob("/sys/devices/system/node/node[0-9]*")):
+        with open(os.path.join(path, "cpulist")) as f:
+            node_cpus = parse_cpulist(f.read())
+        numa.append({"node": int(os.path.basename(path)[4:]), "cpus": node_cpus})
+    return {
+        "hostname": socket.gethostname(),
+        "cores": len(cpus),
+        "numa": numa or [{"node": 0, "cpus": cpus}],
+        "mem_total_kb": read_meminfo({"MemTotal"}).get("MemTotal", 0),
+    }
+
+def dynamic_inventory():
+    disk = shutil.disk_usage("/tmp")
+    return {
+        "load": list(os.getloadavg()),
+        "mem_available_kb": read_meminfo({"MemAvailable"}).get("MemAvailable", 0),
+        "disk_free_bytes": disk.free,
+    }
+
+def get_inventory():
+    with inventory_lock:
+        if inventory["static"] is None:
+            inventory["static"] = static_inventory()
+        now = time.monotonic()
+        if inventory["dynamic"] is None or now - inventory["refreshed"] > INVENTORY_TTL:
+            inventory["dynamic"] = dynamic_inventory()
+            inventory["refreshed"] = now
+        return dict(inventory["static"], **inventory["dynamic"])
+
+def run_command(cmd, workdir, prefix="", on_start=None, task=None, timeout=None):
+    """
+    Runs cmd in its own process group, so that stopping a task reaches every
+    process it started. Its output and error streams go straight to
+    <prefix_>output.log and <prefix_>error.log, where the event stream
+    follows them while it runs. With a task, the process is kept in
+    task["proc"] for cancellation, BENCH_TASK_ID is set in its environment
+    (mpirun exports it to the remote ranks), and after timeout seconds the
+    group is killed.
+    """
+    env = dict(os.environ, BENCH_TASK_ID=task["id"]) if task else None
+    out, err = (os.path.join(workdir, f"{prefix + '_' if prefix else ''}{suffix}.log")
+                for suffix in ("output", "error"))
+    with open(out, "wb") as stdout, open(err, "wb") as stderr:
+        proc = subprocess.Popen(cmd, shell=True, cwd=workdir, env=env, start_new_session=True,
+                                stdout=stdout, stderr=stderr)
+    if task is not None:
+        task["proc"] = proc
+        if task.get("stop_reason"):
+            kill_task(task)  # cancelled before the process existed
+    if on_start:
+        on_start()
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        task.setdefault("stop_reason", "timeout")
+        kill_task(task)
+        proc.wait()
     return proc
 
-def run_init(task_id, pre_cmd, workdir):
+def remote_hosts(task):
+    """Hosts of the task's hostfile, except loopback addresses."""
+    path = os.path.join(task["dir"], "hostfile.txt")
+    if not os.path.isfile(path):
+        return []
+    with open(path) as f:
+        hosts = [line.split()[0] for line in f if line.strip() and not line.startswith("#")]
+    return [h for h in dict.fromkeys(hosts) if h not in ("127.0.0.1", "localhost")]
+
+def kill_remote_ranks(task):
+    """
+    Kills, over ssh, the processes of the task on the hosts of its hostfile:
+    the MPI ranks carry BENCH_TASK_ID in their environment.
+    """
+    script = ("for f in /proc/[0-9]*/environ; do "
+              f"tr '\\0' '\\n' < $f 2>/dev/null | grep -qx BENCH_TASK_ID={task['id']} && "
+              "p=${f#/proc/} && kill -9 ${p%/environ}; done; true")
+    procs = [subprocess.Popen(SSH + [host, script], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+             for host in remote_hosts(task)]
+    for proc in procs:
+        try:
+            proc.wait(timeout=KILL_GRACE * 3)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+def kill_task(task):
+    """
+    Stops the task's process group: SIGTERM (mpirun forwards it to its
+    ranks), then SIGKILL after KILL_GRACE seconds, then the remote ranks.
+    """
+    proc = task.get("proc")
+    if proc is None or proc.poll() is not None:
+        return
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            break
+        deadline = time.monotonic() + KILL_GRACE
+        while proc.poll() is None and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if proc.poll() is not None:
+            break
+    kill_remote_ranks(task)
+
+def record_phase(task, phase, start, end=None):
+    """Appends [phase, start, end] (wall-clock seconds) to the task's timings."""
+    end = time.monotonic() if end is None else end
+    task.setdefault("timings", []).append([phase, start + CLOCK_OFFSET, end + CLOCK_OFFSET])
+
+def write_profile(task):
+    with open(os.path.join(task["dir"], PROFILE_FILE), "w") as f:
+        json.dump(task["profile"], f, indent=2)
+
+def apply_profile(task_id, profile):
+    """
+    Applies the task's performance profile and records the report in its
+    directory. Raises RuntimeError when a strict profile is not fully verified.
+    """
+    task = tasks[task_id]
+    start = time.monotonic()
+    report = profiles.apply(task_id, profile)
+    task["profile"] = report
+    write_profile(task)
+    record_phase(task, "profile", start)
+    if not report["ok"] and report["strict"]:
+        raise RuntimeError("Profile not applied: " + "; ".join(profile_issues(report)))
+
+def release_profile(task):
+    """
+    Restores the settings no other task holds, and records it in profile.json.
+    Only the first call releases: a cancelled task gets here both from the
+    cancel request and from its own thread.
+    """
+    profile = task.get("profile")
+    if profile is None or "restored" in profile:
+        return
+    profile["restored"] = {}
+    profile["restored"] = profiles.release(task["id"])
+    write_profile(task)
+
+def run_init(task_id, pre_cmd, workdir, profile=None, timeout=None):
+    task = tasks[task_id]
+    start = time.monotonic()
     try:
-        run_command(pre_cmd, workdir, prefix="pre_cmd_exec")
+        if pre_cmd.strip():
+            run_command(pre_cmd, workdir, prefix="pre_cmd_exec", task=task, timeout=timeout)
+        record_phase(task, "init", start)
+        if profile and not task.get("stop_reason"):
+            apply_profile(task_id, profile)
+        if task.get("stop_reason"):  # cancelled during the pre-command or the profile
+            release_profile(task)
+            task["status"] = task["stop_reason"]
+            return
         tasks[task_id]["status"] = "ready"
     except Exception as e:
+        release_profile(tasks[task_id])
         tasks[task_id]["status"] = "error"
         tasks[task_id]["error"] = str(e)
 
-def run_benchmark(task_id, cmd, workdir):
+def wait_until(deadline):
+    """
+    Sleeps until shortly before the wall-clock deadline, then busy-waits the
+    last SPIN_MARGIN seconds, which sleep() alone cannot hit precisely.
+    """
+    remaining = deadline - time.time()
+    if remaining > SPIN_MARGIN:
+        time.sleep(remaining - SPIN_MARGIN)
+    while time.time() < deadline:
+        pass
+
+def run_benchmark(task_id, cmd, workdir, start_at=None):
+    """Runs the task's command (at start_at when given), within its timeout if it has one."""
+    task = tasks[task_id]
+    started = []
+
+    def _started():
+        started.append(time.monotonic())
+        if start_at is not None:
+            task["start_offset"] = time.time() - start_at
+
     try:
-        run_command(cmd, workdir)
+        if start_at is not None:
+            armed = time.monotonic()
+            wait_until(start_at)
+            record_phase(task, "armed", armed)
+            if task.get("stop_reason"):
+                release_profile(task)
+                return
+            task["status"] = "running"
+        run_command(cmd, workdir, on_start=_started, task=task, timeout=task.get("timeout"))
+        record_phase(task, "run", started[0])
+        release_profile(task)
+        if task.get("stop_reason"):
+            task["status"] = task["stop_reason"]
+            return
+        if task.get("reduce"):
+            reduce_results(task)
         tasks[task_id]["status"] = "finished"
     except Exception as e:
+        release_profile(task)
         tasks[task_id]["status"] = "error"
         tasks[task_id]["error"] = str(e)
 
+def reduce_results(task):
+    """Writes the task's summary.json; a failed reduction leaves the raw results only."""
+    start = time.monotonic()
+    try:
+        extra = {"profile": task["profile"]} if "profile" in task else None
+        reduce_dir(task["dir"], task.get("collect"), extra)
+    except Exception as e:
+        task["reduce_error"] = str(e)
+    record_phase(task, "reduce", start)
+
 @app.route("/api/benchmark/init", methods=["POST"])
 def init_benchmark():
     data = request.get_json() or {}
     key = data.get("secret_key")
     pre_cmd = data.get("pre_cmd_exec", "") or ""
+    profile = data.get("profile")
 
     if key != SECRET_KEY:
         return jsonify(status="error", message="Invalid key"), 403
+    try:
+        resolve_profile(profile)
+    except ValueError as e:
+        return jsonify(status="error", message=str(e)), 400
 
     task_id = str(uuid.uuid4())
     task_dir = os.path.join("/tmp", task_id)
@@ -52,14 +316,15 @@ def init_benchmark():
     except Exception as e:
         return jsonify(status="error", message=f"Could not create dir: {e}"), 500
 
-    # No pre-cmd → immediate 'ready'
-    if not pre_cmd.strip():
-        tasks[task_id] = {"status": "ready", "dir": task_dir}
+    # No pre-cmd and no profile → immediate 'ready'
+    if not pre_cmd.strip() and not profile:
+        tasks[task_id] = {"status": "ready", "dir": task_dir, "id": task_id}
         return jsonify(status="accepted", task_id=task_id), 202
 
     # Otherwise spawn background init
-    tasks[task_id] = {"status": "initializing", "dir": task_dir}
-    threading.Thread(target=run_init, args=(task_id, pre_cmd, task_dir)).start()
+    tasks[task_id] = {"status": "initializing", "dir": task_dir, "id": task_id}
+    threading.Thread(target=run_init, args=(task_id, pre_cmd, task_dir, profile,
+                                            data.get("timeout"))).start()
     return jsonify(status="accepted", task_id=task_id), 202
 
 @app.route("/api/benchmark/launch", methods=["POST"])
@@ -80,32 +345,211 @@ def launch_benchmark():
     if task["status"] != "ready":
         return jsonify(status="error", message=f"Not ready ({task['status']})"), 400
 
-    tasks[task_id].update(status="running", command=cmd)
-    threading.Thread(target=run_benchmark, args=(task_id, cmd, task["dir"])).start()
+    # With start_at (epoch seconds) the task is armed and fires at that time.
+    start_at = data.get("start_at")
+    if start_at is not None:
+        start_at = float(start_at)
+    tasks[task_id].update(status="armed" if start_at is not None else "running", command=cmd,
+                          collect=data.get("collect"), reduce=bool(data.get("reduce")),
+                          timeout=float(data["timeout"]) if data.get("timeout") else None)
+    threading.Thread(target=run_benchmark, args=(task_id, cmd, task["dir"], start_at)).start()
     return jsonify(status="accepted", task_id=task_id), 202
 
+@app.route("/api/benchmark/cancel", methods=["POST"])
+def cancel_benchmark():
+    """
+    Stops a task: an armed or ready task never starts, an initializing or
+    running one has its process group killed. The task ends as 'cancelled'.
+    """
+    data = request.get_json() or {}
+    if data.get("secret_key") != SECRET_KEY:
+        return jsonify(status="error", message="Invalid key"), 403
+    task = tasks.get(data.get("task_id"))
+    if not task:
+        return jsonify(status="error", message="Task ID not found"), 404
+    if task["status"] in FINAL_STATUSES:
+        return jsonify(status="accepted", task_id=data["task_id"], state=task["status"])
+    task.setdefault("stop_reason", "cancelled")
+    if task["status"] in ("ready", "armed"):
+        release_profile(task)
+        task["status"] = "cancelled"
+    else:
+        threading.Thread(target=kill_task, args=(task,)).start()
+    return jsonify(status="accepted", task_id=data["task_id"], state=task["status"])
+
 @app.route("/api/benchmark/status/<tid>", methods=["GET"])
 def status(tid):
     t = tasks.get(tid)
     if not t:
         return jsonify(status="not found", message="Task ID not found"), 404
-    return jsonify(task_id=tid, status=t["status"])
+    extra = {k: t[k] for k in ("start_offset", "timings") if k in t}
+    if "profile" in t and not t["profile"]["ok"]:
+        extra["profile_issues"] = profile_issues(t["profile"])
+    return jsonify(task_id=tid, status=t["status"], **extra)
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def new_lines(task, offsets, final=False):
+    """
+    Complete lines added to the task's logs since the last call, per file,
+    and the unterminated last line too when final. offsets keeps the
+    position reached in each file.
+    """
+    out = {}
+    for path in sorted(glob.glob(os.path.join(task["dir"], "*.log"))):
+        start = offsets.get(path, 0)
+        try:
+            with open(path, "rb") as f:
+                f.seek(start)
+                chunk = f.read()
+        except OSError:
+            continue
+        end = len(chunk) if final else chunk.rfind(b"\n") + 1
+        if end:
+            offsets[path] = start + end
+            lines = chunk[:end].decode("utf-8", errors="replace").splitlines()
+            out[os.path.basename(path)] = lines
+    return out
+
+def stream_events(task, interval):
+    """
+    Yields the task's events until it ends: 'state' on every status change,
+    'output' with the new lines of each log (the last EVENT_LINES, with the
+    count of those skipped), 'sample' with the node's resource use.
+    """
+    reader = ProcReader()
+    offsets, last_status, prev = {}, None, None
+    try:
+        while True:
+            status = task["status"]
+            if status != last_status:
+                last_status = status
+                yield sse("state", {"status": status, "time": time.time(),
+                                    "timings": task.get("timings", [])})
+            for fn, lines in new_lines(task, offsets, status in FINAL_STATUSES).items():
+                yield sse("output", {"file": fn, "lines": lines[-EVENT_LINES:],
+                                     "skipped": max(0, len(lines) - EVENT_LINES)})
+            sample = reader.sample()
+            if prev is not None:
+                yield sse("sample", live_rates(prev, sample))
+            prev = sample
+            if status in FINAL_STATUSES:
+                return
+            time.sleep(interval)
+    finally:
+        reader.close()
+
+@app.route("/api/benchmark/events/<tid>", methods=["GET"])
+def events(tid):
+    """Server-sent events of a task (see stream_events), every ?interval= seconds."""
+    t = tasks.get(tid)
+    if not t:
+        return jsonify(status="not found", message="Task ID not found"), 404
+    interval = max(0.1, float(request.args.get("interval", 1.0)))
+    return Response(stream_events(t, interval), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"})
 
 @app.route("/api/benchmark/results/<tid>", methods=["GET"])
 def results(tid):
     t = tasks.get(tid)
     if not t:
         return jsonify(status="not found", message="Task ID not found"), 404
-    if t["status"] != "finished":
+    if t["status"] not in RESULT_STATUSES:
         return jsonify(status="error", message="Benchmark not finished"), 400
 
+    # Only the files matching the task's collect patterns, when it has some,
+    # or the ones requested with ?files=a,b (on-demand fetch after a summary).
+    patterns = t.get("collect")
+    if request.args.get("files"):
+        patterns = request.args["files"].split(",")
     out = []
     for fn in sorted(os.listdir(t["dir"])):
         path = os.path.join(t["dir"], fn)
+        if fn == SUMMARY_FILE or (patterns and fn != PROFILE_FILE
+                                  and not any(fnmatch.fnmatch(fn, p) for p in patterns)):
+            continue
         if os.path.isfile(path):
-            with open(path) as f:
+            with open(path, errors="replace") as f:
                 out.append({"filename": fn, "content": f.read()})
-    return jsonify(task_id=tid, status="finished", results=out)
+    return jsonify(task_id=tid, status="finished", state=t["status"], results=out)
+
+@app.route("/api/benchmark/summary/<tid>", methods=["GET"])
+def summary(tid):
+    t = tasks.get(tid)
+    if not t:
+        return jsonify(status="not found", message="Task ID not found"), 404
+    if t["status"] != "finished":
+        return jsonify(status="error", message="Benchmark not finished"), 400
+    path = os.path.join(t["dir"], SUMMARY_FILE)
+    if not os.path.isfile(path):
+        return jsonify(status="error", message=t.get("reduce_error", "No summary for this task")), 404
+    with open(path) as f:
+        return jsonify(task_id=tid, status="finished", summary=json.load(f))
+
+@app.route("/api/health", methods=["GET"])
+def health():
+    running = sum(1 for t in tasks.values() if t["status"] in ("initializing", "running"))
+    return jsonify(status="ok", tasks=len(tasks), running=running, inventory=get_inventory())
+
+@app.route("/api/metrics/start", methods=["POST"])
+def start_metrics():
+    data = request.get_json() or {}
+    if data.get("secret_key") != SECRET_KEY:
+        return jsonify(status="error", message="Invalid key"), 403
+    interval = float(data.get("interval", 1.0))
+
+    capture_id = str(uuid.uuid4())
+    path = os.path.join("/tmp", f"metrics_{capture_id}.bin")
+    try:
+        proc = subprocess.Popen(
+            [sys.executable, SAMPLER, path, "--interval", str(interval), "--align"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+    except Exception as e:
+        return jsonify(status="error", message=f"Could not start sampler: {e}"), 500
+    captures[capture_id] = {"status": "running", "proc": proc, "path": path}
+    return jsonify(status="accepted", capture_id=capture_id), 202
+
+@app.route("/api/metrics/stop", methods=["POST"])
+def stop_metrics():
+    data = request.get_json() or {}
+    if data.get("secret_key") != SECRET_KEY:
+        return jsonify(status="error", message="Invalid key"), 403
+    c = captures.get(data.get("capture_id"))
+    if not c:
+        return jsonify(status="error", message="Capture ID not found"), 404
+    if c["status"] == "running":
+        c["proc"].terminate()
+        c["proc"].wait()
+        c["status"] = "stopped"
+    return jsonify(capture_id=data.get("capture_id"), status=c["status"])
+
+@app.route("/api/metrics/<cid>", methods=["GET"])
+def get_metrics(cid):
+    c = captures.get(cid)
+    if not c:
+        return jsonify(status="not found", message="Capture ID not found"), 404
+    if c["status"] != "stopped" or not os.path.isfile(c["path"]):
+        return jsonify(status="error", message="Capture not stopped"), 400
+    return send_file(c["path"], mimetype="application/octet-stream")
+
+@app.route("/api/relay/<operation>", methods=["POST"])
+def relay(operation):
+    """
+    Forwards one operation to a batch of nodes and returns their answers in
+    order: { requests: [{ node, ...parameters }] } -> { responses: [...] }
+    """
+    data = request.get_json() or {}
+    if data.get("secret_key") != SECRET_KEY:
+        return jsonify(status="error", message="Invalid key"), 403
+    if operation not in OPERATIONS:
+        return jsonify(status="error", message=f"Unknown operation '{operation}'"), 404
+    items = data.get("requests") or []
+    if any("node" not in r for r in items):
+        return jsonify(status="error", message="Every request needs a node"), 400
+    return jsonify(status="ok", responses=AgentPool(SECRET_KEY).call(operation, items))
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else API_PORT
+    app.run(host="0.0.0.0", port=port, threaded=True)
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Node performance profiles, applied by the agent around a benchmark.
+
+A profile is a mapping of settings, given inline in a benchmark's 'profile'
+or by the name of one of the PRESETS:
+  governor       cpufreq scaling governor of every CPU ("performance", ...)
+  thp            transparent huge pages mode ("always", "madvise", "never")
+  thp_defrag     transparent huge pages defrag mode
+  irq_affinity   CPU list that device IRQs are steered to, away from the
+                 benchmark CPUs (IRQs that refuse a new affinity are left alone)
+  drop_caches    true: sync and drop the page cache, dentries and inodes
+  isolated_cpus  CPU list expected in the kernel's isolated set (checked
+                 only: isolcpus cannot change at runtime)
+  stray          process names that must not be running (true: STRAY_DEFAULT)
+  kill_stray     true: kill the stray processes found
+  strict         true: a setting that cannot be applied or verified fails the task
+
+Every setting is read back after it is written. The report (requested,
+previous and applied values, verified or not) is written to profile.json in
+the task directory, which is returned with the results. Previous values are
+restored when the last task that holds a setting releases it, so tasks
+sharing a node share its state instead of undoing each other's changes.
+
+Usage:
+    python3 profiles.py                 prints the current values of the settings
+    python3 profiles.py PRESET|JSON     applies a profile, prints the report, restores
+"""
+import os
+import re
+import sys
+import glob
+import json
+import signal
+import threading
+
+SYSFS = "/sys"
+PROCFS = "/proc"
+PROFILE_FILE = "profile.json"
+STRAY_DEFAULT = ["xhpl", "NPmpi", "mpirun", "orted", "prted", "stream", "osu_latency", "osu_bw"]
+
+PRESETS = {
+    # Throughput benchmarks (HPL, STREAM): fixed clocks, huge pages, cold cache.
+    "throughput": {"governor": "performance", "thp": "always", "drop_caches": True,
+                   "stray": True},
+    # Latency benchmarks (NetPIPE, OSU): fixed clocks, no THP compaction stalls.
+    "latency": {"governor": "performance", "thp": "never", "thp_defrag": "never",
+                "drop_caches": True, "stray": True},
+}
+
+BRACKET_RE = re.compile(r"\[(\w+)\]")
+
+
+def _read(path: str) -> str:
+    with open(path) as f:
+        return f.read().strip()
+
+
+def _write(path: str, value: str):
+    with open(path, "w") as f:
+        f.write(str(value))
+
+
+def _selected(text: str) -> str:
+    """'always [madvise] never' -> 'madvise'"""
+    m = BRACKET_RE.search(text)
+    return m.group(1) if m else text
+
+
+class FileSetting:
+    """A setting stored in one or more kernel files that take the same value."""
+
+    def __init__(self, pattern: str, parse=lambda text: text, partial_ok: bool = False):
+        self.pattern = pattern
+        self.parse = parse
+        self.partial_ok = partial_ok  # some files may refuse the value (per-CPU IRQs)
+
+    def paths(self):
+        return sorted(glob.glob(self.pattern))
+
+    def read(self) -> dict:
+        values = {}
+        for path in self.paths():
+            try:
+                values[path] = self.parse(_read(path))
+            except OSError:
+                continue
+        return values
+
+    def write(self, values: dict) -> list:
+        """Writes {path: value}. :return: the errors, one string per failed path."""
+        errors = []
+        for path, value in values.items():
+            try:
+                _write(path, value)
+            except OSError as e:
+                errors.append(f"{path}: {e.strerror or e}")
+        return errors
+
+
+def _cpulist(text: str) -> str:
+    return text.strip()
+
+
+SETTINGS = {
+    "governor": FileSetting(os.path.join(SYSFS, "devices/system/cpu/cpu[0-9]*/cpufreq/scaling_governor")),
+    "thp": FileSetting(os.path.join(SYSFS, "kernel/mm/transparent_hugepage/enabled"), _selected),
+    "thp_defrag": FileSetting(os.path.join(SYSFS, "kernel/mm/transparent_hugepage/defrag"), _selected),
+    "irq_affinity": FileSetting(os.path.join(PROCFS, "irq/[0-9]*/smp_affinity_list"), _cpulist,
+                                partial_ok=True),
+}
+
+
+def resolve(profile) -> dict:
+    """A preset name or a mapping (which may extend a preset with 'preset': name)."""
+    if not profile:
+        return {}
+    if isinstance(profile, str):
+        if profile not in PRESETS:
+            raise ValueError(f"Unknown profile '{profile}' (presets: {', '.join(PRESETS)})")
+        return dict(PRESETS[profile], name=profile)
+    profile = dict(profile)
+    base = profile.pop("preset", None)
+    if base:
+        return dict(resolve(base), **profile)
+    return profile
+
+
+def stray_processes(names) -> list:
+    """[(pid, name)] of the running processes whose name is in names, except this agent."""
+    own = {os.getpid(), os.getppid()}
+    found = []
+    for comm in glob.glob(os.path.join(PROCFS, "[0-9]*", "comm")):
+        pid = int(comm.split(os.sep)[-2])
+        try:
+            name = _read(comm)
+        except OSError:
+            continue
+        if name in names and pid not in own:
+            found.append((pid, name))
+    return found
+
+
+def drop_caches() -> dict:
+    os.sync()
+    try:
+        _write(os.path.join(PROCFS, "sys/vm/drop_caches"), "3")
+    except OSError as e:
+        return {"requested": True, "applied": False, "verified": False, "error": e.strerror or str(e)}
+    return {"requested": True, "applied": True, "verified": True}
+
+
+class ProfileManager:
+    """Applies profiles for tasks and restores the settings after the last one."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.holders = {}  # setting -> set of task ids
+        self.saved = {}    # setting -> {path: previous value}
+
+    def _apply_setting(self, task_id, name, value) -> dict:
+        setting = SETTINGS[name]
+        current = setting.read()
+        entry = {"requested": value, "previous": sorted(set(current.values()))}
+        if not current:
+            entry.update(applied=False, verified=False, error="not available on this node")
+            return entry
+        if name not in self.saved:
+            self.saved[name] = current
+        elif any(v != str(value) for v in current.values()):
+            entry["conflict"] = "changed while held by another task"
+        self.holders.setdefault(name, set()).add(task_id)
+        errors = setting.write({path: value for path in current})
+        after = setting.read()
+        matching = sum(1 for v in after.values() if v == str(value))
+        entry["applied"] = matching > 0
+        entry["verified"] = matching == len(after) or (setting.partial_ok and matching > 0)
+        if setting.partial_ok:
+            entry["coverage"] = f"{matching}/{len(after)}"
+        if errors and not entry["verified"]:
+            entry["error"] = errors[0] if len(errors) == 1 else f"{errors[0]} (+{len(errors) - 1} more)"
+        return entry
+
+    def apply(self, task_id: str, profile) -> dict:
+        """
+        Applies a profile for a task.
+        :return: the report; report['ok'] is False when a setting was not verified.
+        :raises ValueError: for an unknown preset or setting.
+        """
+        profile = resolve(profile)
+        unknown = set(profile) - set(SETTINGS) - {"name", "drop_caches", "isolated_cpus",
+                                                  "stray", "kill_stray", "strict"}
+        if unknown:
+            raise ValueError(f"Unknown profile setting(s): {', '.join(sorted(unknown))}")
+        report = {"name": profile.get("name", "custom"), "settings": {}, "checks": {}}
+        with self._lock:
+            for name in SETTINGS:
+                if name in profile:
+                    report["settings"][name] = self._apply_setting(task_id, name, profile[name])
+        if profile.get("drop_caches"):
+            report["settings"]["drop_caches"] = drop_caches()
+        if "isolated_cpus" in profile:
+            path = os.path.join(SYSFS, "devices/system/cpu/isolated")
+            actual = _read(path) if os.path.exists(path) else ""
+            report["checks"]["isolated_cpus"] = {"requested": profile["isolated_cpus"], "actual": actual,
+                                                 "verified": actual == str(profile["isolated_cpus"])}
+        if profile.get("stray"):
+            names = STRAY_DEFAULT if profile["stray"] is True else list(profile["stray"])
+            found = stray_processes(names)
+            if found and profile.get("kill_stray"):
+                for pid, _ in found:
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except OSError:
+                        pass
+                found = stray_processes(names)
+            report["checks"]["stray"] = {"found": [f"{name}({pid})" for pid, name in found],
+                                         "verified": not found}
+        entries = list(report["settings"].values()) + list(report["checks"].values())
+        report["ok"] = all(e.get("verified") for e in entries)
+        report["strict"] = bool(profile.get("strict"))
+        return report
+
+    def release(self, task_id: str) -> dict:
+        """
+        Drops the task's hold on its settings and restores those no task holds anymore.
+        :return: {setting: True when restored and read back identical}
+        """
+        restored = {}
+        with self._lock:
+            for name, holders in list(self.holders.items()):
+                if task_id not in holders:
+                    continue
+                holders.discard(task_id)
+                if holders:
+                    continue
+                saved = self.saved.pop(name)
+                del self.holders[name]
+                setting = SETTINGS[name]
+                setting.write(saved)
+                after = setting.read()
+                same = [after.get(path) == value for path, value in saved.items()]
+                restored[name] = any(same) if setting.partial_ok else all(same)
+        return restored
+
+
+def issues(report: dict) -> list:
+    """Short descriptions of the settings and checks that were not verified."""
+    out = []
+    for section in ("settings", "checks"):
+        for name, entry in report.get(section, {}).items():
+            if not entry.get("verified"):
+                detail = entry.get("error") or entry.get("found") or entry.get("actual")
+                out.append(f"{name}: {detail}" if detail else name)
+    return out
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 1:
+        for name, setting in SETTINGS.items():
+            values = sorted(set(setting.read().values()))
+            print(f"{name:<14} {', '.join(values) if values else 'n/a'}")
+        sys.exit(0)
+    arg = sys.argv[1]
+    manager = ProfileManager()
+    report = manager.apply("cli", json.loads(arg) if arg.startswith("{") else arg)
+    print(json.dumps(report, indent=2))
+    print("Restored:", manager.release("cli"))
@@ -2,6 +2,10 @@ import os
 import re
 import sys
 import glob
+import numpy as np
+
+from stats import summarize
+from windows import detect_windows
 
 # ========================= NPdata Classes ============================
 class NPdata:
@@ -99,6 +103,23 @@ class NPInstance:
             
         return NPdata(col1=avg_col1, col2=avg_col2, col3=avg_col3)
 
+    def write_confidence(self, file_path: str, n_resamples: int = 2000, confidence: float = 0.95):
+        """
+        Writes the median and bootstrap confidence interval of bandwidth and latency
+        for each of the 124 rows, next to the averages.
+        Columns: size, bw_median, bw_low, bw_high, lat_median, lat_low, lat_high.
+        :raises Exception: if no NPdata objects are available.
+        """
+        if not self.benchmarks:
+            raise ValueError("No NPdata benchmarks to compute confidence intervals from.")
+        sizes = self.benchmarks[0].col1
+        columns = [sizes]
+        for attr in ("col2", "col3"):
+            stacked = np.array([getattr(npdata, attr) for npdata in self.benchmarks])
+            s = summarize(stacked, percentiles=(), n_resamples=n_resamples, confidence=confidence)
+            columns.extend([s["median"], s["ci_low"], s["ci_high"]])
+        np.savetxt(file_path, np.column_stack(columns), fmt="%.8g")
+
 
 # ===================== Collectl Data Classes ==========================
 class CollectlData:
@@ -111,6 +132,8 @@ class CollectlData:
         """
         self.cputotals = []  # List of values (one per sample)
         self.meminfo_used = []  # List of values (one per sample)
+        self.net_in = []  # 'nettotals.kbin' values, when exported
+        self.net_out = []  # 'nettotals.kbout' values, when exported
         self.load_from_file(file_path)
 
     def load_from_file(self, file_path: str):
@@ -135,9 +158,20 @@ class CollectlData:
                     self.cputotals.append(value)
                 elif key == "meminfo.used":
                     self.meminfo_used.append(value)
+                elif key == "nettotals.kbin":
+                    self.net_in.append(value)
+                elif key == "nettotals.kbout":
+                    self.net_out.append(value)
         if len(self.cputotals) != len(self.meminfo_used):
             raise ValueError(f"Mismatch in sample count between cputotals.total and meminfo.used in {file_path}")
 
+    def active_window(self) -> slice:
+        """
+        Detects the samples recorded while the benchmark was running.
+        :return: A slice over the sample lists.
+        """
+        return detect_windows(self.cputotals, self.meminfo_used, self.net_in, self.net_out).active
+
 
 class CollectlInstance:
     def __init__(self):
@@ -148,27 +182,48 @@ class CollectlInstance:
         """Adds a CollectlData object to the instance."""
         self.collectl_data_list.append(cdata)
     
+    def active_runs(self):
+        """
+        Restricts every run to its detected benchmark window.
+        :return: Two lists with one list of samples per run: (cputotals, meminfo)
+        """
+        windows = [cd.active_window() for cd in self.collectl_data_list]
+        cputotals = [cd.cputotals[w] for cd, w in zip(self.collectl_data_list, windows)]
+        meminfo = [cd.meminfo_used[w] for cd, w in zip(self.collectl_data_list, windows)]
+        return cputotals, meminfo
+
     def compute_line_by_line_averages(self):
         """
         Computes line-by-line averages for both metrics across all runs.
-        Uses the minimum sample count among the files to avoid index errors.
+        Each run is restricted to its detected benchmark window, so the runs are
+        aligned on the benchmark start; the shortest window sets the sample count.
         :return: Two lists: (avg_cputotals, avg_meminfo)
         """
         if not self.collectl_data_list:
             return None, None
 
-        # Use the minimum number of samples across all files
-        num_samples = min(len(cd.cputotals) for cd in self.collectl_data_list)
+        cputotals, meminfo = self.active_runs()
+
+        # Use the minimum number of active samples across all files
+        num_samples = min(len(values) for values in cputotals)
         avg_cputotals = []
         avg_meminfo = []
         for i in range(num_samples):
-            avg_total = sum(cd.cputotals[i] for cd in self.collectl_data_list) / len(self.collectl_data_list)
-            avg_mem = sum(cd.meminfo_used[i] for cd in self.collectl_data_list) / len(self.collectl_data_list)
+            avg_total = sum(values[i] for values in cputotals) / len(cputotals)
+            avg_mem = sum(values[i] for values in meminfo) / len(meminfo)
             avg_cputotals.append(avg_total)
             avg_meminfo.append(avg_mem)
         return avg_cputotals, avg_meminfo
 
 
+def write_collectl(file_path: str, cputotals, meminfo):
+    """Writes CPU and memory samples in the collectl lexpr format read back by graphs_2.py."""
+    with open(file_path, "w") as f:
+        for cpu, mem in zip(cputotals, meminfo):
+            f.write(f"cputotals.total {cpu}\n")
+            f.write(f"meminfo.used {mem}\n")
+
+
 # ======================= Folder Processing Function ======================
 def process_folder(base_dir: str):
     print(f"\nProcessing base directory: {base_dir}")
@@ -190,6 +245,9 @@ def process_folder(base_dir: str):
             np_output_path = os.path.join(base_dir, "np-averages.out")
             avg_np_data.write(np_output_path)
             print(f"Wrote NP averages to '{np_output_path}'")
+            np_ci_path = os.path.join(base_dir, "np-averages.ci")
+            np_instance.write_confidence(np_ci_path)
+            print(f"Wrote NP confidence intervals to '{np_ci_path}'")
         except Exception as e:
             print(f"Failed to compute/store NP averages for {base_dir}: {e}")
 
@@ -211,13 +269,18 @@ def process_folder(base_dir: str):
         else:
             collectl_output_path = os.path.join(base_dir, "collectl-averages.out")
             try:
-                with open(collectl_output_path, "w") as f:
-                    for i in range(len(avg_cputotals)):
-                        f.write(f"cputotals.total {avg_cputotals[i]}\n")
-                        f.write(f"meminfo.used {avg_meminfo[i]}\n")
+                write_collectl(collectl_output_path, avg_cputotals, avg_meminfo)
                 print(f"Wrote collectl averages to '{collectl_output_path}'")
             except Exception as e:
                 print(f"Failed to write collectl averages for {base_dir}: {e}")
+            # The windowed runs, for confidence intervals across runs (graphs_2.py)
+            for i, (cpu, mem) in enumerate(zip(*collectl_instance.active_runs()), 1):
+                run_path = os.path.join(base_dir, f"collectl-run-{i}.out")
+                try:
+                    write_collectl(run_path, cpu, mem)
+                    print(f"Wrote collectl run {i} to '{run_path}'")
+                except Exception as e:
+                    print(f"Failed to write collectl run {i} for {base_dir}: {e}")
 
 
 # ======================= New Main Routine =============================
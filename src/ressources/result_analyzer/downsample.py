@@ -0,0 +1,70 @@
+"""
+downsample.py
+
+Largest-Triangle-Three-Buckets (LTTB) downsampling for long time-series.
+
+The first and last points are kept, the rest is split into n_out - 2 buckets
+and, in each bucket, the point forming the largest triangle with the point
+kept in the previous bucket and the centroid of the next bucket is selected.
+Peaks and troughs therefore survive, unlike with plain decimation or
+averaging.
+
+Buckets are laid out as a padded (buckets, width) index matrix so that the
+centroids and every candidate's coordinates are gathered with a few NumPy
+operations. Only the choice of the anchor point is sequential: the loop runs
+once per output point, not per input sample, so plotting cost stays flat as
+traces grow.
+"""
+
+import numpy as np
+
+
+def lttb_indices(x, y, n_out: int) -> np.ndarray:
+    """
+    Selects the indices of the points kept by LTTB.
+    :param x: 1-D array of increasing abscissae (e.g. timestamps).
+    :param y: 1-D array of values, same length as x.
+    :param n_out: Number of points to keep (at least 3).
+    :return: Sorted index array of length min(n_out, len(x)).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = x.size
+    if y.size != n:
+        raise ValueError("x and y must have the same length.")
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    if n_out < 3:
+        raise ValueError("n_out must be at least 3.")
+
+    # Bucket i covers [edges[i], edges[i + 1]) over the points 1 .. n-2.
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    counts = np.diff(edges)
+    idx = edges[:-1, None] + np.arange(counts.max())
+    idx = np.minimum(idx, edges[1:, None] - 1)  # pad with the bucket's last point
+    bx, by = x[idx], y[idx]
+
+    # Centroid of the following bucket; the last bucket looks at the last point.
+    cx = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    cy = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    cx = np.append(cx[1:], x[-1])
+    cy = np.append(cy[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - cx[i]) * (by[i] - ay) - (ax - bx[i]) * (cy[i] - ay))
+        a = idx[i, np.argmax(area)]
+        selected[i + 1] = a
+    return selected
+
+
+def lttb(x, y, n_out: int):
+    """
+    Downsamples (x, y) to at most n_out points with LTTB.
+    :return: Two arrays (x_out, y_out).
+    """
+    keep = lttb_indices(x, y, n_out)
+    return np.asarray(x, dtype=float)[keep], np.asarray(y, dtype=float)[keep]
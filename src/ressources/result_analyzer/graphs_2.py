@@ -1,8 +1,13 @@
 import os
 import sys
+import glob
 import numpy as np
 import matplotlib.pyplot as plt
 
+from downsample import lttb
+from stats import center_and_errors
+from windows import detect_windows
+
 # ----------------------------------------------------------------------------
 # Configuration
 # ----------------------------------------------------------------------------
@@ -30,10 +35,14 @@ def ensure_dir(directory):
 class CollectlMetric:
     def __init__(self, file_path: str):
         """
-        Reads a file and extracts 'cputotals.total' and 'meminfo.used' values.
+        Reads a file and extracts 'cputotals.total', 'meminfo.used' and,
+        when present, 'nettotals.kbin'/'nettotals.kbout' values.
         """
+        self.time = []
         self.cpu = []
         self.memory = []
+        self.net_in = []
+        self.net_out = []
         self._load(file_path)
 
     def _load(self, file_path: str):
@@ -49,33 +58,62 @@ class CollectlMetric:
                     value = float(val)
                 except ValueError:
                     continue
-                if key == "cputotals.total":
+                if key == "sample.time":
+                    self.time.append(value)
+                elif key == "cputotals.total":
                     self.cpu.append(value)
                 elif key == "meminfo.used":
                     self.memory.append(value)
+                elif key == "nettotals.kbin":
+                    self.net_in.append(value)
+                elif key == "nettotals.kbout":
+                    self.net_out.append(value)
+
+    def window(self) -> slice:
+        """
+        Returns the benchmark window of the samples. Only raw traces (with
+        'sample.time' entries) are windowed: the averaged files written by
+        analyzer.py are already restricted to it.
+        """
+        if not self.time:
+            return slice(0, len(self.cpu))
+        return detect_windows(self.cpu, self.memory, self.net_in, self.net_out).active
+
+    def active(self):
+        """
+        Returns the CPU and memory samples of the benchmark window.
+        """
+        window = self.window()
+        return self.cpu[window], self.memory[window]
+
+    def elapsed(self):
+        """
+        Returns the time of each sample in seconds from the first one. Files
+        without 'sample.time' entries (e.g. averaged files) use one sample per second.
+        """
+        if len(self.time) == len(self.cpu) and self.time:
+            return np.asarray(self.time) - self.time[0]
+        return np.arange(len(self.cpu), dtype=float)
 
 
-def process_values(values):
+def system_runs(vm_path, key):
     """
-    Generic processing: average and symmetric errors.
+    Returns the trace files of a system in a VM folder: one per run
+    ('<system>-metrics-<run>.out', from the collectl-run-<run>.out files of
+    analyzer.py) or, without them, the single '<system>-metrics.out'.
     """
-    if not values:
-        return None, None, None
-    avg = np.mean(values)
-    err_low = avg - min(values)
-    err_high = max(values) - avg
-    return avg, err_low, err_high
+    runs = sorted(glob.glob(os.path.join(glob.escape(vm_path), f"{key}-metrics-*.out")))
+    single = os.path.join(vm_path, f"{key}-metrics.out")
+    return runs or ([single] if os.path.exists(single) else [])
 
 
-def process_cpu(values, threshold_factor=0.9):
+def process_values(runs):
     """
-    Process CPU values by keeping those >= threshold*max.
+    Generic processing: median over the runs and errors to its 95% confidence
+    interval across runs. A single (e.g. already averaged) trace gets no interval.
     """
-    if not values:
-        return None, None, None
-    max_val = max(values)
-    cleaned = [v for v in values if v >= threshold_factor * max_val]
-    return process_values(cleaned)
+    return center_and_errors(runs)
+
 
 # ----------------------------------------------------------------------------
 # Graph generation
@@ -105,16 +143,11 @@ def generate_resource_graphs(resources_dir, out_dir):
             mem_dict = {}
             for fname in ACCEPTED_FILES:
                 key = fname.replace("-metrics.out", "")
-                file_path = os.path.join(vm_path, fname)
-                if os.path.exists(file_path):
-                    try:
-                        m = CollectlMetric(file_path)
-                        cpu_dict[key] = process_cpu(m.cpu)
-                        mem_dict[key] = process_values(m.memory)
-                    except Exception:
-                        cpu_dict[key] = (None, None, None)
-                        mem_dict[key] = (None, None, None)
-                else:
+                try:
+                    runs = [CollectlMetric(path).active() for path in system_runs(vm_path, key)]
+                    cpu_dict[key] = process_values([cpu for cpu, _ in runs])
+                    mem_dict[key] = process_values([memory for _, memory in runs])
+                except Exception:
                     cpu_dict[key] = (None, None, None)
                     mem_dict[key] = (None, None, None)
 
@@ -146,7 +179,7 @@ def generate_resource_graphs(resources_dir, out_dir):
             )
         ax.set_xticks(x + width * (n_sys - 1) / 2)
         ax.set_xticklabels(labels, rotation=45, ha='right')  # rotate labels to prevent overlap
-        ax.set_ylabel("CPU Average (%)")
+        ax.set_ylabel("CPU Median (%), 95% CI")
         ax.set_title(f"CPU Metrics for {cfg}")
         ax.yaxis.grid(True)
         # Adjust bottom margin and legend
@@ -176,7 +209,7 @@ def generate_resource_graphs(resources_dir, out_dir):
             )
         ax.set_xticks(x + width * (n_sys - 1) / 2)
         ax.set_xticklabels(labels, rotation=45, ha='right')  # rotate labels
-        ax.set_ylabel("Memory Average")
+        ax.set_ylabel("Memory Median, 95% CI")
         ax.set_title(f"Memory Metrics for {cfg}")
         ax.yaxis.grid(True)
         fig.subplots_adjust(bottom=0.25)
@@ -187,15 +220,95 @@ def generate_resource_graphs(resources_dir, out_dir):
         plt.close()
         print(f"Saved Memory graph: {mem_out}")
 
+
+def generate_timeseries_graphs(resources_dir, out_dir, max_points=1000):
+    """
+    Plots the CPU and memory time-series of every configuration, one line per
+    VM folder and system. Each series is reduced to max_points with LTTB before
+    rendering, and the detected benchmark window of raw traces is shaded.
+    """
+    configs = sorted([
+        d for d in os.listdir(resources_dir)
+        if os.path.isdir(os.path.join(resources_dir, d)) and d != "graphs"
+    ])
+    cmap = plt.get_cmap("tab10")
+
+    for cfg in configs:
+        cfg_path = os.path.join(resources_dir, cfg)
+        fig, (ax_cpu, ax_mem) = plt.subplots(2, 1, figsize=(12, 8), sharex=True)
+        plotted = 0
+        for vm in sorted(os.listdir(cfg_path)):
+            vm_path = os.path.join(cfg_path, vm)
+            if not os.path.isdir(vm_path):
+                continue
+            for fname in ACCEPTED_FILES:
+                file_path = os.path.join(vm_path, fname)
+                if not os.path.exists(file_path):
+                    continue
+                try:
+                    m = CollectlMetric(file_path)
+                except Exception as e:
+                    print(f"Skipping '{file_path}' due to error: {e}")
+                    continue
+                if not m.cpu:
+                    continue
+                key = fname.replace("-metrics.out", "")
+                label = f"{vm} {DISPLAY_MAP.get(key, key)}"
+                color = cmap(plotted % 10)
+                t = m.elapsed()
+                window = m.window()
+                for ax, values in ((ax_cpu, m.cpu), (ax_mem, m.memory)):
+                    if len(values) != len(t):
+                        continue
+                    x, y = lttb(t, values, max_points)
+                    ax.plot(x, y, linewidth=1, color=color, label=label)
+                    if m.time and window.stop > window.start:
+                        ax.axvspan(t[window.start], t[window.stop - 1], color=color, alpha=0.08)
+                plotted += 1
+
+        if not plotted:
+            plt.close()
+            print(f"No time-series data for {cfg}.")
+            continue
+
+        ax_cpu.set_ylabel("CPU (%)")
+        ax_cpu.set_title(f"Resource usage over time for {cfg}")
+        ax_cpu.legend(loc='upper left', bbox_to_anchor=(1.0, 1), fontsize='small')
+        ax_mem.set_ylabel("Memory used")
+        ax_mem.set_xlabel("Time (s)")
+        for ax in (ax_cpu, ax_mem):
+            ax.grid(True)
+        plt.tight_layout(rect=[0, 0, 0.98, 1])
+        ts_out = os.path.join(out_dir, f"{cfg}_timeseries.png")
+        plt.savefig(ts_out, dpi=300)
+        plt.close()
+        print(f"Saved time-series graph: {ts_out}")
+
 # ----------------------------------------------------------------------------
 # Main
 # ----------------------------------------------------------------------------
+USAGE = "Usage: python graphs_2.py /path/to/resources_metrics [--timeseries] [--points=N]"
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python resource_graphs.py /path/to/resources_metrics")
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if len(args) < 1:
+        print(USAGE)
         sys.exit(1)
+    points = 1000
+    for a in sys.argv[1:]:
+        if a.startswith("--points="):
+            value = a.split("=", 1)[1]
+            # LTTB keeps the first and last points, plus at least one between them
+            if not value.isdigit() or int(value) < 3:
+                print(f"Invalid --points value '{value}': expected an integer of at least 3.")
+                print(USAGE)
+                sys.exit(1)
+            points = int(value)
 
-    resources_dir = sys.argv[1]
+    resources_dir = args[0]
     out_dir = os.path.join(resources_dir, "graphs")
     ensure_dir(out_dir)
-    generate_resource_graphs(resources_dir, out_dir)
\ No newline at end of file
+    if "--timeseries" in sys.argv:
+        generate_timeseries_graphs(resources_dir, out_dir, max_points=points)
+    else:
+        generate_resource_graphs(resources_dir, out_dir)
\ No newline at end of file
@@ -47,6 +47,25 @@ def load_np_file(file_path):
         data.append(row)
     return np.array(data)
 
+def load_ci_file(out_file_path):
+    """
+    Loads the confidence interval file written by analyzer.py next to an averages
+    file (same name, '.ci' extension), if there is one.
+    Columns: size, bw_median, bw_low, bw_high, lat_median, lat_low, lat_high.
+    Returns a numpy array of shape (rows, 7), or None when no valid file exists.
+    """
+    ci_path = os.path.splitext(out_file_path)[0] + ".ci"
+    if not os.path.isfile(ci_path):
+        return None
+    try:
+        data = np.loadtxt(ci_path, ndmin=2)
+    except ValueError:
+        return None
+    return data if data.shape[1] == 7 else None
+
+# Columns of the .ci file holding the (median, low, high) of each data_index.
+CI_COLUMNS = {1: (1, 2, 3), 2: (4, 5, 6)}
+
 # ----------------------------------------------------------------------------
 # Shared Data Classes
 # ----------------------------------------------------------------------------
@@ -181,7 +200,9 @@ def plot_config_graph(config, base_dir, out_dir, data_index, y_label):
       - data_index=1 for performance (expected units: Mbps)
       - data_index=2 for latency (expected units: usec)
 
-    Each data series gets a unique color for better readability.
+    Each data series gets a unique color for better readability. When a '.ci'
+    file sits next to a '.out' file, the series is its median, drawn with the
+    bootstrap confidence interval of the median as a shaded band.
     """
     fig, ax = plt.subplots(figsize=(10, 6))
     config_path = os.path.join(base_dir, config)
@@ -229,9 +250,18 @@ def plot_config_graph(config, base_dir, out_dir, data_index, y_label):
                 label = f"{file_base} {folder}"
             color = color_mapping.get(label, "blue")
 
+            # The band is the interval of the median: plot the median with it
+            ci = load_ci_file(file_path)
+            band = ci is not None and data_index in CI_COLUMNS and len(ci) == len(x)
+            if band:
+                center_col, low_col, high_col = CI_COLUMNS[data_index]
+                y = ci[:, center_col]
             # Plot with lines only, explicitly setting marker to None
             ax.plot(x, y, linewidth=2, 
                     color=color, label=label, alpha=0.9, marker=None)
+            if band:
+                ax.fill_between(x, ci[:, low_col], ci[:, high_col],
+                                color=color, alpha=0.2, linewidth=0)
             plotted = True
 
     if not plotted:
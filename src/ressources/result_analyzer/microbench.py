@@ -0,0 +1,233 @@
+"""
+microbench.py
+
+Microbenchmarks for the analysis and graphing hot paths, on synthetic data:
+  np_parse          analyzer.NPdata.load_from_file on one NetPIPE table
+  np_aggregate      NPInstance.compute_averages over the tables of a campaign
+  collectl_parse    analyzer.CollectlData.load_from_file on one lexpr log
+  process_folder    analyzer.process_folder on a whole campaign tree
+  render            graphs_generator plot_config_graph on one configuration
+
+The generator writes NetPIPE tables (124 rows, like np.out), collectl lexpr
+logs (idle, benchmark and idle phases, so window detection has work to do)
+and campaign trees with the handler's <cluster>_<run>/<benchmark>/ layout.
+Sizes are set on the command line, and the data is seeded so that two runs
+time the same input.
+
+Each case is repeated and reported with its best and median time and a
+throughput. Results go to a JSON file along with the git commit, so runs can
+be compared across commits.
+
+Usage:
+    python microbench.py [--clusters 4] [--runs 5] [--benchmarks 2] [--samples 600]
+                         [--series 6] [--repeat 5] [--only np_parse ...]
+                         [--output microbench.json]
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "graphs_generator"))
+
+import analyzer
+import tools
+
+NP_ROWS = 124
+COLLECTL_KEYS = ["cputotals.user", "cputotals.sys", "cputotals.idle", "cputotals.total",
+                 "meminfo.used", "meminfo.free", "nettotals.kbin", "nettotals.kbout"]
+
+
+# ========================= Synthetic Data ============================
+def write_np_table(path: str, rng: np.random.Generator):
+    """Writes a NetPIPE-like table: message size, bandwidth (Mbps), latency (usec)."""
+    sizes = np.unique(np.round(np.logspace(0, 23, NP_ROWS * 2)))[:NP_ROWS]
+    sizes = np.concatenate([sizes, sizes[-1] + np.arange(1, NP_ROWS - len(sizes) + 1)])
+    latency = (2.0 + sizes / 1.2e3) * rng.normal(1.0, 0.03, NP_ROWS)
+    bandwidth = sizes * 8 / latency
+    with open(path, "w") as f:
+        for row in zip(sizes, bandwidth, latency):
+            f.write("%.8g %.8g %.8g\n" % row)
+
+
+def write_collectl_log(path: str, samples: int, rng: np.random.Generator):
+    """
+    Writes a collectl lexpr log with an idle lead-in, a loaded middle and an
+    idle tail, one block of keys per sample.
+    """
+    busy = np.zeros(samples, dtype=bool)
+    busy[samples // 5: samples - samples // 5] = True
+    cpu = np.where(busy, rng.normal(85, 5, samples), rng.normal(3, 1, samples)).clip(0, 100)
+    mem = np.where(busy, 6.0e6, 2.0e6) + rng.normal(0, 2e4, samples)
+    net = np.where(busy, rng.normal(9.0e5, 3e4, samples), rng.normal(10, 3, samples)).clip(0)
+    t0 = 1.7e9
+    with open(path, "w") as f:
+        f.write("waiting for 1 second sample...\n")
+        for i in range(samples):
+            values = {"cputotals.user": cpu[i] * 0.8, "cputotals.sys": cpu[i] * 0.2,
+                      "cputotals.idle": 100 - cpu[i], "cputotals.total": cpu[i],
+                      "meminfo.used": mem[i], "meminfo.free": 8.0e6 - mem[i],
+                      "nettotals.kbin": net[i], "nettotals.kbout": net[i]}
+            f.write(f"sample.time {t0 + i:.3f}\n")
+            for key in COLLECTL_KEYS:
+                f.write(f"{key} {values[key]:.0f}\n")
+
+
+def make_campaign(root: str, clusters: int, runs: int, benchmarks: int, samples: int,
+                  seed: int = 0) -> list:
+    """
+    Creates a campaign tree under root: <cluster>_<run>/ with a collectl.log
+    and one <benchmark>/np.out per benchmark.
+    :return: the list of cluster names.
+    """
+    rng = np.random.default_rng(seed)
+    names = [f"cluster{c}" for c in range(1, clusters + 1)]
+    for name in names:
+        for run in range(1, runs + 1):
+            run_dir = os.path.join(root, f"{name}_{run}")
+            for b in range(1, benchmarks + 1):
+                bench_dir = os.path.join(run_dir, f"{b}_10_0_0_{b}")
+                os.makedirs(bench_dir, exist_ok=True)
+                write_np_table(os.path.join(bench_dir, "np.out"), rng)
+            write_collectl_log(os.path.join(run_dir, "collectl.log"), samples, rng)
+    return names
+
+
+def make_graph_config(root: str, config: str, series: int, seed: int = 0):
+    """Creates a processed/<config>/<system>/<name>.out tree with 'series' curves."""
+    rng = np.random.default_rng(seed)
+    for s in range(series):
+        system_dir = os.path.join(root, config, f"system{s % 3}")
+        os.makedirs(system_dir, exist_ok=True)
+        write_np_table(os.path.join(system_dir, f"layout{s}.out"), rng)
+
+
+# ========================= Timing ============================
+def time_case(fn, repeat: int):
+    """Calls fn 'repeat' times, with its prints silenced. :return: durations in seconds."""
+    durations = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn()
+            durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report(name: str, durations, work: float, unit: str) -> dict:
+    best = min(durations)
+    median = float(np.median(durations))
+    return {"case": name, "repeat": len(durations), "best_s": best, "median_s": median,
+            "work": work, "unit": unit, "throughput": work / median if median else None}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(args, workdir: str) -> list:
+    campaign = os.path.join(workdir, "campaign")
+    make_campaign(campaign, args.clusters, args.runs, args.benchmarks, args.samples)
+    np_files = sorted(os.path.join(d, f) for d, _, files in os.walk(campaign)
+                      for f in files if f == "np.out")
+    cl_files = sorted(os.path.join(d, f) for d, _, files in os.walk(campaign)
+                      for f in files if f == "collectl.log")
+    tables = [analyzer.NPdata(file_path=p) for p in np_files]
+    results = []
+
+    def selected(name):
+        return not args.only or name in args.only
+
+    if selected("np_parse"):
+        d = time_case(lambda: analyzer.NPdata(file_path=np_files[0]), args.repeat)
+        results.append(report("np_parse", d, NP_ROWS, "rows/s"))
+
+    if selected("np_aggregate"):
+        instance = analyzer.NPInstance()
+        for t in tables:
+            instance.add_benchmark(t)
+        d = time_case(instance.compute_averages, args.repeat)
+        results.append(report("np_aggregate", d, NP_ROWS * len(tables), "rows/s"))
+
+    if selected("collectl_parse"):
+        size_mb = os.path.getsize(cl_files[0]) / 1e6
+        d = time_case(lambda: analyzer.CollectlData(cl_files[0]), args.repeat)
+        results.append(report("collectl_parse", d, size_mb, "MB/s"))
+
+    if selected("process_folder"):
+        cluster_dir = os.path.join(workdir, "folder")
+
+        def fresh_folder():
+            # process_folder writes its averages into the folder, so each
+            # repetition starts from a pristine copy of one cluster's runs.
+            shutil.rmtree(cluster_dir, ignore_errors=True)
+            os.makedirs(cluster_dir)
+            for run in range(1, args.runs + 1):
+                shutil.copytree(os.path.join(campaign, f"cluster1_{run}"),
+                                os.path.join(cluster_dir, f"cluster1_{run}"))
+
+        durations = []
+        for _ in range(args.repeat):
+            fresh_folder()
+            durations += time_case(lambda: analyzer.process_folder(cluster_dir), 1)
+        results.append(report("process_folder", durations, args.runs, "runs/s"))
+
+    if selected("render"):
+        processed = os.path.join(workdir, "processed")
+        out_dir = os.path.join(workdir, "graphs")
+        os.makedirs(out_dir, exist_ok=True)
+        make_graph_config(processed, "config", args.series)
+        d = time_case(lambda: tools.plot_config_graph("config", processed, out_dir, 1,
+                                                      "Performance (Mbps)"), args.repeat)
+        results.append(report("render", d, 1, "graphs/s"))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the analysis hot paths")
+    parser.add_argument("--clusters", type=int, default=4, help="Cluster instances in the campaign.")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per cluster instance.")
+    parser.add_argument("--benchmarks", type=int, default=2, help="Benchmarks per run.")
+    parser.add_argument("--samples", type=int, default=600, help="collectl samples per run.")
+    parser.add_argument("--series", type=int, default=6, help="Curves in the rendered graph.")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions of each case.")
+    parser.add_argument("--only", nargs="+", help="Cases to run (default: all).")
+    parser.add_argument("--keep", help="Generate the data in this folder and keep it.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    workdir = args.keep or tempfile.mkdtemp(prefix="microbench-")
+    try:
+        results = run_suite(args, workdir)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'case':<16} {'best (ms)':>10} {'median (ms)':>12} {'throughput':>22}")
+    for r in results:
+        print(f"{r['case']:<16} {r['best_s'] * 1e3:>10.2f} {r['median_s'] * 1e3:>12.2f} "
+              f"{r['throughput']:>13.1f} {r['unit']:<8}")
+    if args.output:
+        params = {k: getattr(args, k) for k in ("clusters", "runs", "benchmarks",
+                                                 "samples", "series", "repeat")}
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(), "time": time.time(), "python": platform.python_version(),
+                       "params": params, "results": results}, f, indent=2)
+        print(f"Results saved in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
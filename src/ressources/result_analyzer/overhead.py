@@ -0,0 +1,264 @@
+"""
+overhead.py
+
+Virtualization overhead per VM layout, from the host-side qemu captures
+(host.bin, written by handler.py --host-metrics) of every cluster run.
+
+For each domain the cumulative counters are turned into rates, in host cores:
+  vcpu     CPU time consumed by the vCPU threads (guest work)
+  steal    time the vCPU threads were runnable but not scheduled
+  emulation  qemu CPU time spent outside the vCPU threads (device
+             emulation, I/O threads)
+  exits    KVM exits per second (NaN when debugfs was not readable)
+
+Rates are averaged over the guest benchmark window only: the window is
+detected on the guest CPU series of nodes.npz, or on metrics.bin when the
+nodes were not captured, then matched on the host samples by wall-clock
+time. The reported overhead is the share of steal and emulation relative to
+the guest work, per layout (cluster) and domain, with bootstrap confidence
+intervals across runs.
+
+Usage:
+    python overhead.py kvm=/path/to/kvm/results [...] --out report
+"""
+
+import os
+import csv
+import argparse
+from collections import OrderedDict
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from results import parse_resources, split_run_dir, read_samples
+from stats import summarize
+from windows import detect_windows
+
+HOST_FILE = "host.bin"
+GUEST_CPU_FIELDS = ["cpu_user", "cpu_nice", "cpu_system", "cpu_idle",
+                    "cpu_iowait", "cpu_irq", "cpu_softirq", "cpu_steal"]
+OVERHEAD_METRICS = OrderedDict([
+    ("steal_pct", "Steal (% of vCPU time)"),
+    ("emulation_pct", "Emulation (% of vCPU time)"),
+    ("exits_per_s", "KVM exits per second"),
+])
+
+
+# ========================= Host Samples ================================
+def host_rates(file_path: str):
+    """
+    Converts a host.bin capture into per-interval rates.
+    :return: (time, dict domain -> {'vcpu', 'steal', 'emulation', 'qemu', 'exits'})
+             where time has one entry per interval (end of the interval).
+    """
+    header, rec = read_samples(file_path)
+    if len(rec) < 2:
+        return np.empty(0), {}
+    dt = np.diff(rec["time"])
+    domains = OrderedDict()
+    for field in header["fields"]:
+        if "/" in field:
+            dom, name = field.split("/", 1)
+            domains.setdefault(dom, []).append(name)
+
+    rates = OrderedDict()
+    for dom, names in domains.items():
+        vcpu = sum(np.diff(rec[f"{dom}/{n}"]) for n in names if n.endswith("_cpu") and n != "qemu_cpu")
+        wait = sum(np.diff(rec[f"{dom}/{n}"]) for n in names if n.endswith("_wait"))
+        qemu = np.diff(rec[f"{dom}/qemu_cpu"])
+        vcpu = vcpu if np.ndim(vcpu) else np.zeros_like(dt)
+        wait = wait if np.ndim(wait) else np.zeros_like(dt)
+        rates[dom] = {
+            "vcpu": vcpu / dt,
+            "steal": wait / dt,
+            "emulation": np.clip(qemu - vcpu, 0, None) / dt,
+            "qemu": qemu / dt,
+            "exits": np.diff(rec[f"{dom}/exits"]) / dt,
+        }
+    return np.array(rec["time"][1:]), rates
+
+
+# ========================= Guest Window ================================
+def nodes_cpu(npz_path: str):
+    """
+    Mean CPU busy % over the nodes of a nodes.npz capture.
+    :return: (time, cpu) arrays, one entry per grid interval.
+    """
+    data = np.load(npz_path)
+    nodes = sorted({k.split("/", 1)[0] for k in data.files if "/" in k})
+    if data["time"].size < 2 or not nodes:
+        return np.empty(0), np.empty(0)
+    busy = []
+    for node in nodes:
+        total = np.diff(sum(data[f"{node}/{f}"] for f in GUEST_CPU_FIELDS))
+        idle = np.diff(data[f"{node}/cpu_idle"] + data[f"{node}/cpu_iowait"])
+        busy.append(100.0 * (1.0 - idle / np.where(total > 0, total, 1)))
+    return data["time"][1:], np.mean(busy, axis=0)
+
+
+def guest_window(run_dir: str):
+    """
+    Wall-clock (start, end) of the benchmark window of a cluster run, or None.
+    Uses the guest nodes capture when present, else the orchestrator capture.
+    """
+    npz_path = os.path.join(run_dir, "nodes.npz")
+    if os.path.exists(npz_path):
+        t, cpu = nodes_cpu(npz_path)
+        if cpu.size:
+            window = detect_windows(cpu).active
+            if window.stop > window.start:
+                return t[window.start], t[window.stop - 1]
+    series = parse_resources(run_dir, os.listdir(run_dir))
+    if series and series["cpu"].size and "time" in series and len(series["time"]) == len(series["cpu"]):
+        window = detect_windows(series["cpu"], series["memory"], series["net_in"], series["net_out"]).active
+        if window.stop > window.start:
+            return series["time"][window.start], series["time"][window.stop - 1]
+    return None
+
+
+def run_overhead(run_dir: str) -> dict:
+    """
+    Overhead metrics of one cluster run, averaged over the guest window.
+    :return: dict domain -> {metric: value}, plus an 'all' entry summing the domains.
+    """
+    t, rates = host_rates(os.path.join(run_dir, HOST_FILE))
+    if not rates:
+        return {}
+    window = guest_window(run_dir)
+    mask = (t >= window[0]) & (t <= window[1]) if window else np.ones(t.size, dtype=bool)
+    if not mask.any():
+        print(f"No host samples in the benchmark window of '{run_dir}', using the whole capture.")
+        mask[:] = True
+
+    means = OrderedDict((dom, {k: float(np.nanmean(v[mask])) if np.isfinite(v[mask]).any() else np.nan
+                               for k, v in r.items()})
+                        for dom, r in rates.items())
+    total = {}
+    for k in ("vcpu", "steal", "emulation", "qemu", "exits"):
+        values = np.array([m[k] for m in means.values()])
+        total[k] = float(np.nansum(values)) if np.isfinite(values).any() else np.nan
+    means["all"] = total
+
+    out = OrderedDict()
+    for dom, m in means.items():
+        base = m["vcpu"] if m["vcpu"] > 0 else np.nan
+        out[dom] = {
+            "vcpu_cores": m["vcpu"],
+            "steal_pct": 100.0 * m["steal"] / base,
+            "emulation_pct": 100.0 * m["emulation"] / base,
+            "exits_per_s": m["exits"],
+        }
+    return out
+
+
+# ========================= Report ======================================
+def collect(sources):
+    """
+    Walks every (system, root) folder for host captures.
+    :return: OrderedDict (system, layout, domain) -> {metric: [value per run]}
+    """
+    table = OrderedDict()
+    for system, root in sources:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            if HOST_FILE not in filenames:
+                continue
+            layout, _ = split_run_dir(os.path.basename(dirpath))
+            try:
+                overhead = run_overhead(dirpath)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Skipping '{dirpath}' due to error: {e}")
+                continue
+            for dom, metrics in overhead.items():
+                entry = table.setdefault((system, layout, dom), OrderedDict())
+                for metric, value in metrics.items():
+                    entry.setdefault(metric, []).append(value)
+    return table
+
+
+def overhead_rows(table, n_resamples=2000):
+    """One row per (system, layout, domain, metric) with median and 95% CI over runs."""
+    for (system, layout, dom), metrics in table.items():
+        for metric, values in metrics.items():
+            values = np.asarray(values, dtype=float)
+            values = values[np.isfinite(values)]
+            if not values.size:
+                continue
+            st = summarize(values, percentiles=(), n_resamples=n_resamples)
+            yield OrderedDict([
+                ("system", system), ("layout", layout), ("domain", dom), ("metric", metric),
+                ("runs", st["runs"]), ("median", float(st["median"][0])),
+                ("ci_low", float(st["ci_low"][0])), ("ci_high", float(st["ci_high"][0])),
+            ])
+
+
+def render(rows):
+    """
+    One figure per overhead metric: bars per layout and system for the
+    whole host ('all' domains), with 95% CI error bars.
+    """
+    rows = [r for r in rows if r["domain"] == "all"]
+    layouts = list(OrderedDict.fromkeys(r["layout"] for r in rows))
+    systems = list(OrderedDict.fromkeys(r["system"] for r in rows))
+    if not layouts:
+        return
+    x = np.arange(len(layouts))
+    width = 0.8 / len(systems)
+    cmap = plt.get_cmap("tab10")
+    for metric, label in OVERHEAD_METRICS.items():
+        by_key = {(r["system"], r["layout"]): r for r in rows if r["metric"] == metric}
+        if not by_key:
+            continue
+        fig, ax = plt.subplots(figsize=(10, 6))
+        for i, system in enumerate(systems):
+            found = [by_key.get((system, l)) for l in layouts]
+            vals = [r["median"] if r else 0 for r in found]
+            errs = [[r["median"] - r["ci_low"] if r else 0 for r in found],
+                    [r["ci_high"] - r["median"] if r else 0 for r in found]]
+            ax.bar(x + i * width, vals, width, yerr=errs, capsize=5, label=system, color=cmap(i))
+        ax.set_xticks(x + width * (len(systems) - 1) / 2)
+        ax.set_xticklabels(layouts, rotation=45, ha='right')
+        ax.set_ylabel(f"{label}, median and 95% CI")
+        ax.set_title(f"Virtualization overhead: {label}")
+        ax.yaxis.grid(True)
+        ax.legend(fontsize='small')
+        fig.tight_layout()
+        yield f"overhead_{metric}", fig
+
+
+def run_overhead_report(sources, out_dir=None, n_resamples=2000):
+    """Returns (rows, figures); writes overhead.csv and the figures when out_dir is given."""
+    rows = list(overhead_rows(collect(sources), n_resamples))
+    figures = OrderedDict(render(rows))
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        if rows:
+            table_path = os.path.join(out_dir, "overhead.csv")
+            with open(table_path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+            print(f"Wrote overhead table to '{table_path}'")
+        for name, fig in figures.items():
+            fig_path = os.path.join(out_dir, f"{name}.png")
+            fig.savefig(fig_path, dpi=300)
+            plt.close(fig)
+            print(f"Saved graph: {fig_path}")
+    return rows, figures
+
+
+def main():
+    from pipeline import parse_source
+
+    parser = argparse.ArgumentParser(description="Virtualization overhead report")
+    parser.add_argument("sources", nargs="+", type=parse_source,
+                        help="handler.py output folders, as system=path or path.")
+    parser.add_argument("--out", default="report", help="Folder for the table and figures.")
+    parser.add_argument("--resamples", type=int, default=2000, help="Bootstrap resamples.")
+    args = parser.parse_args()
+    run_overhead_report(args.sources, args.out, args.resamples)
+
+
+if __name__ == "__main__":
+    main()
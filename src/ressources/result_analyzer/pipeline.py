@@ -0,0 +1,269 @@
+"""
+pipeline.py
+
+Goes from handler.py output folders to final tables and figures in one pass,
+without the np-averages.out / collectl-averages.out hand-off files and the
+manual rearrangement into processed/<config>/<system>.
+
+Each stage is a generator consuming the previous one:
+  discover  -> one Run per benchmark directory or resource capture, per system
+  load      -> parses the raw files into arrays
+  trim      -> restricts resource series to the detected benchmark window
+  group     -> stacks the runs of each (cluster, benchmark, system)
+  summarize -> medians and bootstrap confidence intervals
+  render    -> matplotlib figures per cluster, kept in memory
+Text export of the old averaged files is an optional side output (tee) of
+the load stage.
+
+Usage:
+    python pipeline.py kvm=/path/to/kvm/results proxmox=/path/to/proxmox/results --out report [--export-text]
+"""
+
+import os
+import csv
+import argparse
+from collections import namedtuple, OrderedDict
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from results import (RESOURCE_FILES, RAW_DIR, parse_resources, split_run_dir, parse_benchmark_dir,
+                     result_files, metrics)
+from stats import summarize as summarize_samples
+from windows import detect_windows
+
+Run = namedtuple("Run", ["system", "cluster", "run", "benchmark", "path", "data"])
+Group = namedtuple("Group", ["system", "cluster", "benchmark", "metrics", "x"])
+Summary = namedtuple("Summary", ["system", "cluster", "benchmark", "metrics", "x"])
+
+RESOURCE_BENCHMARK = "resources"
+CURVE_METRICS = OrderedDict((name, m.label) for name, m in metrics().items() if m.curve)
+METRICS = metrics()
+
+
+# ========================= Stages ====================================
+def discover(sources):
+    """
+    Walks every (system, root) handler output folder.
+    Yields a Run (without data) per benchmark directory and per resource capture
+    (metrics.bin or collectl.log).
+    """
+    for system, root in sources:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if d != RAW_DIR)
+            if any(name in filenames for name in RESOURCE_FILES):
+                cluster, run = split_run_dir(os.path.basename(dirpath))
+                yield Run(system, cluster, run, RESOURCE_BENCHMARK, dirpath, None)
+            if result_files() & set(filenames):
+                cluster, run = split_run_dir(os.path.basename(os.path.dirname(dirpath)))
+                yield Run(system, cluster, run, os.path.basename(dirpath), dirpath, None)
+
+
+def load(runs):
+    """Parses the raw files of each Run into a dict of arrays."""
+    for r in runs:
+        data = {}
+        try:
+            if r.benchmark == RESOURCE_BENCHMARK:
+                data = parse_resources(r.path, os.listdir(r.path))
+            else:
+                data = parse_benchmark_dir(r.path)
+        except (OSError, ValueError) as e:
+            print(f"Skipping '{r.path}' due to error: {e}")
+            continue
+        if data:
+            yield r._replace(data=data)
+
+
+def trim(runs):
+    """Keeps only the detected benchmark window of resource series."""
+    for r in runs:
+        if r.benchmark != RESOURCE_BENCHMARK:
+            yield r
+            continue
+        d = r.data
+        window = detect_windows(d["cpu"], d["memory"], d["net_in"], d["net_out"]).active
+        yield r._replace(data={"cpu": d["cpu"][window], "memory": d["memory"][window]})
+
+
+def export_text(runs, out_dir):
+    """
+    Side output: passes runs through unchanged while writing the per-run
+    tables in the legacy text formats under out_dir/<system>/<cluster>/.
+    """
+    for r in runs:
+        target = os.path.join(out_dir, r.system, r.cluster)
+        os.makedirs(target, exist_ok=True)
+        d = r.data
+        if r.benchmark == RESOURCE_BENCHMARK:
+            with open(os.path.join(target, f"collectl_{r.run}.out"), "w") as f:
+                for cpu, mem in zip(d["cpu"], d["memory"]):
+                    f.write(f"cputotals.total {cpu}\nmeminfo.used {mem}\n")
+        elif "bandwidth" in d:
+            np.savetxt(os.path.join(target, f"{r.benchmark}_{r.run}.out"),
+                       np.column_stack([d["size"], d["bandwidth"], d["latency"]]), fmt="%.8g")
+        yield r
+
+
+def group(runs):
+    """
+    Stacks the runs of each (system, cluster, benchmark) into (runs, points) arrays.
+    Resource runs are reduced to their mean over the active window first.
+    Yields one Group per key once the input is exhausted.
+    """
+    groups = OrderedDict()
+    for r in runs:
+        key = (r.system, r.cluster, r.benchmark)
+        entry = groups.setdefault(key, {"metrics": {}, "x": None})
+        for metric, values in r.data.items():
+            if metric == "size":
+                entry["x"] = values
+                continue
+            if r.benchmark == RESOURCE_BENCHMARK:
+                values = np.array([values.mean()]) if values.size else values
+            entry["metrics"].setdefault(metric, []).append(values)
+
+    for (system, cluster, benchmark), entry in groups.items():
+        metrics = {}
+        for metric, rows in entry["metrics"].items():
+            rows = [row for row in rows if row.size]
+            if rows:
+                width = min(row.size for row in rows)
+                metrics[metric] = np.vstack([row[:width] for row in rows])
+        yield Group(system, cluster, benchmark, metrics, entry["x"])
+
+
+def summarize(groups, n_resamples=2000):
+    """Computes median and bootstrap confidence interval of every stacked metric."""
+    for g in groups:
+        metrics = {m: summarize_samples(s, percentiles=(), n_resamples=n_resamples)
+                   for m, s in g.metrics.items()}
+        yield Summary(g.system, g.cluster, g.benchmark, metrics, g.x)
+
+
+def render(summaries):
+    """
+    Builds the figures of every cluster in memory.
+    Yields (name, figure) pairs: one NetPIPE figure per curve metric and one
+    resource figure per cluster.
+    """
+    by_cluster = OrderedDict()
+    for s in summaries:
+        by_cluster.setdefault(s.cluster, []).append(s)
+
+    for cluster, items in by_cluster.items():
+        curves = [s for s in items if s.x is not None]
+        for metric, y_label in CURVE_METRICS.items():
+            series = [s for s in curves if metric in s.metrics]
+            if not series:
+                continue
+            fig, ax = plt.subplots(figsize=(10, 6))
+            for s in sorted(series, key=lambda s: (s.benchmark, s.system)):
+                m = s.metrics[metric]
+                x = s.x[:m["median"].size]
+                line, = ax.plot(x, m["median"], linewidth=2, label=f"{s.system} {s.benchmark}")
+                ax.fill_between(x, m["ci_low"], m["ci_high"], color=line.get_color(),
+                                alpha=0.2, linewidth=0)
+            ax.set_xscale("log")
+            ax.set_xlabel("Message Size (bytes)")
+            ax.set_ylabel(y_label)
+            ax.set_title(f"{cluster} {y_label}")
+            ax.legend(ncol=2, fontsize=8)
+            fig.tight_layout()
+            yield f"{cluster}_{metric}", fig
+
+        resources = [s for s in items if s.benchmark == RESOURCE_BENCHMARK]
+        if resources:
+            fig, axes = plt.subplots(1, 2, figsize=(10, 5))
+            for ax, metric, label in zip(axes, ("cpu", "memory"), ("CPU (%)", "Memory used")):
+                names = [s.system for s in resources if metric in s.metrics]
+                stats = [s.metrics[metric] for s in resources if metric in s.metrics]
+                centers = np.array([st["median"][0] for st in stats])
+                errors = np.array([[c - st["ci_low"][0], st["ci_high"][0] - c]
+                                   for c, st in zip(centers, stats)]).reshape(-1, 2).T
+                ax.bar(names, centers, yerr=errors, capsize=5,
+                       color=[plt.get_cmap("tab10")(i) for i in range(len(names))])
+                ax.set_ylabel(f"{label}, median and 95% CI")
+                ax.yaxis.grid(True)
+            fig.suptitle(f"Resources for {cluster}")
+            fig.tight_layout()
+            yield f"{cluster}_resources", fig
+
+
+# ========================= Outputs ===================================
+def summary_rows(summaries):
+    """
+    Flattens summaries into table rows. Curves are reported at their best point:
+    peak bandwidth and lowest latency.
+    """
+    for s in summaries:
+        for metric, st in s.metrics.items():
+            lower = metric in METRICS and not METRICS[metric].higher_is_better
+            i = int(np.argmin(st["median"])) if lower else int(np.argmax(st["median"]))
+            yield OrderedDict([
+                ("cluster", s.cluster), ("benchmark", s.benchmark), ("system", s.system),
+                ("metric", metric), ("runs", st["runs"]),
+                ("at", float(s.x[i]) if s.x is not None else ""),
+                ("median", float(st["median"][i])),
+                ("ci_low", float(st["ci_low"][i])), ("ci_high", float(st["ci_high"][i])),
+            ])
+
+
+def run_pipeline(sources, out_dir=None, text_dir=None, n_resamples=2000):
+    """
+    Runs every stage and returns (rows, figures) where figures maps a name to
+    a matplotlib figure. Nothing is written unless out_dir or text_dir is given.
+    """
+    runs = trim(load(discover(sources)))
+    if text_dir:
+        runs = export_text(runs, text_dir)
+    summaries = list(summarize(group(runs), n_resamples))
+    rows = list(summary_rows(summaries))
+    figures = OrderedDict(render(summaries))
+
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        if rows:
+            table_path = os.path.join(out_dir, "summary.csv")
+            with open(table_path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+            print(f"Wrote summary table to '{table_path}'")
+        for name, fig in figures.items():
+            fig_path = os.path.join(out_dir, f"{name}.png")
+            fig.savefig(fig_path, dpi=300)
+            plt.close(fig)
+            print(f"Saved graph: {fig_path}")
+    return rows, figures
+
+
+def parse_source(arg):
+    """Parses 'system=path' (or a bare path, labeled by its folder name)."""
+    if "=" in arg:
+        system, path = arg.split("=", 1)
+    else:
+        path = arg
+        system = os.path.basename(os.path.normpath(arg))
+    if not os.path.isdir(path):
+        raise argparse.ArgumentTypeError(f"{path} is not a directory.")
+    return system, path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw results to report pipeline")
+    parser.add_argument("sources", nargs="+", type=parse_source,
+                        help="handler.py output folders, as system=path or path.")
+    parser.add_argument("--out", default="report", help="Folder for the tables and figures.")
+    parser.add_argument("--export-text", action="store_true",
+                        help="Also write the per-run tables as text under <out>/text.")
+    parser.add_argument("--resamples", type=int, default=2000, help="Bootstrap resamples.")
+    args = parser.parse_args()
+
+    text_dir = os.path.join(args.out, "text") if args.export_text else None
+    run_pipeline(args.sources, args.out, text_dir, args.resamples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+regression.py
+
+Compares a benchmark campaign against a baseline and flags performance
+regressions. Both sides can be a handler.py output tree or a baseline
+snapshot written by the 'snapshot' command.
+
+Configurations are matched by cluster name and benchmark id. For each shared
+metric (bandwidth, latency, gflops, cpu) the per-run samples are compared
+with a one-sided permutation test, and a regression is reported when the
+change goes the wrong way by more than the threshold and is significant.
+With n1 and n2 runs, no p-value can be below 1 / comb(n1 + n2, n2) (1/6 for
+2 against 2): when that bound is above alpha the test cannot detect
+anything, and the comparison is reported as inconclusive instead.
+
+Usage:
+    python regression.py snapshot /path/to/results baseline.json
+    python regression.py compare baseline.json /path/to/results [--threshold 0.05] [--output verdict.json]
+
+The compare command exits with status 1 when at least one regression is found,
+and with status 2 when there is none but some comparison is inconclusive (too
+few runs), so it can be used directly to gate a rollout.
+"""
+
+import os
+import sys
+import json
+import math
+import argparse
+import itertools
+import numpy as np
+
+from results import HIGHER_IS_BETTER, load_campaign
+
+SNAPSHOT_VERSION = 1
+
+
+# ========================= Baseline I/O ================================
+def write_snapshot(root: str, output_file: str):
+    """Stores the per-run samples of a result tree as a JSON baseline."""
+    configs = load_campaign(root)
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "source": os.path.abspath(root),
+        "configs": {key: cfg.to_dict() for key, cfg in configs.items()},
+    }
+    with open(output_file, "w") as f:
+        json.dump(snapshot, f)
+    print(f"Wrote baseline with {len(configs)} configurations to '{output_file}'")
+
+
+def load_samples(path: str) -> dict:
+    """
+    Loads either a baseline snapshot or a result tree.
+    :return: dict mapping configuration key -> {metric: (runs, points) array}.
+    """
+    if os.path.isdir(path):
+        return {
+            key: {m: cfg.stack(m) for m in cfg.metrics()}
+            for key, cfg in load_campaign(path).items()
+        }
+    with open(path, "r") as f:
+        snapshot = json.load(f)
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported baseline version in {path}: {snapshot.get('version')}")
+    return {
+        key: {m: np.array(v, dtype=float).reshape(len(v), -1) for m, v in metrics.items()}
+        for key, metrics in snapshot["configs"].items()
+    }
+
+
+# ========================= Statistics ==================================
+def permutation_pvalues(base: np.ndarray, cand: np.ndarray, higher_is_better: bool,
+                        n_resamples: int = 10000, rng=None) -> np.ndarray:
+    """
+    One-sided permutation test of 'cand is worse than base', column by column.
+    All splits are enumerated when there are fewer than n_resamples of them,
+    otherwise n_resamples random splits are drawn.
+    :param base: Array of shape (n1, points).
+    :param cand: Array of shape (n2, points).
+    :return: Array of p-values, one per point.
+    """
+    pooled = np.vstack([base, cand])
+    n, n2 = pooled.shape[0], cand.shape[0]
+    if math.comb(n, n2) <= n_resamples:
+        idx = np.array(list(itertools.combinations(range(n), n2)))
+        correction = 0
+    else:
+        rng = rng or np.random.default_rng()
+        idx = np.argsort(rng.random((n_resamples, n)), axis=1)[:, :n2]
+        correction = 1
+
+    total = pooled.sum(axis=0)
+    cand_sum = pooled[idx].sum(axis=1)
+    diffs = cand_sum / n2 - (total - cand_sum) / (n - n2)
+    observed = cand.mean(axis=0) - base.mean(axis=0)
+    if higher_is_better:
+        extreme = diffs <= observed + 1e-12
+    else:
+        extreme = diffs >= observed - 1e-12
+    return (extreme.sum(axis=0) + correction) / (idx.shape[0] + correction)
+
+
+def min_pvalue(n1: int, n2: int) -> float:
+    """Smallest p-value the permutation test can give with n1 against n2 runs."""
+    return 1.0 / math.comb(n1 + n2, n2)
+
+
+def geometric_mean(values: np.ndarray, axis: int = -1) -> np.ndarray:
+    return np.exp(np.log(np.clip(values, 1e-12, None)).mean(axis=axis))
+
+
+def compare_metric(base: np.ndarray, cand: np.ndarray, higher_is_better: bool,
+                   threshold: float, alpha: float, n_resamples: int, rng=None) -> dict:
+    """
+    Compares the samples of one metric.
+    Every run is reduced to the geometric mean over its points for the verdict;
+    the point-by-point test is reported alongside for NetPIPE curves.
+    """
+    width = min(base.shape[1], cand.shape[1])
+    base, cand = base[:, :width], cand[:, :width]
+
+    base_runs = geometric_mean(base)[:, None]
+    cand_runs = geometric_mean(cand)[:, None]
+    change = float(geometric_mean(cand_runs.ravel()) / geometric_mean(base_runs.ravel()) - 1.0)
+    p_value = float(permutation_pvalues(base_runs, cand_runs, higher_is_better, n_resamples, rng)[0])
+
+    worse = -change if higher_is_better else change
+    floor = min_pvalue(base.shape[0], cand.shape[0])
+    if floor > alpha:
+        status = "inconclusive"
+    elif worse > threshold and p_value <= alpha:
+        status = "regression"
+    elif -worse > threshold and p_value >= 1.0 - alpha:
+        status = "improvement"
+    else:
+        status = "unchanged"
+
+    result = {
+        "status": status,
+        "change": change,
+        "p_value": p_value,
+        "min_p_value": floor,
+        "baseline_runs": int(base.shape[0]),
+        "candidate_runs": int(cand.shape[0]),
+    }
+    if width > 1:
+        point_change = np.median(cand, axis=0) / np.clip(np.median(base, axis=0), 1e-12, None) - 1.0
+        point_p = permutation_pvalues(base, cand, higher_is_better, n_resamples, rng)
+        point_worse = -point_change if higher_is_better else point_change
+        result["points"] = int(width)
+        result["points_regressed"] = int(np.sum((point_worse > threshold) & (point_p <= alpha)))
+    return result
+
+
+def compare(baseline: dict, candidate: dict, threshold: float = 0.05, alpha: float = 0.05,
+            n_resamples: int = 10000, metrics=None, seed: int = 0) -> dict:
+    """
+    Compares every configuration and metric present on both sides.
+    :return: Machine-readable verdict (see module docstring).
+    """
+    rng = np.random.default_rng(seed)
+    metrics = metrics or list(HIGHER_IS_BETTER)
+    report = {
+        "verdict": "pass",
+        "threshold": threshold,
+        "alpha": alpha,
+        "regressions": [],
+        "inconclusive": [],
+        "configs": {},
+        "baseline_only": sorted(set(baseline) - set(candidate)),
+        "candidate_only": sorted(set(candidate) - set(baseline)),
+    }
+
+    for key in sorted(set(baseline) & set(candidate)):
+        for metric in metrics:
+            base = baseline[key].get(metric)
+            cand = candidate[key].get(metric)
+            if base is None or cand is None or not base.size or not cand.size:
+                continue
+            result = compare_metric(base, cand, HIGHER_IS_BETTER[metric],
+                                    threshold, alpha, n_resamples, rng)
+            report["configs"].setdefault(key, {})[metric] = result
+            if result["status"] == "regression":
+                report["regressions"].append({"config": key, "metric": metric,
+                                              "change": result["change"],
+                                              "p_value": result["p_value"]})
+            elif result["status"] == "inconclusive":
+                report["inconclusive"].append({"config": key, "metric": metric,
+                                               "change": result["change"],
+                                               "min_p_value": result["min_p_value"]})
+
+    if report["regressions"]:
+        report["verdict"] = "fail"
+    elif report["inconclusive"]:
+        report["verdict"] = "inconclusive"
+    return report
+
+
+# ======================= Main Routine =================================
+def print_report(report: dict):
+    for key, metrics in report["configs"].items():
+        for metric, r in metrics.items():
+            print(f"[{r['status']:>11}] {key} {metric}: {r['change']:+.2%} (p={r['p_value']:.3f})")
+    for key in report["baseline_only"]:
+        print(f"[    missing] {key} has no candidate results")
+    print(f"Verdict: {report['verdict']} ({len(report['regressions'])} regression(s), "
+          f"{len(report['inconclusive'])} inconclusive: too few runs for alpha={report['alpha']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark regression detector")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    snap = sub.add_parser("snapshot", help="Store a result tree as a baseline.")
+    snap.add_argument("results", help="handler.py output folder.")
+    snap.add_argument("output", help="Baseline JSON file to write.")
+
+    cmp_ = sub.add_parser("compare", help="Compare a campaign against a baseline.")
+    cmp_.add_argument("baseline", help="Baseline JSON file or result folder.")
+    cmp_.add_argument("candidate", help="Candidate JSON file or result folder.")
+    cmp_.add_argument("--threshold", type=float, default=0.05,
+                      help="Relative change tolerated before flagging (default 0.05).")
+    cmp_.add_argument("--alpha", type=float, default=0.05, help="Significance level (default 0.05).")
+    cmp_.add_argument("--resamples", type=int, default=10000, help="Permutations per test.")
+    cmp_.add_argument("--metrics", nargs="+", choices=list(HIGHER_IS_BETTER),
+                      help="Restrict the comparison to these metrics.")
+    cmp_.add_argument("--output", help="Write the JSON verdict to this file.")
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        write_snapshot(args.results, args.output)
+        return
+
+    report = compare(load_samples(args.baseline), load_samples(args.candidate),
+                     args.threshold, args.alpha, args.resamples, args.metrics)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote verdict to '{args.output}'")
+    sys.exit({"fail": 1, "inconclusive": 2}.get(report["verdict"], 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+results.py
+
+Loads a handler.py output tree into per-run samples that can be compared,
+summarized or plotted without going through the averaged text files.
+
+Expected layout (as written by handler.py):
+  <root>/<cluster>[_<run>]/metrics.bin or collectl.log
+  <root>/<cluster>[_<run>]/<benchmark_id>/np.out       (NetPIPE)
+  <root>/<cluster>[_<run>]/<benchmark_id>/output.log   (HPL, STREAM, OSU, custom commands)
+
+Benchmark result files are parsed by the benchmark type plugins of the
+orchestrator (server/plugins.py), which also declare the metrics.
+
+Every configuration is identified by the cluster directory (run suffix
+stripped, relative to <root>) and the benchmark directory name. Each metric
+is stored as an array of shape (runs, points): one row per run, one column
+per message size for NetPIPE or per HPL test for GFLOPS.
+"""
+
+import os
+import re
+import sys
+import numpy as np
+from collections import OrderedDict
+
+from windows import detect_windows
+
+# The binary sample format is owned by the orchestrator's sampler, and the
+# benchmark result parsers by its benchmark type plugins.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "server"))
+from sampler import CPU_FIELDS, read_samples
+from plugins import parse_benchmark_dir, result_files, metrics, RAW_DIR
+
+# Metric name -> True when a higher value is better.
+HIGHER_IS_BETTER = {name: m.higher_is_better for name, m in metrics().items()}
+HIGHER_IS_BETTER["cpu"] = False
+
+RUN_DIR_RE = re.compile(r"^(?P<cluster>.+)_(?P<run>\d+)$")
+
+
+# ========================= Raw File Parsers ============================
+COLLECTL_KEYS = {
+    "sample.time": "time",
+    "cputotals.total": "cpu",
+    "meminfo.used": "memory",
+    "nettotals.kbin": "net_in",
+    "nettotals.kbout": "net_out",
+}
+
+
+def parse_collectl(file_path: str) -> dict:
+    """
+    Returns the CPU, memory and network series of a collectl lexpr log.
+    :return: dict with the keys of COLLECTL_KEYS' values, one array per series.
+    """
+    series = {name: [] for name in COLLECTL_KEYS.values()}
+    with open(file_path, "r", errors="replace") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 2 or parts[0] not in COLLECTL_KEYS:
+                continue
+            try:
+                series[COLLECTL_KEYS[parts[0]]].append(float(parts[1]))
+            except ValueError:
+                continue
+    return {name: np.array(values, dtype=float) for name, values in series.items()}
+
+
+def parse_samples(file_path: str) -> dict:
+    """
+    Derives the same series as parse_collectl from a sampler.py file:
+    CPU busy %, memory used (kB), network in/out (kB/s). Memory used leaves
+    out buffers and page cache, as collectl's meminfo.used does. Rates need
+    two samples, so the first sample only serves as a reference.
+    """
+    _, rec = read_samples(file_path)
+    if len(rec) < 2:
+        return {name: np.empty(0) for name in COLLECTL_KEYS.values()}
+    total = np.diff(sum(rec[f] for f in CPU_FIELDS))
+    idle = np.diff(rec["cpu_idle"] + rec["cpu_iowait"])
+    dt = np.diff(rec["time"])
+    return {
+        "time": np.array(rec["time"][1:]),
+        "cpu": 100.0 * (1.0 - idle / np.where(total > 0, total, 1)),
+        "memory": np.array(rec["mem_total"][1:] - rec["mem_free"][1:]
+                           - rec["mem_buffers"][1:] - rec["mem_cached"][1:]),
+        "net_in": np.diff(rec["net_rx_bytes"]) / dt / 1024,
+        "net_out": np.diff(rec["net_tx_bytes"]) / dt / 1024,
+    }
+
+
+# Resource capture files, preferred first.
+RESOURCE_FILES = OrderedDict([
+    ("metrics.bin", parse_samples),
+    ("collectl.log", parse_collectl),
+])
+
+
+def parse_resources(dirpath: str, filenames) -> dict:
+    """Parses the resource capture of a cluster run directory, or returns None."""
+    for name, parser in RESOURCE_FILES.items():
+        if name in filenames:
+            return parser(os.path.join(dirpath, name))
+    return None
+
+
+def active_cpu(series: dict) -> np.ndarray:
+    """Restricts the CPU series to the detected benchmark window."""
+    window = detect_windows(series["cpu"], series["memory"], series["net_in"], series["net_out"]).active
+    return series["cpu"][window]
+
+
+# ========================= Campaign Model ==============================
+class ConfigSamples:
+    """Per-run samples of every metric found for one configuration."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.runs = {}  # run number -> {metric: 1-D array}
+
+    def add(self, run: int, metric: str, values: np.ndarray):
+        self.runs.setdefault(run, {})[metric] = np.asarray(values, dtype=float).ravel()
+
+    def metrics(self):
+        names = set()
+        for values in self.runs.values():
+            names.update(values)
+        return sorted(names)
+
+    def stack(self, metric: str) -> np.ndarray:
+        """
+        Stacks the runs of a metric into a (runs, points) array.
+        Runs with a different number of points are truncated to the shortest one.
+        """
+        rows = [self.runs[r][metric] for r in sorted(self.runs) if metric in self.runs[r]]
+        rows = [r for r in rows if r.size]
+        if not rows:
+            return np.empty((0, 0))
+        width = min(r.size for r in rows)
+        return np.vstack([r[:width] for r in rows])
+
+    def to_dict(self) -> dict:
+        return {m: self.stack(m).tolist() for m in self.metrics()}
+
+
+def split_run_dir(name: str):
+    """Splits '<cluster>_<run>' into (cluster, run). Single-run clusters have no suffix."""
+    m = RUN_DIR_RE.match(name)
+    if m:
+        return m.group("cluster"), int(m.group("run"))
+    return name, 1
+
+
+def load_campaign(root: str) -> dict:
+    """
+    Walks a handler output tree and collects the per-run samples.
+    :return: dict mapping configuration key -> ConfigSamples.
+    """
+    configs = {}
+
+    def _get(key):
+        if key not in configs:
+            configs[key] = ConfigSamples(key)
+        return configs[key]
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d != RAW_DIR)
+        resources = parse_resources(dirpath, filenames)
+        if resources is not None:
+            rel = os.path.relpath(dirpath, root)
+            parent, name = os.path.split(rel)
+            cluster, run = split_run_dir(name)
+            key = os.path.join(parent, cluster, "collectl")
+            cpu = active_cpu(resources)
+            if cpu.size:
+                _get(key).add(run, "cpu", [cpu.mean()])
+
+        if not result_files() & set(filenames):
+            continue
+        run_rel = os.path.relpath(os.path.dirname(dirpath), root)
+        parent, name = os.path.split(run_rel)
+        cluster, run = split_run_dir(name)
+        key = os.path.join(parent, cluster, os.path.basename(dirpath))
+
+        try:
+            data = parse_benchmark_dir(dirpath, filenames)
+        except ValueError as e:
+            print(f"Skipping '{dirpath}' due to error: {e}")
+            continue
+        for metric, values in data.items():
+            if metric != "size" and values.size:
+                _get(key).add(run, metric, values)
+
+    return {k: v for k, v in configs.items() if v.runs}
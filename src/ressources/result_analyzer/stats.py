@@ -0,0 +1,152 @@
+"""
+stats.py
+
+Summary statistics and bootstrap confidence intervals over stacked runs.
+
+Samples are given as an array of shape (runs, points), e.g. one row per
+NetPIPE run and one column per message size. All resamples are drawn at
+once as an index array of shape (resamples, runs), so the whole bootstrap
+is a handful of NumPy reductions instead of a Python loop; resamples are
+processed in batches to keep memory bounded for large curves.
+
+Samples taken over time from one trace (e.g. the CPU use of a VM, second by
+second) are not independent: block_bootstrap_ci resamples blocks of
+consecutive samples instead, long enough to keep their autocorrelation.
+
+Every bootstrap uses a fixed seed by default, so the same input always gives
+the same intervals.
+"""
+
+import numpy as np
+
+STATISTICS = {
+    "median": np.median,
+    "mean": np.mean,
+}
+
+
+def bootstrap_ci(samples, statistic: str = "median", n_resamples: int = 2000,
+                 confidence: float = 0.95, batch_size: int = 500, rng=None, seed: int = 0):
+    """
+    Percentile bootstrap confidence interval of a statistic, column by column.
+    :param samples: Array of shape (runs, points) or (runs,).
+    :param statistic: "median" or "mean".
+    :return: Two arrays (low, high) of shape (points,) (or scalars for 1-D input).
+    """
+    samples = np.asarray(samples, dtype=float)
+    flat = samples.ndim == 1
+    if flat:
+        samples = samples[:, None]
+    runs = samples.shape[0]
+    if runs == 0:
+        raise ValueError("Cannot bootstrap an empty sample.")
+    rng = rng or np.random.default_rng(seed)
+    reduce = STATISTICS[statistic]
+
+    estimates = np.empty((n_resamples, samples.shape[1]))
+    for start in range(0, n_resamples, batch_size):
+        stop = min(start + batch_size, n_resamples)
+        idx = rng.integers(0, runs, size=(stop - start, runs))
+        estimates[start:stop] = reduce(samples[idx], axis=1)
+
+    tail = (1.0 - confidence) / 2 * 100
+    low, high = np.percentile(estimates, [tail, 100 - tail], axis=0)
+    if flat:
+        return float(low[0]), float(high[0])
+    return low, high
+
+
+def block_length(series) -> int:
+    """
+    Block length for the moving-block bootstrap of a time series: twice the
+    lag at which its autocorrelation first drops below 1/e, at least n^(1/3)
+    and at most n // 2.
+    """
+    x = np.asarray(series, dtype=float) - np.mean(series)
+    n = x.size
+    floor = max(1, int(round(n ** (1 / 3))))
+    if n < 4 or not x.any():
+        return min(floor, max(1, n // 2))
+    spectrum = np.fft.rfft(x, 2 * n)
+    acf = np.fft.irfft(spectrum * np.conj(spectrum))[:n]
+    acf /= acf[0]
+    below = np.flatnonzero(acf < np.exp(-1))
+    lag = int(below[0]) if below.size else n
+    return int(min(max(2 * lag, floor), max(1, n // 2)))
+
+
+def block_bootstrap_ci(series, statistic: str = "median", n_resamples: int = 2000,
+                       confidence: float = 0.95, block: int = None, rng=None, seed: int = 0):
+    """
+    Moving-block bootstrap confidence interval of a statistic of one time
+    series: each resample chains randomly chosen blocks of 'block' consecutive
+    samples (default: block_length) up to the series' length.
+    :return: (low, high)
+    """
+    series = np.asarray(series, dtype=float).ravel()
+    n = series.size
+    if n == 0:
+        raise ValueError("Cannot bootstrap an empty sample.")
+    block = min(block or block_length(series), n)
+    rng = rng or np.random.default_rng(seed)
+    reduce = STATISTICS[statistic]
+    n_blocks = -(-n // block)
+    offsets = np.arange(block)
+    batch = max(1, min(n_resamples, 5_000_000 // (n_blocks * block)))
+
+    estimates = np.empty(n_resamples)
+    for start in range(0, n_resamples, batch):
+        stop = min(start + batch, n_resamples)
+        starts = rng.integers(0, n - block + 1, size=(stop - start, n_blocks))
+        idx = (starts[:, :, None] + offsets).reshape(stop - start, -1)[:, :n]
+        estimates[start:stop] = reduce(series[idx], axis=1)
+
+    tail = (1.0 - confidence) / 2 * 100
+    low, high = np.percentile(estimates, [tail, 100 - tail])
+    return float(low), float(high)
+
+
+def summarize(samples, percentiles=(5, 25, 75, 95), statistic: str = "median",
+              n_resamples: int = 2000, confidence: float = 0.95, rng=None, seed: int = 0) -> dict:
+    """
+    Computes the usual summaries of stacked runs in one pass.
+    :param samples: Array of shape (runs, points).
+    :return: dict of arrays of shape (points,): 'median', 'mean', 'p<q>' for each
+             requested percentile, and 'ci_low'/'ci_high' around the chosen statistic.
+    """
+    samples = np.asarray(samples, dtype=float)
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    summary = {
+        "runs": samples.shape[0],
+        "median": np.median(samples, axis=0),
+        "mean": samples.mean(axis=0),
+    }
+    if percentiles:
+        for q, values in zip(percentiles, np.percentile(samples, percentiles, axis=0)):
+            summary[f"p{q:g}"] = values
+    summary["ci_low"], summary["ci_high"] = bootstrap_ci(
+        samples, statistic, n_resamples, confidence, rng=rng, seed=seed
+    )
+    return summary
+
+
+def center_and_errors(runs, statistic: str = "median", n_resamples: int = 2000,
+                      confidence: float = 0.95, rng=None, seed: int = 0):
+    """
+    Summarizes repeated runs of a trace for an error bar: each run is reduced
+    to the statistic, and the interval is the bootstrap interval of the
+    statistic across runs, i.e. the run-to-run variability.
+    :param runs: List of per-run sample arrays (their lengths may differ).
+    :return: (center, err_low, err_high), or (None, None, None) for no values.
+             A single run has no interval: (center, None, None).
+    """
+    reduce = STATISTICS[statistic]
+    per_run = np.array([reduce(np.asarray(r, dtype=float)) for r in runs if len(r)])
+    if not per_run.size:
+        return None, None, None
+    center = float(reduce(per_run))
+    if per_run.size < 2:
+        return center, None, None
+    low, high = bootstrap_ci(per_run, statistic, n_resamples, confidence, rng=rng, seed=seed)
+    return center, center - low, high - center
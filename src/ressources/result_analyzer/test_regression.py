@@ -0,0 +1,50 @@
+"""Tests of the regression gate (run with: python -m pytest src/ressources/result_analyzer)."""
+import sys
+import json
+
+import numpy as np
+import pytest
+
+import regression
+
+
+def write_snapshot(path, runs):
+    path.write_text(json.dumps({"version": regression.SNAPSHOT_VERSION, "source": "test",
+                                "configs": {"cluster/np": {"gflops": runs}}}))
+    return str(path)
+
+
+def run_gate(monkeypatch, baseline, candidate):
+    monkeypatch.setattr(sys, "argv", ["regression.py", "compare", baseline, candidate])
+    with pytest.raises(SystemExit) as exit_info:
+        regression.main()
+    return exit_info.value.code
+
+
+def test_too_few_runs_is_inconclusive_not_unchanged():
+    base = np.array([[100.0], [101.0]])
+    cand = np.array([[50.0], [51.0]])
+    result = regression.compare_metric(base, cand, True, threshold=0.05, alpha=0.05,
+                                       n_resamples=10000)
+    assert result["status"] == "inconclusive"
+    assert result["min_p_value"] == pytest.approx(1 / 6)
+
+
+def test_enough_runs_detect_the_regression():
+    base = np.array([[100.0], [101.0], [99.0], [100.5]])
+    cand = np.array([[50.0], [51.0], [49.0], [50.5]])
+    result = regression.compare_metric(base, cand, True, threshold=0.05, alpha=0.05,
+                                       n_resamples=10000)
+    assert result["status"] == "regression"
+
+
+def test_gate_exit_codes(tmp_path, monkeypatch):
+    base2 = write_snapshot(tmp_path / "base2.json", [[100.0], [101.0]])
+    cand2 = write_snapshot(tmp_path / "cand2.json", [[50.0], [51.0]])
+    assert run_gate(monkeypatch, base2, cand2) == 2
+
+    base4 = write_snapshot(tmp_path / "base4.json", [[100.0], [101.0], [99.0], [100.5]])
+    cand4 = write_snapshot(tmp_path / "cand4.json", [[50.0], [51.0], [49.0], [50.5]])
+    same4 = write_snapshot(tmp_path / "same4.json", [[100.2], [100.8], [99.5], [100.1]])
+    assert run_gate(monkeypatch, base4, cand4) == 1
+    assert run_gate(monkeypatch, base4, same4) == 0
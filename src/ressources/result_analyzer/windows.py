@@ -0,0 +1,131 @@
+"""
+windows.py
+
+Detects the benchmark window of a resource trace (collectl CPU, memory,
+network...). A run is split into three windows:
+  - setup:    samples before the benchmark starts (idle, init, downloads)
+  - active:   samples while the benchmark is running, every phase included
+  - teardown: samples after the benchmark has finished
+
+Change points are found by binary segmentation on the rescaled series: every
+split is scored for all candidate positions at once from cumulative sums, so
+a pass is O(samples) per segment. The segments are then
+classified as active or idle from the level of the primary series (the first
+one, CPU by convention), and the active window spans from the first to the
+last active segment so that quieter phases in the middle of a run are kept.
+"""
+
+from collections import namedtuple
+import numpy as np
+
+Windows = namedtuple("Windows", ["setup", "active", "teardown"])
+
+# Lowest noise level assumed for a rescaled series, so that smooth drifts
+# (page cache, counters) are not split at every sample.
+NOISE_FLOOR = 0.02
+
+
+def _as_matrix(series) -> np.ndarray:
+    """Stacks 1-D series into a (k, n) array, truncated to the shortest one."""
+    arrays = [np.asarray(s, dtype=float).ravel() for s in series if s is not None and len(s)]
+    if not arrays:
+        return np.empty((0, 0))
+    n = min(a.size for a in arrays)
+    return np.vstack([a[:n] for a in arrays])
+
+
+def normalize(matrix: np.ndarray):
+    """
+    Rescales each series to its 5-95 percentile range, so that the idle to
+    active shift weighs about the same in every series whatever its unit.
+    Constant series are dropped.
+    :return: (z, noise) where noise is the summed per-sample variance of z,
+             estimated from the MAD of the first differences.
+    """
+    if matrix.shape[1] < 2:
+        return matrix[:0], 0.0
+    lo, hi = np.percentile(matrix, [5, 95], axis=1)
+    span = hi - lo
+    keep = span > 0
+    z = (matrix[keep] - lo[keep, None]) / span[keep, None]
+    diffs = np.diff(z, axis=1)
+    deviation = np.abs(diffs - np.median(diffs, axis=1, keepdims=True))
+    sigma = np.median(deviation, axis=1) / (0.6745 * np.sqrt(2))
+    return z, float(np.sum(np.maximum(sigma, NOISE_FLOOR) ** 2))
+
+
+def best_split(cumsum: np.ndarray, start: int, end: int, min_size: int):
+    """
+    Finds the split of [start, end) that reduces the squared error the most.
+    :param cumsum: Array of shape (k, n + 1) of cumulative sums with a leading 0.
+    :return: (gain, position) or (0.0, None) if the segment is too short.
+    """
+    if end - start < 2 * min_size:
+        return 0.0, None
+    t = np.arange(start + min_size, end - min_size + 1)
+    left = cumsum[:, t] - cumsum[:, start, None]
+    total = cumsum[:, end, None] - cumsum[:, start, None]
+    right = total - left
+    gain = (left ** 2 / (t - start) + right ** 2 / (end - t) - total ** 2 / (end - start)).sum(axis=0)
+    i = int(np.argmax(gain))
+    return float(gain[i]), int(t[i])
+
+
+def change_points(z: np.ndarray, noise: float, min_size: int = 5, max_changes: int = 8,
+                  penalty: float = None):
+    """
+    Binary segmentation of the normalized (k, n) series.
+    Splits are accepted from the largest gain down, so the main idle/active
+    shifts are found first even when max_changes is reached.
+    :param noise: Summed per-sample variance of the series (see normalize).
+    :param penalty: Minimum gain for a split; defaults to a BIC-like 4 * noise * log(n).
+    :return: Sorted list of change-point indices.
+    """
+    k, n = z.shape
+    if penalty is None:
+        penalty = 4.0 * noise * np.log(max(n, 2))
+    cumsum = np.concatenate([np.zeros((k, 1)), np.cumsum(z, axis=1)], axis=1)
+
+    bounds = [0, n]
+    candidates = {(0, n): best_split(cumsum, 0, n, min_size)}
+    while len(bounds) - 2 < max_changes:
+        segment, (gain, pos) = max(candidates.items(), key=lambda kv: kv[1][0])
+        if pos is None or gain < penalty:
+            break
+        start, end = segment
+        del candidates[segment]
+        bounds.append(pos)
+        candidates[(start, pos)] = best_split(cumsum, start, pos, min_size)
+        candidates[(pos, end)] = best_split(cumsum, pos, end, min_size)
+    return sorted(bounds)[1:-1]
+
+
+def detect_windows(*series, min_size: int = 5, max_changes: int = 8,
+                   penalty: float = None, level: float = 0.5) -> Windows:
+    """
+    Splits a run into setup, active and teardown windows.
+    :param series: One or more series sampled at the same rate, primary (CPU) first.
+    :param level: Fraction of the range between the lowest and highest segment
+                  of the primary series above which a segment counts as active.
+    :return: Windows of slices; the whole trace is active when no change is found.
+    """
+    matrix = _as_matrix(series)
+    n = matrix.shape[1] if matrix.size else 0
+    everything = Windows(slice(0, 0), slice(0, n), slice(n, n))
+    z, noise = normalize(matrix)
+    if not z.size or n < 2 * min_size:
+        return everything
+
+    bounds = [0] + change_points(z, noise, min_size, max_changes, penalty) + [n]
+    if len(bounds) == 2:
+        return everything
+
+    primary = matrix[0] if matrix[0].std() > 0 else z.mean(axis=0)
+    csum = np.concatenate([[0.0], np.cumsum(primary)])
+    starts, ends = np.array(bounds[:-1]), np.array(bounds[1:])
+    means = (csum[ends] - csum[starts]) / (ends - starts)
+    lo, hi = means.min(), means.max()
+    active = np.flatnonzero(means >= lo + level * (hi - lo))
+
+    first, last = int(starts[active[0]]), int(ends[active[-1]])
+    return Windows(slice(0, first), slice(first, last), slice(last, n))
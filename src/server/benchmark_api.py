@@ -1,5 +1,36 @@
 # benchmark_api.py
+import zlib
+import base64
 import requests
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PORT = 5000
+WORKERS = 32  # concurrent agent calls of a pool, or of a relay
+CALL_TIMEOUT = 10  # requests timeout of an agent call (connect and read each)
+CALL_TIMEOUTS = {"metrics": 60}  # operations whose agent calls allow longer
+RELAY_MARGIN = 30.0
+
+
+def relay_timeout(operation: str, count: int, workers: int = WORKERS) -> float:
+    """
+    How long to wait for a relay forwarding an operation to count nodes: its
+    pool calls them workers at a time, each call taking up to its connect
+    plus read timeout when an agent is slow or unreachable.
+    """
+    per_call = 2 * CALL_TIMEOUTS.get(operation, CALL_TIMEOUT)
+    return RELAY_MARGIN + -(-count // workers) * per_call
+
+
+def agent_url(node: str) -> str:
+    """'host' or 'host:port' -> agent base URL (port 5000 by default)."""
+    if node.startswith(("http://", "https://")):
+        return node.rstrip("/")
+    return f"http://{node}" if ":" in node else f"http://{node}:{DEFAULT_PORT}"
+
+
+def node_slug(node: str) -> str:
+    """Node name usable in benchmark ids and file names."""
+    return node.replace('.', '_').replace(':', '_')
 
 class BenchmarkAPI:
     """
@@ -10,33 +41,71 @@ class BenchmarkAPI:
         self.client_url = client_url.rstrip("/")
         self.secret_key = secret_key
 
-    def init_benchmark(self, pre_cmd_exec: str) -> dict:
+    def init_benchmark(self, pre_cmd_exec: str, profile=None, timeout: float = None) -> dict:
         """
-        Initializes the benchmark environment by running pre_cmd_exec.
+        Initializes the benchmark environment by running pre_cmd_exec, then
+        applying the node performance profile (preset name or mapping), if any.
+        With timeout (seconds), a pre-command still running is killed and the
+        task ends as 'timeout'.
 
         Returns:
             dict: { status, task_id } or error
         """
         endpoint = f"{self.client_url}/api/benchmark/init"
         payload = {"secret_key": self.secret_key, "pre_cmd_exec": pre_cmd_exec}
+        if profile:
+            payload["profile"] = profile
+        if timeout:
+            payload["timeout"] = timeout
         try:
-            resp = requests.post(endpoint, json=payload, timeout=10)
+            resp = requests.post(endpoint, json=payload, timeout=CALL_TIMEOUT)
             resp.raise_for_status()
             return resp.json()
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
-    def launch_benchmark(self, task_id: str, command: str) -> dict:
+    def launch_benchmark(self, task_id: str, command: str, start_at: float = None,
+                         collect: list = None, reduce: bool = False,
+                         timeout: float = None) -> dict:
         """
         Launches the main benchmark using an existing initialized task_id.
+        With start_at (epoch seconds), the agent arms the task and starts it
+        at that time; its status then reports the measured start_offset.
+        With collect (file name patterns), the results only include matching files.
+        With reduce, the agent writes a summary of the results when the task ends.
+        With timeout (seconds), the agent kills the run when it lasts longer.
 
         Returns:
             dict: { status, task_id } or error
         """
         endpoint = f"{self.client_url}/api/benchmark/launch"
         payload = {"secret_key": self.secret_key, "task_id": task_id, "command": command}
+        if start_at is not None:
+            payload["start_at"] = start_at
+        if collect:
+            payload["collect"] = collect
+        if reduce:
+            payload["reduce"] = True
+        if timeout:
+            payload["timeout"] = timeout
         try:
-            resp = requests.post(endpoint, json=payload, timeout=10)
+            resp = requests.post(endpoint, json=payload, timeout=CALL_TIMEOUT)
+            resp.raise_for_status()
+            return resp.json()
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def cancel_benchmark(self, task_id: str) -> dict:
+        """
+        Stops a task and every process it started, on all its MPI hosts.
+
+        Returns:
+            dict: { status: 'accepted', task_id, state } or error
+        """
+        endpoint = f"{self.client_url}/api/benchmark/cancel"
+        payload = {"secret_key": self.secret_key, "task_id": task_id}
+        try:
+            resp = requests.post(endpoint, json=payload, timeout=CALL_TIMEOUT)
             resp.raise_for_status()
             return resp.json()
         except Exception as e:
@@ -46,18 +115,204 @@ class BenchmarkAPI:
         """Retrieves the current status of the task."""
         endpoint = f"{self.client_url}/api/benchmark/status/{task_id}"
         try:
-            resp = requests.get(endpoint, timeout=10)
+            resp = requests.get(endpoint, timeout=CALL_TIMEOUT)
             resp.raise_for_status()
             return resp.json()
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
-    def get_results(self, task_id: str) -> dict:
-        """Retrieves the results once the task is finished."""
+    def get_results(self, task_id: str, files: list = None) -> dict:
+        """
+        Retrieves the results once the task is finished. With files (file name
+        patterns), only the matching files are returned.
+        """
         endpoint = f"{self.client_url}/api/benchmark/results/{task_id}"
+        params = {"files": ",".join(files)} if files else None
+        try:
+            resp = requests.get(endpoint, params=params, timeout=CALL_TIMEOUT)
+            resp.raise_for_status()
+            return resp.json()
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def get_summary(self, task_id: str) -> dict:
+        """
+        Retrieves the summary reduced by the agent for a task launched with reduce.
+
+        Returns:
+            dict: { status: 'finished', task_id, summary } or error
+        """
+        endpoint = f"{self.client_url}/api/benchmark/summary/{task_id}"
         try:
-            resp = requests.get(endpoint, timeout=10)
+            resp = requests.get(endpoint, timeout=CALL_TIMEOUT)
             resp.raise_for_status()
             return resp.json()
         except Exception as e:
-            return {"status": "error", "message": str(e)}
\ No newline at end of file
+            return {"status": "error", "message": str(e)}
+
+    def health(self, timeout: float = 2.0) -> dict:
+        """
+        Probes the agent. A short timeout keeps readiness polling responsive
+        while a node is still booting.
+
+        Returns:
+            dict: { status: 'ok', ... } or error
+        """
+        endpoint = f"{self.client_url}/api/health"
+        try:
+            resp = requests.get(endpoint, timeout=timeout)
+            resp.raise_for_status()
+            return resp.json()
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def get_inventory(self) -> dict:
+        """
+        Retrieves the node's hardware facts (cores, NUMA layout, memory) and
+        current load, memory and free disk.
+
+        Returns:
+            dict: { status: 'ok', inventory } or error
+        """
+        resp = self.health(timeout=CALL_TIMEOUT)
+        if resp.get("status") != "ok":
+            return resp
+        return {"status": "ok", "inventory": resp.get("inventory", {})}
+
+    def start_metrics(self, interval: float = 1.0) -> dict:
+        """
+        Starts a /proc capture on the node, aligned on wall-clock multiples of interval.
+
+        Returns:
+            dict: { status, capture_id } or error
+        """
+        endpoint = f"{self.client_url}/api/metrics/start"
+        payload = {"secret_key": self.secret_key, "interval": interval}
+        try:
+            resp = requests.post(endpoint, json=payload, timeout=CALL_TIMEOUT)
+            resp.raise_for_status()
+            return resp.json()
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def stop_metrics(self, capture_id: str) -> dict:
+        """Stops a running capture."""
+        endpoint = f"{self.client_url}/api/metrics/stop"
+        payload = {"secret_key": self.secret_key, "capture_id": capture_id}
+        try:
+            resp = requests.post(endpoint, json=payload, timeout=CALL_TIMEOUT)
+            resp.raise_for_status()
+            return resp.json()
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def get_metrics(self, capture_id: str) -> dict:
+        """
+        Downloads a stopped capture.
+
+        Returns:
+            dict: { status: 'finished', content: bytes } or error
+        """
+        endpoint = f"{self.client_url}/api/metrics/{capture_id}"
+        try:
+            resp = requests.get(endpoint, timeout=CALL_TIMEOUTS["metrics"])
+            resp.raise_for_status()
+            return {"status": "finished", "content": resp.content}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def relay(self, operation: str, items: list, timeout: float = 120) -> dict:
+        """
+        Asks a relay agent to forward one operation to many nodes.
+
+        Returns:
+            dict: { status: 'ok', responses: [...] } (same order as items) or error
+        """
+        endpoint = f"{self.client_url}/api/relay/{operation}"
+        payload = {"secret_key": self.secret_key, "requests": items}
+        try:
+            resp = requests.post(endpoint, json=payload, timeout=timeout)
+            resp.raise_for_status()
+            return resp.json()
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+
+def _encoded_metrics(resp: dict) -> dict:
+    """A get_metrics answer with its binary content in base64, so that relays can pass it as JSON."""
+    if "content" in resp:
+        resp = dict(resp, content=base64.b64encode(resp["content"]).decode())
+    return resp
+
+
+# Operations that can be sent to many agents at once, directly or through relays.
+# Each request is a dict with the target 'node' and the operation's parameters.
+OPERATIONS = {
+    "health": lambda api, r: api.health(),
+    "init": lambda api, r: api.init_benchmark(r.get("pre_cmd_exec", ""), r.get("profile"),
+                                           r.get("timeout")),
+    "launch": lambda api, r: api.launch_benchmark(r["task_id"], r["command"], r.get("start_at"),
+                                               r.get("collect"), r.get("reduce", False),
+                                               r.get("timeout")),
+    "cancel": lambda api, r: api.cancel_benchmark(r["task_id"]),
+    "status": lambda api, r: api.get_status(r["task_id"]),
+    "results": lambda api, r: api.get_results(r["task_id"], r.get("files")),
+    "summary": lambda api, r: api.get_summary(r["task_id"]),
+    "metrics_start": lambda api, r: api.start_metrics(r.get("interval", 1.0)),
+    "metrics_stop": lambda api, r: api.stop_metrics(r["capture_id"]),
+    "metrics": lambda api, r: _encoded_metrics(api.get_metrics(r["capture_id"])),
+}
+
+
+class AgentPool:
+    """
+    Sends an operation to many agents and returns their answers in order.
+    Without relays, every agent is called directly from a thread pool. With
+    relays, nodes are split among them by a stable hash and each relay gets
+    one batched request for its share, so the caller only talks to the relays.
+    """
+
+    def __init__(self, secret_key: str, relays=None, workers: int = WORKERS):
+        self.secret_key = secret_key
+        self.relays = list(relays or [])
+        self.workers = workers
+
+    def relay_for(self, node: str) -> str:
+        return self.relays[zlib.crc32(node.encode()) % len(self.relays)]
+
+    def _direct(self, operation: str, items: list) -> list:
+        def _call(r):
+            return OPERATIONS[operation](BenchmarkAPI(agent_url(r["node"]), self.secret_key), r)
+
+        if len(items) <= 1:
+            return [_call(r) for r in items]
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(items))) as pool:
+            return list(pool.map(_call, items))
+
+    def call(self, operation: str, items: list) -> list:
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{operation}'.")
+        if not self.relays or not items:
+            return self._direct(operation, items)
+
+        batches = {}
+        for i, r in enumerate(items):
+            batches.setdefault(self.relay_for(r["node"]), []).append(i)
+
+        def _forward(item):
+            relay, indices = item
+            batch = [items[i] for i in indices]
+            resp = BenchmarkAPI(agent_url(relay), self.secret_key).relay(
+                operation, batch, timeout=relay_timeout(operation, len(batch)))
+            answers = resp.get("responses") if resp.get("status") == "ok" else None
+            if answers is None or len(answers) != len(indices):
+                error = {"status": "error", "message": f"relay {relay}: {resp.get('message')}"}
+                answers = [error] * len(indices)
+            return indices, answers
+
+        responses = [None] * len(items)
+        with ThreadPoolExecutor(max_workers=len(batches)) as pool:
+            for indices, answers in pool.map(_forward, batches.items()):
+                for i, answer in zip(indices, answers):
+                    responses[i] = answer
+        return responses
@@ -1,40 +1,82 @@
+from config_handler import LOOPBACK
+from plugins import get_type
+
+
 class CmdBuilder:
-    def __init__(self, benchmark):
+    def __init__(self, benchmark, inventory=None):
         self.benchmark = benchmark
+        # node -> inventory reported by its agent (see BenchmarkAPI.get_inventory)
+        self.inventory = inventory or {}
+
+    def cores(self, ip):
+        """Core count of a node from its inventory, or None when unknown."""
+        # Loopback MPI hosts are the target node itself.
+        if ip in LOOPBACK and self.benchmark.target_nodes:
+            ip = self.benchmark.target_nodes[0]
+        return self.inventory.get(ip, {}).get("cores")
+
+    def resolve_slots(self) -> list:
+        """
+        Returns [(ip, slots)] for the hostfile. Hosts without a slot count get
+        one slot per core of the node; explicit counts are checked against the
+        node when its inventory is known.
+        Raises ValueError when a count cannot be derived, or when mpirun would
+        refuse to start more processes than slots without --oversubscribe.
+        """
+        oversubscribe = "--oversubscribe" in (self.benchmark.mpi_args or "")
+        hosts = []
+        for h in self.benchmark.mpi_hosts:
+            cores = self.cores(h.ip)
+            slots = h.slots
+            if slots is None:
+                if not cores:
+                    raise ValueError(f"No slot count for {h.ip} and no inventory to derive it from.")
+                slots = cores
+            elif cores and slots > cores:
+                print(f"[{self.benchmark.id}] {h.ip} has {cores} cores but {slots} slots.")
+            hosts.append((h.ip, slots))
+
+        total = sum(slots for _, slots in hosts)
+        procs = self.benchmark.mpi_processes or 0
+        if hosts and procs > total and not oversubscribe:
+            raise ValueError(f"{procs} MPI processes for {total} slots; "
+                             f"add --oversubscribe to mpi_args to allow it.")
+        return hosts
+
+    def hostfile_cmd(self) -> str:
+        """Shell command writing hostfile.txt from the resolved MPI hosts."""
+        entries = [f'echo "{ip} slots={slots}" >> hostfile.txt' for ip, slots in self.resolve_slots()]
+        return " && ".join(["touch hostfile.txt"] + entries)
+
+    def mpi_command(self, program: str) -> str:
+        mpi_args = (self.benchmark.mpi_args.strip() if self.benchmark.mpi_args else "")
+        # The agent tags its tasks with BENCH_TASK_ID; exporting it marks the
+        # remote ranks too, so that a cancelled task can find them.
+        main_cmd = f"mpirun -np {self.benchmark.mpi_processes} --hostfile hostfile.txt -x BENCH_TASK_ID"
+        if mpi_args:
+            main_cmd += f" {mpi_args}"
+        if program:
+            main_cmd += f" {program}"
+        return main_cmd
+
+    def pre_cmd(self, steps) -> str:
+        """Optional user pre-command, then the given steps."""
+        if self.benchmark.pre_cmd_exec:
+            steps = [self.benchmark.pre_cmd_exec] + list(steps)
+        return " && ".join(steps)
 
     def build(self) -> dict:
+        """
+        Returns { pre_cmd, command_line, collect }. collect lists the file
+        patterns the agent sends back; None means every file.
+        """
         # Custom benchmark: just forward
         if self.benchmark.command_line:
             return {
                 "pre_cmd": self.benchmark.pre_cmd_exec or "",
-                "command_line": self.benchmark.command_line
+                "command_line": self.benchmark.command_line,
+                "collect": None
             }
 
-        # OpenMPI benchmark
-        mpi_procs = self.benchmark.mpi_processes
-        mpi_args = (self.benchmark.mpi_args.strip() if self.benchmark.mpi_args else "")
-        bench_type = (self.benchmark.type.strip() if self.benchmark.type else "")
-
-        main_cmd = f"mpirun -np {mpi_procs} --hostfile hostfile.txt"
-        if mpi_args:
-            main_cmd += f" {mpi_args}"
-        if bench_type:
-            main_cmd += f" {bench_type}"
-
-        # Build hostfile generator
-        host_entries = [
-            f'echo "{h.ip} slots={h.slots}" >> hostfile.txt'
-            for h in self.benchmark.mpi_hosts
-        ]
-        hostfile_cmd = " && ".join(host_entries)
-
-        # Pre-cmd: optional user pre, then create hostfile
-        if self.benchmark.pre_cmd_exec:
-            pre = f"{self.benchmark.pre_cmd_exec} && touch hostfile.txt && {hostfile_cmd}"
-        else:
-            pre = f"touch hostfile.txt && {hostfile_cmd}"
-
-        return {
-            "pre_cmd": pre,
-            "command_line": main_cmd
-        }
+        # Typed benchmark: the plugin builds the pre-steps and command
+        return get_type(self.benchmark.type).build(self)
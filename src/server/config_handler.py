@@ -1,11 +1,53 @@
+"""
+Loads the cluster instances of a YAML config.
+
+A cluster instance or a benchmark may declare a 'sweep': a mapping of axes
+to lists of values, or to "A..B" integer ranges (bounds included). The entry
+is expanded once per point of the product of its axes, first axis outermost.
+A mapping value binds several names at once (e.g. the cores, memory and VM
+count of one layout). In the other fields, {expr} placeholders are replaced
+by the value of expr: a bound name, or integer arithmetic (+ - * // %) on
+bound names. A field that is a single placeholder takes the value itself
+(a number stays a number). Braces that are not such an expression, like a
+shell ${VAR}, are left as they are. A benchmark's sweep also sees the names
+bound by its cluster's sweep:
+
+  - name: "netpipe-{vms}vm"
+    sweep:
+      layout:
+        - {cores: 1, memory: 2048, vms: 8}
+        - {cores: 2, memory: 4096, vms: 4}
+    vm_layout: {cores: "{cores}", memory: "{memory}", count: "{vms}"}
+    benchmark:
+      - id: "{100 + i}"
+        sweep: {i: "0..{vms - 1}"}
+        target_nodes: ["192.168.1.{30 + i}"]
+        mpi_hosts: ["127.0.0.1:1", "192.168.1.{30 + (i + 1) % vms}:1"]
+
+target_nodes and mpi_hosts entries also accept host ranges:
+"192.168.1.{30..33}:2" stands for the four entries .30 to .33.
+
+Sweeps are expanded lazily, one point at a time (iter_cluster_instances).
+"""
+import re
+import ast
+import operator
 import yaml
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
+
+LOOPBACK = ("127.0.0.1", "localhost")
+
+PLACEHOLDER_RE = re.compile(r"\{([^{}]+)\}")
+HOST_RANGE_RE = re.compile(r"\{(-?\d+)\.\.(-?\d+)\}")
+AXIS_RANGE_RE = re.compile(r"^\s*(-?\d+)\s*\.\.\s*(-?\d+)\s*$")
+OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+             ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod}
 
 @dataclass
 class MPIHost:
     ip: str
-    slots: int
+    slots: Optional[int] = None  # None: derived from the node's core count
 
 @dataclass
 class BenchmarkInstance:
@@ -17,6 +59,33 @@ class BenchmarkInstance:
     mpi_hosts: List[MPIHost] = field(default_factory=list)
     mpi_args: str = ""
     command_line: Optional[str] = None
+    params: Dict = field(default_factory=dict)  # benchmark type settings (see plugins.py)
+    profile: Optional[Union[str, Dict]] = None  # node performance profile (see client/profiles.py)
+    timeout: Optional[float] = None  # wall-clock limit of a run, in seconds
+
+    def nodes(self) -> List[str]:
+        """Target nodes plus remote MPI hosts (loopback hosts are the target node itself)."""
+        out = list(self.target_nodes)
+        for h in self.mpi_hosts:
+            if h.ip not in LOOPBACK and h.ip not in out:
+                out.append(h.ip)
+        return out
+
+@dataclass
+class VMLayout:
+    cores: int
+    memory: int  # MB per VM
+    count: int
+    domains: Optional[List[str]] = None  # defaults to vm1 ... vm8
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "VMLayout":
+        return cls(
+            cores=int(data["cores"]),
+            memory=int(data["memory"]),
+            count=int(data["count"]),
+            domains=data.get("domains")
+        )
 
 @dataclass
 class ClusterInstance:
@@ -24,28 +93,147 @@ class ClusterInstance:
     run_count: int
     pre_process_cmd: str
     benchmarks: List[BenchmarkInstance] = field(default_factory=list)
+    vm_layout: Optional[VMLayout] = None
+    exclusive: bool = False  # never run alongside other cluster instances
+    pre_process_local: bool = False  # pre_process_cmd only touches the cluster's own nodes
 
     @classmethod
-    def from_dict(cls, data: Dict) -> "ClusterInstance":
+    def from_dict(cls, data: Dict, bindings: Dict = None) -> "ClusterInstance":
+        """bindings: the names bound by the cluster's sweep point, for its benchmarks' sweeps."""
         benches = []
         for b in data.get("benchmark", []):
-            benches.extend(parse_benchmark(b))
+            if not b.get("sweep"):
+                benches.extend(parse_benchmark(b))
+                continue
+            entry = {k: v for k, v in b.items() if k != "sweep"}
+            for point in sweep_points(b["sweep"], bindings):
+                benches.extend(parse_benchmark(substitute(entry, point)))
+        ids = [bm.id for bm in benches]
+        duplicates = sorted({str(i) for i in ids if ids.count(i) > 1})
+        if duplicates:
+            raise ValueError(f"Cluster instance '{data['name']}': duplicate benchmark id(s) "
+                             f"{', '.join(duplicates)}.")
         return cls(
             name=data["name"],
             run_count=data.get("run_count", 1),
             pre_process_cmd=data.get("pre_process_cmd", ""),
-            benchmarks=benches
+            benchmarks=benches,
+            vm_layout=VMLayout.from_dict(data["vm_layout"]) if data.get("vm_layout") else None,
+            exclusive=bool(data.get("exclusive", False)),
+            pre_process_local=bool(data.get("pre_process_local", False))
         )
 
+    def nodes(self) -> List[str]:
+        """Every node involved in this cluster instance, in config order."""
+        out = []
+        for bm in self.benchmarks:
+            out.extend(n for n in bm.nodes() if n not in out)
+        return out
+
+# ========================= Sweeps ============================
+def evaluate(expr: str, bindings: Dict):
+    """
+    Value of a placeholder expression: a bound name, or integer arithmetic on
+    bound names and numbers. None when expr is anything else.
+    """
+    try:
+        tree = ast.parse(expr.strip(), mode="eval").body
+    except SyntaxError:
+        return None
+
+    def value(node):
+        if isinstance(node, ast.Name):
+            return bindings[node.id]
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node.value
+        if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+            return OPERATORS[type(node.op)](value(node.left), value(node.right))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -value(node.operand)
+        raise KeyError(expr)
+
+    try:
+        return value(tree)
+    except (KeyError, TypeError, ZeroDivisionError):
+        return None
+
+
+def substitute(value, bindings: Dict):
+    """Replaces the placeholders in the strings of value (and of its nested lists and mappings)."""
+    if isinstance(value, str):
+        whole = PLACEHOLDER_RE.fullmatch(value)
+        if whole:
+            result = evaluate(whole.group(1), bindings)
+            if result is not None:
+                return result
+
+        def replace(m):
+            result = evaluate(m.group(1), bindings)
+            return m.group(0) if result is None else str(result)
+        return PLACEHOLDER_RE.sub(replace, value)
+    if isinstance(value, list):
+        return [substitute(v, bindings) for v in value]
+    if isinstance(value, dict):
+        return {k: substitute(v, bindings) for k, v in value.items()}
+    return value
+
+
+def axis_values(spec) -> list:
+    """The values of a sweep axis: a list, or an "A..B" range."""
+    if isinstance(spec, list):
+        return spec
+    m = AXIS_RANGE_RE.match(str(spec))
+    if not m:
+        raise ValueError(f"Invalid sweep axis {spec!r}: expected a list or an \"A..B\" range.")
+    a, b = int(m.group(1)), int(m.group(2))
+    return list(range(a, b + 1) if a <= b else range(a, b - 1, -1))
+
+
+def sweep_points(sweep: Dict, bindings: Dict = None):
+    """
+    Yields the bindings of each point of a sweep, extending the given ones.
+    An axis may use the names bound by the axes before it.
+    """
+    bindings = dict(bindings or {})
+    if not sweep:
+        yield bindings
+        return
+    axes = list(sweep.items())
+    name, spec = axes[0]
+    for value in axis_values(substitute(spec, bindings)):
+        point = dict(bindings, **value) if isinstance(value, dict) else dict(bindings, **{name: value})
+        yield from sweep_points(dict(axes[1:]), point)
+
+
+def expand_host_ranges(entries) -> list:
+    """'192.168.1.{30..33}:2' -> the entries for .30, .31, .32 and .33."""
+    out = []
+    for e in entries:
+        m = HOST_RANGE_RE.search(str(e))
+        if not m:
+            out.append(e)
+            continue
+        a, b = int(m.group(1)), int(m.group(2))
+        step = 1 if b >= a else -1
+        out.extend(expand_host_ranges(
+            [f"{str(e)[:m.start()]}{i}{str(e)[m.end():]}" for i in range(a, b + step, step)]))
+    return out
+
+
 def parse_mpi_hosts(entries: List[str]) -> List[MPIHost]:
-    return [MPIHost(ip=e.split(":" )[0], slots=int(e.split(":" )[1])) for e in entries]
+    """Parses 'ip:slots' entries; a bare 'ip' leaves the slot count to the node inventory."""
+    hosts = []
+    for e in expand_host_ranges(entries):
+        ip, _, slots = str(e).partition(":")
+        hosts.append(MPIHost(ip=ip, slots=int(slots) if slots else None))
+    return hosts
 
 
 def parse_benchmark(b: Dict) -> List[BenchmarkInstance]:
-    target_nodes = b["target_nodes"]
+    target_nodes = expand_host_ranges(b["target_nodes"])
     # Accept both keys for pre-command
     pre_cmd = b.get("pre_cmd_exec") or b.get("pre_process_cmd")
-    instances = b.get("instances", 1)
+    instances = int(b.get("instances", 1))
 
     if b.get("command_line"):
         command_line = b["command_line"]
@@ -53,7 +241,7 @@ def parse_benchmark(b: Dict) -> List[BenchmarkInstance]:
         mpi_hosts = []
         mpi_args = ""
     else:
-        mpi_procs = b["mpi_processes"]
+        mpi_procs = b.get("mpi_processes")
         mpi_args = b.get("mpi_args", "")
         mpi_hosts = parse_mpi_hosts(b.get("mpi_hosts", []))
         command_line = None
@@ -69,15 +257,40 @@ def parse_benchmark(b: Dict) -> List[BenchmarkInstance]:
             mpi_processes=mpi_procs,
             mpi_hosts=mpi_hosts,
             mpi_args=mpi_args,
-            command_line=command_line
+            command_line=command_line,
+            params=dict(b.get("params") or {}),
+            profile=b.get("profile"),
+            timeout=float(b["timeout"]) if b.get("timeout") else None
         ))
     return out
 
 
-def load_cluster_instances(file_path: str) -> List[ClusterInstance]:
+def iter_cluster_instances(file_path: str):
+    """
+    Yields the cluster instances of a config file, building each sweep point
+    only when it is reached.
+    :raises ValueError: for an invalid sweep or a duplicate cluster name.
+    """
     with open(file_path) as f:
         data = yaml.safe_load(f)
-    return [ClusterInstance.from_dict(c) for c in data.get("cluster_instances", [])]
+    names = set()
+    for c in data.get("cluster_instances", []):
+        if c.get("sweep"):
+            entry = {k: v for k, v in c.items() if k != "sweep"}
+            clusters = (ClusterInstance.from_dict(substitute(entry, point), point)
+                        for point in sweep_points(c["sweep"]))
+        else:
+            clusters = [ClusterInstance.from_dict(c)]
+        for cluster in clusters:
+            if cluster.name in names:
+                raise ValueError(f"Duplicate cluster instance name '{cluster.name}' "
+                                 f"(a sweep needs a placeholder in the name).")
+            names.add(cluster.name)
+            yield cluster
+
+
+def load_cluster_instances(file_path: str) -> List[ClusterInstance]:
+    return list(iter_cluster_instances(file_path))
 
 if __name__ == "__main__":
     import sys
@@ -1,15 +1,38 @@
 #!/usr/bin/env python3
 import os
+import json
+import base64
 import time
-import threading
+import shutil
 import subprocess
 import argparse
 
-from config_handler import load_cluster_instances
+from config_handler import iter_cluster_instances
 from cmd_builder import CmdBuilder
-from benchmark_api import BenchmarkAPI
+from benchmark_api import AgentPool, node_slug
+from sampler import ProcSampler, merge_samples
+from hypervisor import DEFAULT_DOMAINS, start_host_sampler
+from vm_controller import VMController
+from tracing import Tracer, NULL_TRACER, format_summary, handler_track
+from journal import CampaignJournal, cluster_fingerprint
+from scheduler import (Scheduler, cluster_job, order_runs, file_order, layout_key, layout_setups,
+                       host_pre_process)
+from plugins import SUMMARY_FILE
+from result_store import ResultStore, MANIFEST
+from live import LiveView, abort_on_output, abort_when_idle
+from node_health import NodeHistory, HISTORY_FILE, DEFAULT_THRESHOLD, low_nodes, substitute_nodes
 
 SECRET_KEY = "mySecret123"
+DIRECT = AgentPool(SECRET_KEY)
+
+FINAL_STATUSES = ("finished", "error", "cancelled", "timeout")
+# A benchmark with journaled run times gets TIMEOUT_FACTOR times the longest
+# one plus TIMEOUT_MARGIN seconds.
+TIMEOUT_FACTOR = 3.0
+TIMEOUT_MARGIN = 60.0
+# Seconds past a deadline before the task is cancelled from here (the agent
+# normally stops it itself), and again before giving up on a cancelled task.
+CANCEL_GRACE = 30.0
 
 
 def start_collectl(collectl_id: str, output_file: str):
@@ -31,199 +54,832 @@ def stop_collectl(proc, log_fd, collectl_id: str):
     print(f"Collectl with ID {collectl_id} stopped.")
 
 
-def save_results(output_dir, benchmark_id, results):
+def start_metrics(backend: str, metrics_id: str, output_dir: str, interval: float = 1.0):
+    """
+    Starts resource capture for a cluster run.
+    backend 'proc' samples /proc natively into metrics.bin,
+    backend 'collectl' keeps the collectl subprocess writing collectl.log.
+    Returns a (backend, handle) pair for stop_metrics.
+    """
+    if backend == "collectl":
+        return backend, start_collectl(metrics_id, os.path.join(output_dir, "collectl.log"))
+    output_file = os.path.join(output_dir, "metrics.bin")
+    sampler = ProcSampler(output_file, interval).start()
+    print(f"Sampler started with ID {metrics_id} every {interval}s. Output: {output_file}")
+    return backend, sampler
+
+
+def stop_metrics(metrics, metrics_id: str):
+    backend, handle = metrics
+    if backend == "collectl":
+        stop_collectl(*handle, metrics_id)
+        return
+    handle.stop()
+    print(f"Sampler with ID {metrics_id} stopped.")
+
+
+def start_host_metrics(domains, output_dir: str, interval: float = 1.0):
+    """
+    Samples the qemu processes of the given libvirt domains on this host into
+    <output_dir>/host.bin. Returns the sampler, or None when no domain is given.
+    """
+    if not domains:
+        return None
+    output_file = os.path.join(output_dir, "host.bin")
+    sampler = start_host_sampler(output_file, domains, interval)
+    print(f"Host sampler started for {', '.join(domains)}. Output: {output_file}")
+    return sampler
+
+
+def start_node_metrics(cluster, interval: float = 1.0, pool=DIRECT):
+    """
+    Starts a capture on every node of the cluster instance (target nodes and
+    MPI hosts), all at once. Returns a list of dicts: [{ 'node', 'capture_id' }]
+    """
+    nodes = cluster.nodes()
+    node_captures = []
+    for node, resp in zip(nodes, pool.call("metrics_start", [{"node": n, "interval": interval}
+                                                              for n in nodes])):
+        if resp.get("status") != "accepted":
+            print(f"[{node}] Metrics capture failed to start: {resp.get('message')}")
+            continue
+        node_captures.append({"node": node, "capture_id": resp["capture_id"]})
+    return node_captures
+
+
+def collect_node_metrics(node_captures, output_dir, interval: float = 1.0, pool=DIRECT):
+    """
+    Stops every node capture, then downloads them into
+    <output_dir>/nodes/<node>.bin and merges them into <output_dir>/nodes.npz
+    on a common time grid.
+    """
+    nodes_dir = os.path.join(output_dir, "nodes")
+    files = {}
+    items = [{"node": c["node"], "capture_id": c["capture_id"]} for c in node_captures]
+    pool.call("metrics_stop", items)
+    for c, res in zip(node_captures, pool.call("metrics", items)):
+        node = c["node"]
+        if res.get("status") != "finished":
+            print(f"[{node}] Failed to fetch metrics: {res.get('message')}")
+            continue
+        os.makedirs(nodes_dir, exist_ok=True)
+        path = os.path.join(nodes_dir, f"{node_slug(node)}.bin")
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(res["content"]))
+        files[node] = path
+    if files:
+        merge_samples(files, os.path.join(output_dir, "nodes.npz"), interval)
+        print(f"Node metrics merged in {os.path.join(output_dir, 'nodes.npz')}")
+
+
+def wait_for_agents(nodes, timeout: float = 600.0, interval: float = 1.0, pool=DIRECT):
+    """
+    Probes every node's agent concurrently until all of them answer.
+    Returns as soon as the last one is up, instead of sleeping a fixed delay.
+    """
+    pending = sorted(set(nodes))
+    deadline = time.monotonic() + timeout
+    while pending:
+        answers = pool.call("health", [{"node": node} for node in pending])
+        answered = [n for n, a in zip(pending, answers) if a.get("status") == "ok"]
+        for node in answered:
+            print(f"[{node}] Agent ready.")
+        pending = [n for n in pending if n not in answered]
+        if pending and time.monotonic() > deadline:
+            raise RuntimeError(f"Agents not ready after {timeout}s: {', '.join(pending)}")
+        if pending:
+            time.sleep(interval)
+
+
+def save_results(output_dir, benchmark_id, results, store=None):
+    """
+    Writes the non-empty result files of a benchmark to <output_dir>/<benchmark_id>/,
+    or into the result store (recorded in <output_dir>/manifest.json) when one is given.
+    """
+    files = [(e["filename"], e["content"]) for e in results.get("results", []) if e["content"].strip()]
+    if store:
+        store.save(output_dir, benchmark_id, files)
+        print(f"Results of {benchmark_id} stored ({len(files)} file(s), {output_dir}/{MANIFEST})")
+        return
     bench_out_dir = os.path.join(output_dir, benchmark_id)
     os.makedirs(bench_out_dir, exist_ok=True)
-    for entry in results.get("results", []):
-        fname = entry["filename"]
-        content = entry["content"]
-        if not content.strip():
-            continue
-        dest = os.path.join(bench_out_dir, fname)
+    existing = set(os.listdir(bench_out_dir))
+    for fname, content in files:
+        name = fname
         base, ext = os.path.splitext(fname)
         counter = 1
-        while os.path.exists(dest):
-            dest = os.path.join(bench_out_dir, f"{base}_{counter}{ext}")
+        while name in existing:
+            name = f"{base}_{counter}{ext}"
             counter += 1
-        with open(dest, "w") as f:
+        existing.add(name)
+        with open(os.path.join(bench_out_dir, name), "w") as f:
             f.write(content)
     print(f"Results saved in {bench_out_dir}")
 
 
-def init_benchmarks(cluster, run):
+def save_summary(output_dir, task, summary):
+    """
+    Writes the agent's summary of a task to <output_dir>/<benchmark_id>/summary.json,
+    with the node and task id that 'reducer.py fetch' needs to get the raw files.
+    """
+    bench_out_dir = os.path.join(output_dir, task['benchmark_id'])
+    os.makedirs(bench_out_dir, exist_ok=True)
+    summary = dict(summary, node=task['node'], task_id=task['task_id'])
+    with open(os.path.join(bench_out_dir, SUMMARY_FILE), "w") as f:
+        json.dump(summary, f)
+    raw = sum(e["size"] for e in summary.get("files", []))
+    print(f"Summary saved in {bench_out_dir} ({raw} bytes of raw results left on {task['node']})")
+
+
+def fetch_inventory(nodes, pool=DIRECT):
+    """
+    Asks every node's agent for its inventory. Unreachable nodes are left out.
+    Returns a dict: { node: inventory }
+    """
+    nodes = list(nodes)
+    inventory = {}
+    for node, resp in zip(nodes, pool.call("health", [{"node": n} for n in nodes])):
+        if resp.get("status") != "ok":
+            print(f"[{node}] Inventory unavailable: {resp.get('message')}")
+            continue
+        inventory[node] = resp.get("inventory", {})
+    return inventory
+
+
+def poll_status(tasks, pool=DIRECT):
+    """Fetches the status of every task in one batch. Returns the responses in order."""
+    return pool.call("status", [{"node": t['node'], "task_id": t['task_id']} for t in tasks])
+
+
+def cancel_tasks(tasks, pool=DIRECT):
+    """Cancels the tasks on their agents. Returns the responses in order."""
+    return pool.call("cancel", [{"node": t['node'], "task_id": t['task_id']} for t in tasks])
+
+
+def init_benchmarks(cluster, run, pool=DIRECT, timeout_for=None, init_timeout: float = None):
     """
     Initialize all benchmarks for this cluster/run.
-    Returns a list of dicts: [{ 'benchmark_id', 'node', 'task_id', 'command' }]
+    timeout_for(benchmark, benchmark_id) gives the run timeout of each task,
+    init_timeout limits the pre-commands on the agents.
+    Returns a list of dicts: [{ 'benchmark_id', 'node', 'task_id', 'command', 'collect', 'timeout' }]
     """
-    tasks = []
+    pending = []
+    typed_nodes = [n for bm in cluster.benchmarks if not bm.command_line for n in bm.nodes()]
+    inventory = fetch_inventory(dict.fromkeys(typed_nodes), pool)
     for bm in cluster.benchmarks:
-        cmds = CmdBuilder(bm).build()
+        try:
+            cmds = CmdBuilder(bm, inventory).build()
+        except ValueError as e:
+            print(f"[{bm.id}] Invalid benchmark definition: {e}")
+            continue
         pre_cmd = cmds.get("pre_cmd", "")
         main_cmd = cmds.get("command_line", "")
         for node in bm.target_nodes:
-            bid = f"{bm.id}_{node.replace('.', '_')}"
-            client_url = f"http://{node}:5000"
-            api = BenchmarkAPI(client_url, SECRET_KEY)
+            bid = f"{bm.id}_{node_slug(node)}"
             print(f"[{bid}] Initializing on {node}")
-            resp = api.init_benchmark(pre_cmd)
-            if resp.get("status") != "accepted":
-                print(f"[{bid}] Init failed: {resp.get('message')}")
-                continue
-            tid = resp.get("task_id")
-            tasks.append({
-                "benchmark_id": bid,
-                "node": node,
-                "task_id": tid,
-                "command": main_cmd
-            })
-            print(f"[{bid}] Init task_id: {tid}")
+            timeout = timeout_for(bm, bid) if timeout_for else bm.timeout
+            pending.append(({"benchmark_id": bid, "node": node, "command": main_cmd,
+                             "collect": cmds.get("collect"), "timeout": timeout},
+                            {"node": node, "pre_cmd_exec": pre_cmd, "profile": bm.profile,
+                             "timeout": init_timeout}))
+
+    tasks = []
+    answers = pool.call("init", [request for _, request in pending])
+    for (task, _), resp in zip(pending, answers):
+        bid = task['benchmark_id']
+        if resp.get("status") != "accepted":
+            print(f"[{bid}] Init failed: {resp.get('message')}")
+            continue
+        task['task_id'] = resp.get("task_id")
+        tasks.append(task)
+        print(f"[{bid}] Init task_id: {task['task_id']}")
     return tasks
 
 
-def wait_for_ready(tasks):
+def wait_for_ready(tasks, pool=DIRECT, init_timeout: float = None):
     """
-    Poll each task until its status is 'ready' or 'error'.
+    Poll the tasks until each status is 'ready' or final ('error', or
+    'timeout' for a pre-command stopped by its agent). Tasks still
+    initializing CANCEL_GRACE seconds past init_timeout are cancelled.
     """
-    for task in tasks:
-        bid = task['benchmark_id']
-        node = task['node']
-        tid = task['task_id']
-        client_url = f"http://{node}:5000"
-        api = BenchmarkAPI(client_url, SECRET_KEY)
-        while True:
-            status = api.get_status(tid).get('status')
-            print(f"[{bid}] Init status: {status}")
-            if status in ['ready', 'error']:
+    pending = list(tasks)
+    deadline = time.time() + init_timeout + CANCEL_GRACE if init_timeout else None
+    while pending:
+        for task, resp in zip(pending, poll_status(pending, pool)):
+            status = resp.get('status')
+            print(f"[{task['benchmark_id']}] Init status: {status}")
+            if status == 'ready' or status in FINAL_STATUSES:
                 task['status'] = status
-                break
+                for issue in resp.get('profile_issues', []):
+                    print(f"[{task['benchmark_id']}] Profile not applied: {issue}")
+                if status != 'ready':
+                    print(f"[{task['benchmark_id']}] Initialization failed ({status}).")
+        pending = [t for t in pending if t.get('status') != 'ready' and t.get('status') not in FINAL_STATUSES]
+        if pending and deadline and time.time() > deadline:
+            cancel_tasks(pending, pool)
+            for task in pending:
+                print(f"[{task['benchmark_id']}] Initialization over {init_timeout:.0f}s, cancelled.")
+                task['status'] = 'timeout'
+            pending = []
+        if pending:
             time.sleep(2)
-        if task['status'] == 'error':
-            print(f"[{bid}] Initialization failed.")
 
 
-def launch_benchmarks(tasks):
+def launch_benchmarks(tasks, lead: float = 2.0, pool=DIRECT, reduce: bool = False):
     """
     Launch all initialized benchmarks in parallel.
+    With a positive lead, the launch is two-phase: every agent is armed with
+    the same start deadline, lead seconds from now, and fires on its own
+    clock, so the start skew no longer depends on request latency.
+    With reduce, the agents summarize the results when the tasks end.
+    Tasks with a timeout are stopped by their agent once it has elapsed; they
+    also get a 'deadline' (epoch seconds) after which the orchestrator
+    cancels them itself.
     Updates each dict in tasks with 'status'.
     """
-    def _launch(task):
+    start_at = time.time() + lead if lead > 0 else None
+    ready = [t for t in tasks if t.get('status') == 'ready']
+    for task in ready:
+        print(f"[{task['benchmark_id']}] Launching on {task['node']}")
+    answers = pool.call("launch", [
+        {"node": t['node'], "task_id": t['task_id'], "command": t['command'], "start_at": start_at,
+         "collect": t.get('collect'), "reduce": reduce, "timeout": t.get('timeout')}
+        for t in ready
+    ])
+    for task, resp in zip(ready, answers):
         bid = task['benchmark_id']
-        node = task['node']
-        tid = task['task_id']
-        cmd = task['command']
-        client_url = f"http://{node}:5000"
-        api = BenchmarkAPI(client_url, SECRET_KEY)
-        print(f"[{bid}] Launching on {node}")
-        resp = api.launch_benchmark(tid, cmd)
         if resp.get("status") != "accepted":
             print(f"[{bid}] Launch failed: {resp.get('message')}")
             task['status'] = 'error'
         else:
             task['status'] = 'running'
+            if task.get('timeout'):
+                task['deadline'] = (start_at or time.time()) + task['timeout'] + CANCEL_GRACE
         print(f"[{bid}] Launch response: {task['status']}")
+    if start_at is not None and time.time() > start_at:
+        print(f"Arming took longer than the {lead}s lead; late tasks started on arrival.")
 
-    threads = []
-    for task in tasks:
-        if task.get('status') != 'ready':
-            continue
-        t = threading.Thread(target=_launch, args=(task,))
-        threads.append(t)
-        t.start()
-    for t in threads:
-        t.join()
+
+def save_launch_offsets(tasks, output_dir):
+    """
+    Writes the start offsets measured by the agents (actual start minus the
+    deadline, in seconds) to <output_dir>/launch.json and prints the skew.
+    """
+    offsets = {t['benchmark_id']: t['start_offset'] for t in tasks if 'start_offset' in t}
+    if not offsets:
+        return
+    with open(os.path.join(output_dir, "launch.json"), "w") as f:
+        json.dump(offsets, f, indent=2)
+    skew = max(offsets.values()) - min(offsets.values())
+    print(f"Start skew across {len(offsets)} task(s): {skew * 1e3:.3f} ms")
 
 
-def retrieve_results(tasks, output_dir):
+def fetch_results(tasks, output_dir, pool=DIRECT, summaries: bool = False, store=None):
     """
-    Poll all running benchmarks until finished, then fetch and save results.
+    Downloads and saves the results of finished tasks, all of them in one
+    batched call. With summaries, only the agents' summaries are fetched,
+    except for the tasks that have none (no known result format, or the
+    reduction failed): their raw files are then fetched in a second batch.
+    Returns the tasks whose results were saved.
     """
-    for task in tasks:
+    saved, raw = [], list(tasks)
+    if summaries and raw:
+        raw = []
+        requests = [{"node": t['node'], "task_id": t['task_id']} for t in tasks]
+        for task, res in zip(tasks, pool.call("summary", requests)):
+            if res.get('status') == 'finished' and res['summary'].get('metrics'):
+                save_summary(output_dir, task, res['summary'])
+                saved.append(task)
+                continue
+            print(f"[{task['benchmark_id']}] No summary ({res.get('message', 'no metrics')}), "
+                  "fetching the raw results.")
+            raw.append(task)
+    if not raw:
+        return saved
+    requests = [{"node": t['node'], "task_id": t['task_id']} for t in raw]
+    for task, res in zip(raw, pool.call("results", requests)):
         bid = task['benchmark_id']
-        if task.get('status') != 'running':
-            continue
-        node = task['node']
-        tid = task['task_id']
-        client_url = f"http://{node}:5000"
-        api = BenchmarkAPI(client_url, SECRET_KEY)
-        while True:
-            status = api.get_status(tid).get('status')
-            print(f"[{bid}] Status: {status}")
-            if status in ['finished', 'error']:
-                task['status'] = status
-                break
-            time.sleep(5)
-        if task['status'] == 'error':
-            print(f"[{bid}] Benchmark failed.")
-            continue
-        res = api.get_results(tid)
         if res.get('status') != 'finished':
             print(f"[{bid}] Failed to get results: {res.get('message')}")
             continue
-        save_results(output_dir, bid, res)
+        save_results(output_dir, bid, res, store)
+        saved.append(task)
+    return saved
+
+
+def enforce_deadlines(tasks, pool=DIRECT):
+    """
+    Cancels the running tasks past their deadline, and gives up on those
+    that their agent has not stopped CANCEL_GRACE seconds after the cancel
+    (unreachable agent, process stuck in the kernel): they end as 'timeout'.
+    """
+    now = time.time()
+    overdue = [t for t in tasks if t.get('deadline') and now > t['deadline'] and 'cancelled_at' not in t]
+    for task, resp in zip(overdue, cancel_tasks(overdue, pool)):
+        print(f"[{task['benchmark_id']}] Over its {task['timeout']:.0f}s timeout, cancelling: "
+              f"{resp.get('status')}")
+        task['cancelled_at'] = now
+    for task in tasks:
+        if 'cancelled_at' in task and now > task['cancelled_at'] + CANCEL_GRACE:
+            print(f"[{task['benchmark_id']}] Still not stopped, giving up on it.")
+            task['status'] = 'timeout'
+
+
+def retrieve_results(tasks, output_dir, tracer=NULL_TRACER, pool=DIRECT, summaries: bool = False,
+                     store=None, quiet: bool = False):
+    """
+    Poll all running benchmarks until finished, then fetch and save results
+    (or only their summaries, see fetch_results).
+    Tasks stopped at their timeout or cancelled have their partial output
+    saved too, but are not marked 'saved': their run is not complete.
+    The phase timings reported by the agents are added to the tracer, and
+    the run time to the task ('run_s'). quiet only prints final statuses
+    (the live view shows the others).
+    """
+    running = [t for t in tasks if t.get('status') == 'running']
+    while running:
+        finished, stopped = [], []
+        for task, resp in zip(running, poll_status(running, pool)):
+            bid = task['benchmark_id']
+            status = resp.get('status')
+            if not quiet or status in FINAL_STATUSES:
+                print(f"[{bid}] Status: {status}")
+            if status not in FINAL_STATUSES:
+                continue
+            if status == 'cancelled' and 'cancelled_at' in task:
+                status = 'timeout'  # cancelled from here at its deadline
+            task['status'] = status
+            if 'start_offset' in resp:
+                task['start_offset'] = resp['start_offset']
+            for phase, start, end in resp.get('timings', []):
+                tracer.add_wall(phase, start, end, track=bid, node=task['node'])
+                if phase == 'run':
+                    task['run_s'] = end - start
+            if status == 'error':
+                print(f"[{bid}] Benchmark failed.")
+            elif status != 'finished':
+                print(f"[{bid}] Benchmark stopped ({status}), saving its partial output.")
+                stopped.append(task)
+            else:
+                finished.append(task)
+        start = time.monotonic()
+        fetch_results(stopped, output_dir, pool, False, store)
+        for task in fetch_results(finished, output_dir, pool, summaries, store):
+            task['saved'] = True
+        end = time.monotonic()
+        for task in stopped + finished:
+            tracer.add("download", start, end, track=task['benchmark_id'])
+        enforce_deadlines([t for t in running if t['status'] == 'running'], pool)
+        running = [t for t in running if t['status'] == 'running']
+        if running:
+            time.sleep(5)
 
 
 class BenchmarkHandler:
-    def __init__(self, config_file: str, output_folder: str):
-        self.clusters = load_cluster_instances(config_file)
+    def __init__(self, config_file: str, output_folder: str,
+                 metrics_backend: str = "proc", metrics_interval: float = 1.0,
+                 node_metrics: bool = True, host_domains=None,
+                 virsh: str = "virsh", ready_timeout: float = 600.0,
+                 launch_lead: float = 2.0, journal: CampaignJournal = None,
+                 relays=None, summaries: bool = False, store: bool = False,
+                 task_timeout: float = None, init_timeout: float = None,
+                 node_history: NodeHistory = None, spare_nodes=None,
+                 health_threshold: float = DEFAULT_THRESHOLD, live: bool = False,
+                 live_refresh: float = 10.0, abort_patterns=None, abort_idle: float = None,
+                 vm_dry_run: bool = False):
+        self.config_file = config_file
+        self.clusters = iter_cluster_instances(config_file)  # expanded as it is consumed, once
         self.output_folder = output_folder
-
-    def process_cluster(self, cluster, run):
-        cluster_dir = (
+        self.metrics_backend = metrics_backend
+        self.metrics_interval = metrics_interval
+        self.node_metrics = node_metrics
+        self.host_domains = host_domains
+        self.virsh = virsh
+        self.vm_dry_run = vm_dry_run
+        self.ready_timeout = ready_timeout
+        self.launch_lead = launch_lead
+        self.tracer = Tracer()
+        self.journal = journal
+        self.pool = AgentPool(SECRET_KEY, relays)
+        self.summaries = summaries
+        self.store = ResultStore(output_folder) if store else None
+        self.default_timeout = task_timeout
+        self.init_timeout = init_timeout
+        self.node_history = node_history
+        self.spare_nodes = list(spare_nodes or [])
+        self.health_threshold = health_threshold
+        self.checked = set()  # clusters whose nodes were checked
+        self.prepared = set()  # clusters whose node-local pre-process ran
+        self.live = live or bool(abort_patterns) or bool(abort_idle)
+        self.live_refresh = live_refresh
+        self.abort_patterns = abort_patterns
+        self.abort_idle = abort_idle
+
+    def cluster_dir(self, cluster, run):
+        return (
             os.path.join(self.output_folder, f"{cluster.name}_{run}")
             if cluster.run_count > 1 else
             os.path.join(self.output_folder, cluster.name)
         )
+
+    def pending_runs(self, cluster):
+        """Runs of the cluster that the journal does not record as done."""
+        runs = range(1, cluster.run_count + 1)
+        if not self.journal:
+            return list(runs)
+        fingerprint = cluster_fingerprint(cluster)
+        return [run for run in runs if not self.journal.run_done(
+            cluster.name, run, fingerprint, self.cluster_dir(cluster, run))]
+
+    def task_timeout(self, cluster, bm, bid):
+        """
+        Run timeout of a benchmark: its configured timeout, else derived from
+        its journaled run times, else the default (None: no limit).
+        """
+        if bm.timeout:
+            return bm.timeout
+        history = self.journal.durations(cluster.name, bid) if self.journal else []
+        if history:
+            return max(history) * TIMEOUT_FACTOR + TIMEOUT_MARGIN
+        return self.default_timeout
+
+    def check_nodes(self, cluster):
+        """
+        Warns about the cluster's nodes with a low health score and, with
+        spare nodes, substitutes them in the MPI hosts of its benchmarks.
+        Done once per cluster instance, before its runs (and before the
+        scheduler looks at its nodes), so a substitution changes the cluster
+        definition that the journal records.
+        """
+        if not self.node_history or cluster.name in self.checked:
+            return
+        self.checked.add(cluster.name)
+        scores = self.node_history.scores()
+        for node, score, metric in low_nodes(scores, cluster.nodes(), self.health_threshold):
+            print(f"[Cluster {cluster.name}] Node {node} has a low health score: "
+                  f"{score:.2f} (weakest: {metric}).")
+        if not self.spare_nodes:
+            return
+
+        def alive(node):
+            return self.pool.call("health", [{"node": node}])[0].get("status") == "ok"
+
+        mapping = substitute_nodes(cluster, scores, self.spare_nodes, self.health_threshold, alive)
+        for node, spare in mapping.items():
+            print(f"[Cluster {cluster.name}] Node {node} replaced by spare {spare}.")
+
+    def set_aside(self, cluster_dir):
+        """
+        Moves what an interrupted run left in cluster_dir to
+        <output_folder>-incomplete/, so the rerun starts from an empty folder.
+        """
+        if not os.path.isdir(cluster_dir) or not os.listdir(cluster_dir):
+            return
+        aside = os.path.join(f"{self.output_folder}-incomplete",
+                             f"{os.path.basename(cluster_dir)}-{int(time.time())}")
+        os.makedirs(os.path.dirname(aside), exist_ok=True)
+        shutil.move(cluster_dir, aside)
+        print(f"Partial results of a previous attempt moved to {aside}")
+
+    def record_run(self, cluster, run, tasks, cluster_dir):
+        """Journals the saved benchmarks, and the run once all of them completed."""
+        if not self.journal:
+            return
+        for task in tasks:
+            if task.get('saved'):
+                self.journal.record_benchmark(cluster.name, run, task['benchmark_id'],
+                                              os.path.join(cluster_dir, task['benchmark_id']),
+                                              task.get('run_s'))
+        expected = sum(len(bm.target_nodes) for bm in cluster.benchmarks)
+        saved = [t['benchmark_id'] for t in tasks if t.get('saved')]
+        if len(saved) == expected:
+            self.journal.record_run(cluster.name, run, cluster_fingerprint(cluster), saved)
+        else:
+            print(f"Cluster {cluster.name} run {run} incomplete "
+                  f"({len(saved)}/{expected} benchmarks); it will run again on resume.")
+
+    def start_live_view(self, cluster, run, tasks):
+        """Starts the live view of the run's launched tasks, when enabled (see live.py)."""
+        if not self.live:
+            return None
+        hooks = []
+        if self.abort_patterns:
+            hooks.append(abort_on_output(self.abort_patterns))
+        if self.abort_idle:
+            hooks.append(abort_when_idle(self.abort_idle))
+        types = {f"{bm.id}_{node_slug(n)}": bm.type for bm in cluster.benchmarks for n in bm.target_nodes}
+
+        def abort(task, reason):
+            print(f"[{task['benchmark_id']}] Aborting: {reason}")
+            cancel_tasks([task], self.pool)
+
+        running = [t for t in tasks if t.get('status') == 'running']
+        return LiveView(f"{cluster.name} run {run}", running, types, hooks, abort,
+                        self.metrics_interval, self.live_refresh).start()
+
+    def process_cluster(self, cluster, run):
+        cluster_dir = self.cluster_dir(cluster, run)
+        if self.journal:
+            self.set_aside(cluster_dir)
         os.makedirs(cluster_dir, exist_ok=True)
         print(f"\nProcessing Cluster {cluster.name} run {run} ...")
-
-        collectl_proc, log_fd = start_collectl(
-            f"{cluster.name}_run{run}",
-            os.path.join(cluster_dir, "collectl.log")
-        )
+        tracer = self.tracer
+        track = handler_track(cluster.name)
+
+        with tracer.span("metrics_start", track, run=run):
+            metrics = start_metrics(
+                self.metrics_backend,
+                f"{cluster.name}_run{run}",
+                cluster_dir,
+                self.metrics_interval
+            )
+            node_captures = (
+                start_node_metrics(cluster, self.metrics_interval, self.pool)
+                if self.node_metrics else []
+            )
+            host_sampler = start_host_metrics(self.host_domains, cluster_dir, self.metrics_interval)
 
         # 1. init benchmarks
-        tasks = init_benchmarks(cluster, run)
+        with tracer.span("init", track, run=run):
+            tasks = init_benchmarks(cluster, run, self.pool,
+                                    lambda bm, bid: self.task_timeout(cluster, bm, bid),
+                                    self.init_timeout)
 
         # 1b. wait until all ready
-        wait_for_ready(tasks)
+        with tracer.span("wait_ready", track, run=run):
+            wait_for_ready(tasks, self.pool, self.init_timeout)
 
         # 2. launch benchmarks
-        launch_benchmarks(tasks)
+        with tracer.span("launch", track, run=run):
+            launch_benchmarks(tasks, self.launch_lead, self.pool, self.summaries)
 
         # 3. retrieve results
-        retrieve_results(tasks, cluster_dir)
-
-        stop_collectl(collectl_proc, log_fd, f"{cluster.name}_run{run}")
+        view = self.start_live_view(cluster, run, tasks)
+        try:
+            with tracer.span("retrieve", track, run=run):
+                retrieve_results(tasks, cluster_dir, tracer, self.pool, self.summaries, self.store,
+                                 quiet=view is not None)
+        finally:
+            if view:
+                view.stop()
+        save_launch_offsets(tasks, cluster_dir)
+
+        with tracer.span("metrics_stop", track, run=run):
+            collect_node_metrics(node_captures, cluster_dir, self.metrics_interval, self.pool)
+            if host_sampler:
+                host_sampler.stop()
+            stop_metrics(metrics, f"{cluster.name}_run{run}")
+        self.record_run(cluster, run, tasks, cluster_dir)
+        if self.node_history:
+            self.node_history.record_run(cluster, run, tasks, cluster_dir, self.store)
         print(f"Cluster {cluster.name} run {run} completed.")
 
+    def prepare_vms(self, cluster):
+        """Applies the cluster's VM layout, then waits for its agents to answer."""
+        layout = cluster.vm_layout
+        print(f"[Cluster {cluster.name}] VM layout: {layout.count} VM(s), "
+              f"{layout.cores} core(s), {layout.memory} MB")
+        start = time.monotonic()
+        VMController(layout.domains, self.virsh, dry_run=self.vm_dry_run).apply(
+            layout.cores, layout.memory, layout.count)
+        wait_for_agents(cluster.nodes(), self.ready_timeout, pool=self.pool)
+        print(f"[Cluster {cluster.name}] Ready in {time.monotonic() - start:.1f}s")
+
+    def pre_process(self, cluster):
+        print(f"[Cluster {cluster.name}] Pre-process: {cluster.pre_process_cmd}")
+        with self.tracer.span("pre_process", handler_track(cluster.name)):
+            subprocess.run(cluster.pre_process_cmd, shell=True, check=True)
+
+    def setup_layout(self, cluster):
+        """Applies the cluster's VM layout and runs its host-wide pre-process command."""
+        if cluster.vm_layout:
+            with self.tracer.span("vm_layout", handler_track(cluster.name)):
+                self.prepare_vms(cluster)
+        if host_pre_process(cluster):
+            self.pre_process(cluster)
+
+    def prepare_cluster(self, cluster):
+        """Runs the cluster's node-local pre-process command, once, before its first run."""
+        if cluster.pre_process_local and cluster.pre_process_cmd and cluster.name not in self.prepared:
+            self.prepared.add(cluster.name)
+            self.pre_process(cluster)
+
+    def report_pending(self, cluster, runs):
+        if not runs:
+            print(f"[Cluster {cluster.name}] All {cluster.run_count} run(s) already done, skipping.")
+        elif len(runs) < cluster.run_count:
+            print(f"[Cluster {cluster.name}] Resuming with run(s) {', '.join(map(str, runs))}.")
+
+    def process_cluster_instance(self, cluster):
+        """Prepares a cluster instance (VM layout, pre-process) and runs its pending runs."""
+        self.check_nodes(cluster)
+        runs = self.pending_runs(cluster)
+        self.report_pending(cluster, runs)
+        if not runs:
+            return
+        self.setup_layout(cluster)
+        self.prepare_cluster(cluster)
+        for run in runs:
+            self.process_cluster(cluster, run)
+
     def process_all(self):
+        """Runs the cluster instances in configuration order, expanding each as it comes."""
         for cluster in self.clusters:
-            if cluster.pre_process_cmd:
-                print(f"[Cluster {cluster.name}] Pre-process: {cluster.pre_process_cmd}")
-                subprocess.run(cluster.pre_process_cmd, shell=True, check=True)
-            for run in range(1, cluster.run_count + 1):
-                self.process_cluster(cluster, run)
+            self.process_cluster_instance(cluster)
         print("All benchmarks completed.")
+        self.export_trace()
+
+    def export_trace(self):
+        """Writes <output_folder>/trace.json (Chrome trace) and prints the overhead summary."""
+        trace_path = os.path.join(self.output_folder, "trace.json")
+        self.tracer.export(trace_path)
+        print(format_summary(self.tracer.summary()))
+        print(f"Trace saved in {trace_path}")
+
+
+def item_layout(item) -> tuple:
+    return layout_key(item[1])
+
+
+def campaign_runs(handlers):
+    """
+    Expands the cluster instances of every config file, checks their nodes
+    (which may change their hosts) and lists their pending runs.
+    :return: ([(handler, cluster)], [pending runs of each])
+    """
+    items = [(h, c) for h in handlers for c in h.clusters]
+    for h, c in items:
+        h.check_nodes(c)
+    runs = [h.pending_runs(c) for h, c in items]
+    for (h, c), pending in zip(items, runs):
+        h.report_pending(c, pending)
+    return items, runs
+
+
+def plan_runs(handlers, order: str = "layout", rounds: int = 1) -> list:
+    """
+    Orders the pending runs of the cluster instances of every config file:
+    by layout (order_runs), so layouts shared by several files are merged,
+    or in configuration order. Ordering needs every instance, so all sweeps
+    are expanded first.
+    :return: [Unit] whose items are (handler, cluster)
+    """
+    items, runs = campaign_runs(handlers)
+    in_file_order = file_order(items, runs, item_layout)
+    units = in_file_order if order == "file" else order_runs(items, runs, rounds, item_layout)
+    print(f"[Order] {len(units)} run(s) from {len(handlers)} config file(s) with "
+          f"{layout_setups(units)} layout set-up(s) "
+          f"({layout_setups(in_file_order)} in configuration order).")
+    return units
+
+
+def process_ordered(handlers, units):
+    """Runs the units one after the other, setting a layout up only when it differs from the one in place."""
+    current = None
+    for unit in units:
+        (handler, cluster), run = unit.item, unit.run
+        if unit.layout is not None and unit.layout is not current:
+            owner, layout_cluster = unit.layout
+            owner.setup_layout(layout_cluster)
+            current = unit.layout
+        handler.prepare_cluster(cluster)
+        handler.process_cluster(cluster, run)
+    for h in handlers:
+        h.export_trace()
+    print("All benchmarks completed.")
+
+
+def parallel_jobs(units) -> list:
+    """
+    Scheduler jobs of ordered units: an exclusive job sets each layout up
+    where the order changes it, then every unit is a job on its cluster's
+    nodes. Units on disjoint nodes run side by side; units sharing nodes
+    keep their order.
+    """
+    jobs, current = [], None
+    for unit in units:
+        (handler, cluster), run = unit.item, unit.run
+        name = f"{os.path.basename(handler.output_folder)}/{cluster.name}"
+        if unit.layout is not None and unit.layout is not current:
+            owner, layout_cluster = unit.layout
+            jobs.append(cluster_job(f"{name} layout", layout_cluster,
+                                    lambda o=owner, c=layout_cluster: o.setup_layout(c), setup=True))
+            current = unit.layout
+
+        def fn(h=handler, c=cluster, r=run):
+            h.prepare_cluster(c)
+            h.process_cluster(c, r)
+        jobs.append(cluster_job(f"{name} run {run}", cluster, fn))
+    return jobs
 
 
 def main():
     parser = argparse.ArgumentParser(description="Benchmark Handler Script")
     parser.add_argument("config_folder", help="Folder containing YAML config files.")
+    parser.add_argument("--metrics", choices=["proc", "collectl"], default="proc",
+                        help="Resource capture backend (default: built-in /proc sampler).")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="Seconds between resource samples for the proc backend.")
+    parser.add_argument("--no-node-metrics", action="store_true",
+                        help="Do not capture metrics on the benchmark nodes through their agents.")
+    parser.add_argument("--host-metrics", nargs="*", metavar="DOMAIN",
+                        help="Sample the qemu processes of these libvirt domains on this host "
+                             f"(default when given without names: {' '.join(DEFAULT_DOMAINS)}).")
+    parser.add_argument("--virsh", default="virsh",
+                        help="virsh executable used to apply the clusters' vm_layout.")
+    parser.add_argument("--vm-dry-run", action="store_true",
+                        help="Print the virsh commands of the VM layouts instead of running them "
+                             "(the agents must already be up).")
+    parser.add_argument("--ready-timeout", type=float, default=600.0,
+                        help="Seconds to wait for the agents after a VM layout change.")
+    parser.add_argument("--launch-lead", type=float, default=2.0,
+                        help="Seconds between arming the agents and the synchronized start "
+                             "(0 launches each task on arrival).")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Ignore the campaign journals and run everything again.")
+    parser.add_argument("--relays", nargs="+", metavar="HOST[:PORT]",
+                        help="Agents that forward init/launch/status/results to the nodes, "
+                             "so that this process only talks to them.")
+    parser.add_argument("--summaries-only", action="store_true",
+                        help="Have the agents reduce the results to a summary.json and download "
+                             "only that; raw files stay on the agents (see reducer.py fetch).")
+    parser.add_argument("--store", action="store_true",
+                        help="Keep benchmark result files in the deduplicated, compressed result "
+                             "store of each output folder (see result_store.py view).")
+    parser.add_argument("--task-timeout", type=float,
+                        help="Seconds a benchmark may run when it has no 'timeout' in its config "
+                             "and no run time in the journal (default: no limit).")
+    parser.add_argument("--init-timeout", type=float,
+                        help="Seconds a task's pre-command and profile may take (default: no limit).")
+    parser.add_argument("--node-history", default=HISTORY_FILE,
+                        help="Per-node metric history shared by the campaigns, used to score "
+                             f"node health (default: {HISTORY_FILE}; see node_health.py).")
+    parser.add_argument("--spare-nodes", nargs="+", metavar="HOST",
+                        help="Nodes that replace the MPI hosts of low health score.")
+    parser.add_argument("--health-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Health score below which a node is reported or replaced.")
+    parser.add_argument("--live", action="store_true",
+                        help="Follow the running tasks through the agents' event streams: state "
+                             "changes, progress, resource use and output (see live.py).")
+    parser.add_argument("--live-refresh", type=float, default=10.0,
+                        help="Seconds between two updates of the live view.")
+    parser.add_argument("--abort-on", nargs="+", metavar="REGEX",
+                        help="Cancel a task as soon as a line of its output matches (implies --live).")
+    parser.add_argument("--abort-idle", type=float, metavar="SECONDS",
+                        help="Cancel a running task whose node stays idle without output for "
+                             "this long (implies --live).")
+    parser.add_argument("--order", choices=["layout", "file"], default="layout",
+                        help="Order of the runs: grouped by layout across all config files, "
+                             "in serpentine rounds (see scheduler.order_runs), or each cluster "
+                             "instance in turn, in configuration order.")
+    parser.add_argument("--rounds", type=int, default=1,
+                        help="Rounds over the layouts with --order layout: 1 sets each layout "
+                             "up once, more spread the runs of each layout over the campaign "
+                             "at the cost of about rounds x layouts set-ups.")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Run the runs of all config files concurrently, in the --order "
+                             "order, when their nodes do not overlap; layout set-ups run alone.")
     args = parser.parse_args()
+    host_domains = DEFAULT_DOMAINS if args.host_metrics == [] else args.host_metrics
 
     if not os.path.isdir(args.config_folder):
         parser.error(f"{args.config_folder} is not a valid directory.")
 
-    yaml_files = [f for f in os.listdir(args.config_folder)
-                  if f.lower().endswith(('.yaml', '.yml'))]
+    yaml_files = sorted(f for f in os.listdir(args.config_folder)
+                        if f.lower().endswith(('.yaml', '.yml')))
     base = os.getcwd()
+    node_history = NodeHistory(os.path.join(base, args.node_history))
+    handlers = []
     for yf in yaml_files:
         cfg_path = os.path.join(args.config_folder, yf)
         out_dir = os.path.join(base, os.path.splitext(yf)[0])
         os.makedirs(out_dir, exist_ok=True)
-        print(f"--> Processing {yf}")
-        handler = BenchmarkHandler(cfg_path, out_dir)
-        handler.process_all()
+        journal = CampaignJournal(os.path.join(out_dir, "journal.jsonl"), fresh=args.fresh)
+        handler = BenchmarkHandler(cfg_path, out_dir, args.metrics, args.interval,
+                                   not args.no_node_metrics, host_domains,
+                                   args.virsh, args.ready_timeout, args.launch_lead,
+                                   journal, args.relays, args.summaries_only, args.store,
+                                   args.task_timeout, args.init_timeout,
+                                   node_history, args.spare_nodes, args.health_threshold,
+                                   args.live, args.live_refresh, args.abort_on, args.abort_idle,
+                                   args.vm_dry_run)
+        handlers.append(handler)
+
+    if not args.parallel and args.order == "file":
+        for handler in handlers:
+            print(f"--> Processing {os.path.basename(handler.config_file)}")
+            handler.process_all()
+        return
+    units = plan_runs(handlers, args.order, args.rounds)
+    if not args.parallel:
+        process_ordered(handlers, units)
+    else:
+        try:
+            Scheduler(parallel_jobs(units)).run()
+        finally:
+            for h in handlers:
+                h.export_trace()
+        print("All benchmarks completed.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Host-side sampler of the qemu processes backing libvirt domains.
+
+Each domain (vm1 ... vm8 in virt-tools/vm.sh) is mapped to its qemu PID and
+to its vCPU threads (named "CPU <n>/KVM"). Every sample records, per domain:
+  <dom>/vcpu<n>_cpu   CPU time of the vCPU thread (s)
+  <dom>/vcpu<n>_wait  time the vCPU thread was runnable but waiting for a
+                      host CPU (s), i.e. what the guest sees as steal
+  <dom>/qemu_cpu      CPU time of the whole qemu process (s); the part not
+                      spent in vCPU threads is emulation and I/O work
+  <dom>/exits         cumulative KVM exits, when debugfs is readable (else NaN)
+
+Records use the sampler.py file format, so read_samples() loads them.
+
+Usage:
+    python3 hypervisor.py host.bin [--domains vm1 vm2 ...] [--interval 1.0]
+"""
+import os
+import re
+import glob
+import time
+import signal
+import argparse
+import threading
+
+from sampler import ProcSampler
+
+DEFAULT_DOMAINS = [f"vm{i}" for i in range(1, 9)]
+PID_DIRS = ["/run/libvirt/qemu", "/var/run/libvirt/qemu"]
+VCPU_COMM_RE = re.compile(r"^CPU (\d+)/KVM$")
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+NAN = float("nan")
+
+
+def domain_pid(domain: str):
+    """Finds the qemu PID of a running domain, or None."""
+    for d in PID_DIRS:
+        try:
+            with open(os.path.join(d, f"{domain}.pid")) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+    # Fallback: look for '-name guest=<domain>' on qemu command lines.
+    for path in glob.glob("/proc/[0-9]*/cmdline"):
+        try:
+            with open(path, "rb") as f:
+                args = f.read().split(b"\0")
+        except OSError:
+            continue
+        if not args or b"qemu" not in os.path.basename(args[0]):
+            continue
+        for i, arg in enumerate(args[:-1]):
+            if arg == b"-name" and args[i + 1].split(b",")[0] in (
+                    domain.encode(), f"guest={domain}".encode()):
+                return int(path.split("/")[2])
+    return None
+
+
+def vcpu_threads(pid: int) -> dict:
+    """Maps vCPU index -> thread id for a qemu process."""
+    threads = {}
+    for task in glob.glob(f"/proc/{pid}/task/*"):
+        try:
+            with open(os.path.join(task, "comm")) as f:
+                m = VCPU_COMM_RE.match(f.read().strip())
+        except OSError:
+            continue
+        if m:
+            threads[int(m.group(1))] = int(os.path.basename(task))
+    return dict(sorted(threads.items()))
+
+
+def _cpu_seconds(stat_path: str) -> float:
+    """utime + stime of a /proc stat file, in seconds."""
+    with open(stat_path) as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK
+
+
+def _wait_seconds(schedstat_path: str) -> float:
+    with open(schedstat_path) as f:
+        return int(f.read().split()[1]) / 1e9
+
+
+def _kvm_exits(pid: int) -> float:
+    total, found = 0.0, False
+    for path in glob.glob(f"/sys/kernel/debug/kvm/{pid}-*/exits"):
+        try:
+            with open(path) as f:
+                total += float(f.read())
+                found = True
+        except (OSError, ValueError):
+            continue
+    return total if found else NAN
+
+
+class QemuReader:
+    """
+    Resolves the domains once, then samples their threads on each call.
+    Domains that are not running are skipped; a thread that disappears
+    while sampling reads as NaN.
+    """
+
+    source = "qemu"
+
+    def __init__(self, domains=None):
+        self.layout = []  # (domain, pid, {vcpu: tid})
+        self.fields = ["time", "mono"]
+        for dom in domains or DEFAULT_DOMAINS:
+            pid = domain_pid(dom)
+            if pid is None:
+                continue
+            threads = vcpu_threads(pid)
+            self.layout.append((dom, pid, threads))
+            for n in threads:
+                self.fields += [f"{dom}/vcpu{n}_cpu", f"{dom}/vcpu{n}_wait"]
+            self.fields += [f"{dom}/qemu_cpu", f"{dom}/exits"]
+
+    def sample(self) -> list:
+        values = [time.time(), time.monotonic()]
+        for dom, pid, threads in self.layout:
+            for tid in threads.values():
+                base = f"/proc/{pid}/task/{tid}"
+                try:
+                    values += [_cpu_seconds(f"{base}/stat"), _wait_seconds(f"{base}/schedstat")]
+                except (OSError, IndexError, ValueError):
+                    values += [NAN, NAN]
+            try:
+                values.append(_cpu_seconds(f"/proc/{pid}/stat"))
+            except (OSError, IndexError, ValueError):
+                values.append(NAN)
+            values.append(_kvm_exits(pid))
+        return values
+
+    def close(self):
+        pass
+
+
+def start_host_sampler(output_file: str, domains=None, interval: float = 1.0) -> ProcSampler:
+    """Starts sampling the qemu processes of the given domains in the background."""
+    return ProcSampler(output_file, interval, reader_factory=lambda: QemuReader(domains)).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="qemu vCPU thread sampler")
+    parser.add_argument("output", help="Binary sample file to write.")
+    parser.add_argument("--domains", nargs="+", default=DEFAULT_DOMAINS, help="libvirt domains.")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between samples.")
+    args = parser.parse_args()
+
+    sampler = start_host_sampler(args.output, args.domains, args.interval)
+    done = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: done.set())
+    signal.signal(signal.SIGINT, lambda *_: done.set())
+    done.wait()
+    sampler.stop()
+
+
+if __name__ == "__main__":
+    main()
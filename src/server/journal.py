@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Campaign journal: an append-only JSON-lines record of completed work.
+
+One line is appended (and fsynced) per completed unit:
+  {"unit": "benchmark", "cluster", "run", "benchmark", "sha256", "files", "run_s"}
+      a benchmark's results were saved; sha256 covers its result files
+      (or their manifest entries, when they are in the result store), and
+      run_s is the run time measured by the agent, which later campaigns
+      use to derive the benchmark's timeout
+  {"unit": "run", "cluster", "run", "fingerprint", "benchmarks"}
+      every benchmark of a cluster run finished and its metrics were stored
+
+Runs are the resume granularity: the benchmarks of a run execute together
+and share its resource capture, so re-running only some of them would
+measure a different contention. A run counts as done when its run line
+exists for the same cluster definition (fingerprint) and the result files
+still match their checksums; anything else is run again.
+
+Usage:
+    python3 journal.py journal.jsonl    lists the completed runs
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from dataclasses import asdict
+
+from result_store import stored_digest
+
+
+def cluster_fingerprint(cluster) -> str:
+    """Hash of a cluster definition, so that edited clusters are not skipped."""
+    raw = json.dumps(asdict(cluster), sort_keys=True, default=str).encode()
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def checksum_dir(path: str):
+    """
+    sha256 over the names and contents of the files in a directory.
+    :return: (hex digest, sorted file names)
+    """
+    h = hashlib.sha256()
+    names = sorted(f for f in os.listdir(path) if os.path.isfile(os.path.join(path, f)))
+    for name in names:
+        h.update(name.encode() + b"\0")
+        with open(os.path.join(path, name), "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest(), names
+
+
+def checksum_result(result_dir: str):
+    """
+    checksum_dir of a benchmark result folder or, for results kept in the
+    result store, the digest of its manifest entries.
+    :return: (hex digest, file names), or None when there are no results.
+    """
+    if os.path.isdir(result_dir):
+        return checksum_dir(result_dir)
+    return stored_digest(os.path.dirname(result_dir), os.path.basename(result_dir))
+
+
+class CampaignJournal:
+    def __init__(self, path: str, fresh: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        self.benchmarks = {}  # (cluster, run, benchmark) -> entry
+        self.runs = {}        # (cluster, run) -> entry
+        if fresh and os.path.exists(path):
+            os.remove(path)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # line cut short by a crash
+                self._index(entry)
+
+    def _index(self, entry):
+        if entry.get("unit") == "benchmark":
+            self.benchmarks[(entry["cluster"], entry["run"], entry["benchmark"])] = entry
+        elif entry.get("unit") == "run":
+            self.runs[(entry["cluster"], entry["run"])] = entry
+
+    def _append(self, entry: dict):
+        entry["time"] = time.time()
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._index(entry)
+
+    def record_benchmark(self, cluster: str, run: int, benchmark: str, result_dir: str,
+                         run_s: float = None):
+        digest, files = checksum_result(result_dir) or (None, [])
+        self._append({"unit": "benchmark", "cluster": cluster, "run": run,
+                      "benchmark": benchmark, "sha256": digest, "files": files, "run_s": run_s})
+
+    def durations(self, cluster: str, benchmark: str) -> list:
+        """Recorded run times of a benchmark, over the runs of the cluster."""
+        return [e["run_s"] for (c, _, b), e in self.benchmarks.items()
+                if c == cluster and b == benchmark and e.get("run_s")]
+
+    def record_run(self, cluster: str, run: int, fingerprint: str, benchmarks):
+        self._append({"unit": "run", "cluster": cluster, "run": run,
+                      "fingerprint": fingerprint, "benchmarks": list(benchmarks)})
+
+    def run_done(self, cluster: str, run: int, fingerprint: str, cluster_dir: str) -> bool:
+        entry = self.runs.get((cluster, run))
+        if not entry or entry["fingerprint"] != fingerprint:
+            return False
+        for bid in entry["benchmarks"]:
+            bench = self.benchmarks.get((cluster, run, bid))
+            checksum = checksum_result(os.path.join(cluster_dir, bid))
+            if not bench or checksum is None:
+                return False
+            if checksum[0] != bench["sha256"]:
+                print(f"[{cluster} run {run}] Results of {bid} changed since they were recorded.")
+                return False
+        return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python3 journal.py journal.jsonl")
+        sys.exit(1)
+    journal = CampaignJournal(sys.argv[1])
+    for (cluster, run), entry in sorted(journal.runs.items()):
+        print(f"{cluster} run {run}: {len(entry['benchmarks'])} benchmark(s), "
+              f"completed {time.ctime(entry['time'])}")
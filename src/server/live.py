@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Live view of a cluster run, fed by the agents' event streams.
+
+Each running task is followed through GET /api/benchmark/events/<task_id>
+on its agent (server-sent events, see client.py): 'state' on status
+changes, 'output' with the new lines of its logs and 'sample' with the
+node's CPU, steal and network use. Streams go straight to the agents, also
+when init/launch/status go through relays.
+
+The view prints state changes as they happen and, every refresh seconds, one
+line per task that changed: elapsed time, the throughput indicators of its
+benchmark type (current NetPIPE message size and rate, HPL progress, ...,
+see BenchmarkType.progress), the node's resource use and the last output
+line. It only adds lines, so it mixes with the rest of the handler's output
+and reads the same in a log file.
+
+Abort hooks are called with a task's view state after each of its events:
+  {"benchmark_id", "node", "status", "elapsed", "progress", "sample",
+   "new_lines", "last_line"}
+and return the reason to abort it, or None. The first reason given is passed
+to the view's abort callback (the handler cancels the task on its agent).
+
+Usage:
+    python3 live.py <node> <task_id> [TYPE]     follows one task
+"""
+import re
+import sys
+import json
+import time
+import queue
+import threading
+
+import requests
+
+from benchmark_api import agent_url
+from plugins import get_type
+
+RETRY_DELAY = 2.0  # seconds before reconnecting a dropped stream
+FINAL_STATUSES = ("finished", "error", "cancelled", "timeout")
+
+
+def read_events(url: str, read_timeout: float):
+    """Yields (event, data) from a server-sent events stream until it ends."""
+    with requests.get(url, stream=True, timeout=(5, read_timeout)) as resp:
+        resp.raise_for_status()
+        event, data = "message", []
+        for line in resp.iter_lines(decode_unicode=True):
+            if line is None:
+                continue
+            if not line:
+                if data:
+                    yield event, json.loads("\n".join(data))
+                event, data = "message", []
+            elif line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[5:].strip())
+
+
+# ========================= Abort Hooks ============================
+def abort_on_output(patterns):
+    """Aborts a task when a line of its output matches one of the regexes."""
+    regexes = [re.compile(p) for p in patterns]
+
+    def hook(state):
+        for line in state["new_lines"]:
+            if any(r.search(line) for r in regexes):
+                return f"output matched: {line.strip()[:80]}"
+        return None
+    return hook
+
+
+def abort_when_idle(seconds: float, cpu_below: float = 5.0):
+    """Aborts a running task whose node stays under cpu_below % CPU, with no output, for seconds."""
+    active = {}  # benchmark id -> last time it looked busy
+
+    def hook(state):
+        bid, now = state["benchmark_id"], time.monotonic()
+        if state["status"] != "running":
+            active.pop(bid, None)
+            return None
+        if bid not in active or state["new_lines"] or state["sample"].get("cpu", 100.0) >= cpu_below:
+            active[bid] = now
+        elif now - active[bid] > seconds:
+            return f"idle for {seconds:.0f}s"
+        return None
+    return hook
+
+
+# ========================= View ============================
+def format_state(state: dict) -> str:
+    parts = [f"{state['status']:<9}", f"{state['elapsed']:6.0f}s"]
+    if state["progress"]:
+        parts.append(" ".join(f"{k}={v}" for k, v in state["progress"].items()))
+    s = state["sample"]
+    if s:
+        parts.append(f"cpu {s['cpu']:.0f}% steal {s['steal']:.0f}% "
+                     f"net {s['net_rx']:.1f}/{s['net_tx']:.1f} MB/s")
+    if state["last_line"]:
+        parts.append("> " + state["last_line"].strip()[:60])
+    return " | ".join(parts)
+
+
+class LiveView:
+    """
+    Follows the event streams of a cluster run's tasks.
+    types maps benchmark ids to benchmark types (for their progress
+    indicators); abort(task, reason) is called once per task a hook fires on.
+    """
+
+    def __init__(self, title: str, tasks, types=None, hooks=(), abort=None,
+                 interval: float = 1.0, refresh: float = 10.0):
+        self.title = title
+        self.tasks = list(tasks)
+        self.types = types or {}
+        self.hooks = list(hooks)
+        self.abort = abort
+        self.interval = interval
+        self.refresh = refresh
+        self.events = queue.Queue()
+        self._stop = threading.Event()
+        self._consumer = None
+        self.start_time = time.monotonic()
+        self.states = {t['benchmark_id']: {
+            "benchmark_id": t['benchmark_id'], "node": t['node'], "status": "",
+            "elapsed": 0.0, "progress": {}, "sample": {}, "new_lines": [], "last_line": "",
+            "started": None, "changed": False,
+        } for t in self.tasks}
+
+    def start(self):
+        for task in self.tasks:
+            threading.Thread(target=self._follow, args=(task,), daemon=True).start()
+        self._consumer = threading.Thread(target=self._consume, daemon=True)
+        self._consumer.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._consumer:
+            self._consumer.join()
+        self._print_changes()
+
+    def _follow(self, task):
+        """Reads a task's stream into the queue, reconnecting until the task ends."""
+        url = f"{agent_url(task['node'])}/api/benchmark/events/{task['task_id']}?interval={self.interval}"
+        read_timeout = max(30.0, 10 * self.interval)
+        while not self._stop.is_set():
+            try:
+                for event, data in read_events(url, read_timeout):
+                    self.events.put((task, event, data))
+                return  # the agent ends the stream with the task
+            except (requests.RequestException, ValueError) as e:
+                self.events.put((task, "error", {"message": str(e)}))
+                self._stop.wait(RETRY_DELAY)
+
+    def _consume(self):
+        next_print = time.monotonic() + self.refresh
+        while not (self._stop.is_set() and self.events.empty()):
+            try:
+                task, event, data = self.events.get(timeout=0.5)
+                self._handle(task, event, data)
+            except queue.Empty:
+                pass
+            if time.monotonic() >= next_print:
+                self._print_changes()
+                next_print = time.monotonic() + self.refresh
+
+    def _handle(self, task, event, data):
+        bid = task['benchmark_id']
+        state = self.states[bid]
+        if event == "sample" and state["status"] in FINAL_STATUSES:
+            return
+        state["new_lines"] = []
+        if event == "state":
+            if data["status"] != state["status"]:
+                print(f"[{self.title}] {bid}: {state['status'] or 'launched'} -> {data['status']}")
+            state["status"] = data["status"]
+            if data["status"] == "running" and state["started"] is None:
+                state["started"] = time.monotonic()
+        elif event == "output":
+            state["new_lines"] = data["lines"]
+            if data["lines"]:
+                state["last_line"] = data["lines"][-1]
+                if data["file"] == "output.log":
+                    state["progress"].update(get_type(self.types.get(bid, "")).progress(data["lines"]))
+        elif event == "sample":
+            state["sample"] = data
+        elif event == "error":
+            print(f"[{self.title}] {bid}: event stream interrupted ({data['message']})")
+            return
+        if state["started"] is not None:
+            state["elapsed"] = time.monotonic() - state["started"]
+        state["changed"] = True
+        self._run_hooks(task, state)
+
+    def _run_hooks(self, task, state):
+        if task.get('aborted') or not self.abort:
+            return
+        for hook in self.hooks:
+            reason = hook(state)
+            if reason:
+                task['aborted'] = reason
+                self.abort(task, reason)
+                return
+
+    def _print_changes(self):
+        changed = [s for s in self.states.values() if s["changed"]]
+        if not changed:
+            return
+        print(f"[{self.title}] +{time.monotonic() - self.start_time:.0f}s")
+        for state in changed:
+            print(f"  {state['benchmark_id']:<28} {format_state(state)}")
+            state["changed"] = False
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python3 live.py <node> <task_id> [TYPE]")
+        sys.exit(1)
+    task = {"benchmark_id": sys.argv[2][:8], "node": sys.argv[1], "task_id": sys.argv[2]}
+    view = LiveView(sys.argv[1], [task], {task["benchmark_id"]: sys.argv[3] if len(sys.argv) > 3 else ""},
+                    refresh=2.0)
+    view.start()
+    try:
+        while not view.events.empty() or view.states[task["benchmark_id"]]["status"] not in FINAL_STATUSES:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    view.stop()
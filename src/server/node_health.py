@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Node health: a per-node metric history kept across campaigns, and a score.
+
+After each cluster run the orchestrator appends one line per node and metric
+to a JSON-lines history (node_history.jsonl in its working directory, shared
+by every campaign run from there):
+  {"node", "metric", "group", "value", "cluster", "run", "time"}
+The values come from:
+  - the benchmark results, through the plugin parsers: curve metrics are
+    reduced to their best point (peak bandwidth, lowest latency), the others
+    to their median; every node of the benchmark gets the value
+  - the run time measured by the agent (run_time)
+  - the node's resource capture: the share of CPU time stolen by the
+    hypervisor during the run (cpu_steal)
+Values of the same group are comparable: runs of the same shape, i.e. same
+cluster instance, program, process count and MPI hosts, e.g.
+  netpipe-multi-inter-8vm:NPmpi/2@127.0.0.1:1,192.168.1.251:1
+so intra-host and inter-host runs are never scored against each other; or
+"node" for the resource capture.
+
+Each value is scored against the median of its group over all nodes: the
+ratio of the two, inverted for lower-is-better metrics, or 1 - share for
+cpu_steal. A node's score for a metric is the median of its last WINDOW
+ratios, capped at 1, and only counts from MIN_SAMPLES of them on; its
+health score is its lowest metric score. A node that is consistently behind
+the others on any metric scores low, one bad run does not.
+
+The results of a cooperative run (HPL GFLOPS and time) are shared by all its
+nodes, so they only tell nodes apart across runs with different node sets;
+cpu_steal is measured on each node.
+
+Usage:
+    python3 node_health.py node_history.jsonl [--threshold 0.85]
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+
+from config_handler import MPIHost
+from benchmark_api import node_slug
+from plugins import metrics as plugin_metrics, parse_benchmark_dir, program_name
+from result_store import load_manifest
+from sampler import CPU_FIELDS, read_samples
+
+HISTORY_FILE = "node_history.jsonl"
+WINDOW = 20
+MIN_SAMPLES = 3
+DEFAULT_THRESHOLD = 0.85
+SHARES = ("cpu_steal",)  # fractions of time, scored as 1 - value
+LOWER_IS_BETTER = {"run_time", "cpu_steal"}
+
+
+def lower_is_better(metric: str) -> bool:
+    meta = plugin_metrics().get(metric)
+    return not meta.higher_is_better if meta else metric in LOWER_IS_BETTER
+
+
+def reduce_values(metric: str, values) -> float:
+    """One value per run: the best point of a curve, else the median."""
+    meta = plugin_metrics().get(metric)
+    if meta and meta.curve:
+        return float(max(values) if meta.higher_is_better else min(values))
+    return float(statistics.median(values))
+
+
+def run_group(cluster, bm) -> str:
+    """Group of a benchmark's values: its cluster instance, program, process count and MPI hosts."""
+    hosts = ",".join(sorted(f"{h.ip}:{h.slots if h.slots is not None else ''}" for h in bm.mpi_hosts))
+    return f"{cluster.name}:{program_name(bm.type)}/{bm.mpi_processes or 0}@{hosts}"
+
+
+def steal_share(path: str):
+    """Share of CPU time stolen over a node capture, or None when it is too short."""
+    _, rec = read_samples(path)
+    if len(rec) < 2:
+        return None
+    total = sum(float(rec[f][-1] - rec[f][0]) for f in CPU_FIELDS)
+    return float(rec["cpu_steal"][-1] - rec["cpu_steal"][0]) / total if total > 0 else None
+
+
+def result_metrics(result_dir: str, store=None) -> dict:
+    """
+    Parsed metrics of a benchmark result folder, reduced to one value each.
+    Results kept in the result store are read back from it.
+    """
+    try:
+        if os.path.isdir(result_dir):
+            data = parse_benchmark_dir(result_dir)
+        elif store is not None:
+            cluster_dir, bid = os.path.split(result_dir)
+            prefix = bid + "/"
+            entries = {k[len(prefix):]: e for k, e in load_manifest(cluster_dir)["files"].items()
+                       if k.startswith(prefix)}
+            with tempfile.TemporaryDirectory() as tmp:
+                for name, entry in entries.items():
+                    with open(os.path.join(tmp, name), "wb") as f:
+                        f.write(store.get(entry["sha256"]))
+                data = parse_benchmark_dir(tmp)
+        else:
+            return {}
+    except (OSError, ValueError) as e:
+        print(f"Node history: could not parse {result_dir}: {e}")
+        return {}
+    return {m: reduce_values(m, v) for m, v in data.items() if m != "size" and len(v)}
+
+
+class NodeHistory:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.records = []
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        self.records.append(json.loads(line))
+                    except ValueError:
+                        continue  # line cut short by a crash
+
+    def append(self, records):
+        now = time.time()
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                for r in records:
+                    r["time"] = now
+                    f.write(json.dumps(r) + "\n")
+            self.records.extend(records)
+
+    def record_run(self, cluster, run: int, tasks, cluster_dir: str, store=None) -> int:
+        """
+        Adds the metrics of a cluster run: those of its saved benchmarks to
+        each of their nodes, and the steal share of each node capture.
+        :return: the number of values added.
+        """
+        benchmarks = {f"{bm.id}_{node_slug(n)}": bm for bm in cluster.benchmarks for n in bm.target_nodes}
+        records = []
+
+        def add(node, metric, group, value):
+            records.append({"node": node, "metric": metric, "group": group, "value": value,
+                            "cluster": cluster.name, "run": run})
+
+        for task in tasks:
+            bm = benchmarks.get(task['benchmark_id'])
+            if not task.get('saved') or bm is None or bm.command_line:
+                continue  # custom commands: nothing to compare them with
+            group = run_group(cluster, bm)
+            values = result_metrics(os.path.join(cluster_dir, task['benchmark_id']), store)
+            if task.get('run_s'):
+                values["run_time"] = task['run_s']
+            for node in bm.nodes():
+                for metric, value in values.items():
+                    add(node, metric, group, value)
+        for node in cluster.nodes():
+            path = os.path.join(cluster_dir, "nodes", f"{node_slug(node)}.bin")
+            share = steal_share(path) if os.path.isfile(path) else None
+            if share is not None:
+                add(node, "cpu_steal", "node", share)
+        self.append(records)
+        return len(records)
+
+    def scores(self) -> dict:
+        """
+        :return: {node: {"score": lowest metric score or None,
+                         "metrics": {metric: [score, values used]}}}
+        """
+        groups = {}
+        for r in self.records:
+            groups.setdefault((r["metric"], r["group"]), []).append(r["value"])
+        medians = {k: statistics.median(v) for k, v in groups.items()}
+
+        ratios = {}  # node -> metric -> ratios, oldest first
+        for r in self.records:
+            metric, value = r["metric"], r["value"]
+            ref = medians[(metric, r["group"])]
+            if metric in SHARES:
+                ratio = 1.0 - value
+            elif not ref or not value:
+                continue
+            else:
+                ratio = ref / value if lower_is_better(metric) else value / ref
+            ratios.setdefault(r["node"], {}).setdefault(metric, []).append(ratio)
+
+        out = {}
+        for node, by_metric in ratios.items():
+            node_metrics = {m: [min(1.0, statistics.median(v[-WINDOW:])), len(v[-WINDOW:])]
+                            for m, v in by_metric.items()}
+            counted = [s for s, n in node_metrics.values() if n >= MIN_SAMPLES]
+            out[node] = {"score": min(counted) if counted else None, "metrics": node_metrics}
+        return out
+
+
+def weakest_metric(entry: dict) -> str:
+    counted = {m: s for m, (s, n) in entry["metrics"].items() if n >= MIN_SAMPLES}
+    return min(counted, key=counted.get) if counted else ""
+
+
+def low_nodes(scores: dict, nodes, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """[(node, score, weakest metric)] for the given nodes scoring below threshold."""
+    out = []
+    for node in nodes:
+        entry = scores.get(node)
+        if entry and entry["score"] is not None and entry["score"] < threshold:
+            out.append((node, entry["score"], weakest_metric(entry)))
+    return out
+
+
+def substitute_nodes(cluster, scores: dict, spares, threshold: float = DEFAULT_THRESHOLD,
+                     alive=None) -> dict:
+    """
+    Replaces the remote MPI hosts of the cluster's benchmarks that score
+    below threshold with spare nodes: the healthiest known spares first,
+    then spares without history; spares below the threshold, already in the
+    cluster or failing alive(node) are not used. Target nodes are never
+    replaced, as the results are named after them.
+    :return: {replaced node: spare}
+    """
+    targets = {n for bm in cluster.benchmarks for n in bm.target_nodes}
+    hosts = [n for n in cluster.nodes() if n not in targets]
+    bad = [node for node, _, _ in low_nodes(scores, hosts, threshold)]
+    if not bad:
+        return {}
+
+    def rank(node):
+        score = scores.get(node, {}).get("score")
+        return (score is None, -(score or 0.0))
+
+    used = set(cluster.nodes())
+    candidates = sorted((s for s in spares if s not in used
+                         and (scores.get(s, {}).get("score") is None
+                              or scores[s]["score"] >= threshold)), key=rank)
+    mapping = {}
+    for node in bad:
+        while candidates:
+            spare = candidates.pop(0)
+            if alive is None or alive(spare):
+                mapping[node] = spare
+                break
+    for bm in cluster.benchmarks:
+        bm.mpi_hosts = [MPIHost(ip=mapping.get(h.ip, h.ip), slots=h.slots) for h in bm.mpi_hosts]
+    return mapping
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Node health scores from the metric history")
+    parser.add_argument("history", nargs="?", default=HISTORY_FILE, help="Node history file.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Score below which a node is reported.")
+    args = parser.parse_args()
+    if not os.path.isfile(args.history):
+        parser.error(f"{args.history} does not exist.")
+    scores = NodeHistory(args.history).scores()
+    for node in sorted(scores, key=lambda n: (scores[n]["score"] is None, scores[n]["score"] or 0)):
+        entry = scores[node]
+        score = f"{entry['score']:.3f}" if entry["score"] is not None else "  n/a"
+        flag = " LOW" if entry["score"] is not None and entry["score"] < args.threshold else ""
+        details = ", ".join(f"{m} {s:.3f} ({n})" for m, (s, n) in sorted(entry["metrics"].items()))
+        print(f"{node:<20} {score}{flag:<4}  {details}")
+
+
+if __name__ == "__main__":
+    main()
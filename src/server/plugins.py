@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Benchmark types: how to run a benchmark and how to read its results.
+
+A benchmark's 'type' in the YAML config selects a plugin by the name of its
+program (first word of the type, e.g. "NPmpi", "xhpl", "osu_bw"). Each
+plugin declares:
+  build(builder)   the pre-steps and command, through CmdBuilder's helpers
+  collect          the files the agent sends back (fnmatch patterns)
+  parse(...)       a parser from the collected files into the results model:
+                   {metric: 1-D array}, plus "size" for curves over the
+                   message size
+  metrics          name -> Metric(label, higher_is_better, curve)
+  progress(lines)  throughput indicators read from the latest output lines
+                   while the benchmark runs (see live.py)
+
+Plugin-specific settings go in the benchmark's 'params' mapping, e.g.
+  type: "stream"
+  params: {threads: 8, source: "https://.../stream.c", array_size: 80000000}
+
+Types that no plugin knows keep the historical behaviour: the type is run
+through mpirun and every file of the task directory is collected.
+
+Usage:
+    python3 plugins.py                     lists the registered types
+    python3 plugins.py <result_dir>        parses a benchmark result folder
+"""
+import os
+import re
+import sys
+import json
+from collections import OrderedDict, namedtuple
+
+Metric = namedtuple("Metric", ["label", "higher_is_better", "curve"])
+
+LOGS = ("*.log",)
+SUMMARY_FILE = "summary.json"  # metrics reduced on the agent (see reducer.py)
+RAW_DIR = "raw"                # raw files fetched on demand next to a summary
+BENCHMARK_TYPES = OrderedDict()  # plugin name -> plugin
+PROGRAMS = {}                    # program name -> plugin
+
+
+def register(cls):
+    """Class decorator adding a plugin to the registry."""
+    plugin = cls()
+    BENCHMARK_TYPES[plugin.name] = plugin
+    for program in plugin.programs:
+        PROGRAMS[program] = plugin
+    return cls
+
+
+def program_name(bench_type: str) -> str:
+    """'/opt/osu/osu_bw -m 1:4096' -> 'osu_bw'"""
+    words = (bench_type or "").split()
+    return os.path.basename(words[0]) if words else ""
+
+
+def get_type(bench_type: str):
+    """The plugin for a benchmark type, or the generic MPI program plugin."""
+    return PROGRAMS.get(program_name(bench_type), GENERIC)
+
+
+class BenchmarkType:
+    name = ""
+    programs = ()
+    collect = None    # None: every file of the task directory
+    result_files = ()  # files read by parse
+    metrics = OrderedDict()
+
+    def pre_steps(self, benchmark) -> list:
+        """Shell commands run before the hostfile is written, after the user's pre-command."""
+        return []
+
+    def command(self, benchmark) -> str:
+        args = benchmark.params.get("args")
+        return f"{benchmark.type.strip()} {args}" if args else benchmark.type.strip()
+
+    def build(self, builder) -> dict:
+        bm = builder.benchmark
+        if not bm.mpi_processes:
+            raise ValueError(f"Type '{bm.type}' runs through mpirun and needs mpi_processes.")
+        return {
+            "pre_cmd": builder.pre_cmd(self.pre_steps(bm) + [builder.hostfile_cmd()]),
+            "command_line": builder.mpi_command(self.command(bm)),
+            "collect": list(self.collect) if self.collect else None,
+        }
+
+    def parse(self, dirpath: str, filenames) -> dict:
+        """Called when every file of result_files is in the folder."""
+        return {}
+
+    def progress(self, lines) -> dict:
+        """{indicator: value} from new output lines; empty when they tell nothing."""
+        return {}
+
+
+class MPIProgram(BenchmarkType):
+    """Any other program, run through mpirun as given."""
+    name = "mpi"
+
+
+GENERIC = MPIProgram()
+
+
+# ========================= Parsers ============================
+HPL_RESULT_RE = re.compile(
+    r"^(W[RC]\S+)\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+([\d.]+)\s+([\d.eE+-]+)\s*$", re.MULTILINE
+)
+STREAM_RE = re.compile(r"^(Copy|Scale|Add|Triad):\s+([\d.]+)", re.MULTILINE)
+OSU_HEADER_RE = re.compile(r"^#\s*Size\s+(.*)$", re.MULTILINE)
+NP_PROGRESS_RE = re.compile(r"^\s*\d+:\s+(\d+) bytes\s+\d+ times -->\s+([\d.]+) Mbps in\s+([\d.]+) usec")
+HPL_PROGRESS_RE = re.compile(r"Column=\s*(\d+)\s+Fraction=\s*([\d.]+)%\s+Gflops=\s*([\d.eE+-]+)")
+
+
+def _last_match(regex, lines):
+    for line in reversed(lines):
+        m = regex.search(line)
+        if m:
+            return m
+    return None
+
+
+def _read(path: str) -> str:
+    with open(path, "r", errors="replace") as f:
+        return f.read()
+
+
+def parse_np_file(file_path: str):
+    """
+    Reads a NetPIPE np.out table.
+    :return: Array of shape (rows, 3): message size, bandwidth (Mbps), latency (usec).
+    :raises ValueError: if the file is not a 3-column numeric table.
+    """
+    import numpy as np
+    data = np.loadtxt(file_path, ndmin=2)
+    if data.shape[1] != 3:
+        raise ValueError(f"{file_path} does not contain exactly 3 columns.")
+    return data
+
+
+def parse_hpl_output(file_path: str):
+    """
+    Extracts the result lines of an HPL output.
+    :return: Array of shape (tests, 2): time (s), GFLOPS. Empty if no result line is found.
+    """
+    import numpy as np
+    rows = HPL_RESULT_RE.findall(_read(file_path))
+    return np.array([(r[5], r[6]) for r in rows], dtype=float).reshape(-1, 2)
+
+
+def parse_stream_output(file_path: str) -> dict:
+    """:return: {kernel: best rate in MB/s} for the kernels found in a STREAM output."""
+    return {kernel.lower(): float(rate) for kernel, rate in STREAM_RE.findall(_read(file_path))}
+
+
+def parse_osu_output(file_path: str):
+    """
+    Reads the table of an OSU micro-benchmark output.
+    :return: (value column header, array of shape (rows, columns)), or (None, None)
+             when the file is not an OSU output.
+    """
+    import numpy as np
+    text = _read(file_path)
+    header = OSU_HEADER_RE.search(text)
+    if not text.startswith("# OSU") or not header:
+        return None, None
+    rows = [line.split() for line in text.splitlines() if line and not line.startswith("#")]
+    rows = [r for r in rows if r and r[0].isdigit()]
+    if not rows:
+        return header.group(1), np.empty((0, 2))
+    width = min(len(r) for r in rows)
+    return header.group(1), np.array([r[:width] for r in rows], dtype=float)
+
+
+# ========================= Plugins ============================
+@register
+class NetPIPE(BenchmarkType):
+    name = "netpipe"
+    programs = ("NPmpi",)
+    collect = ("np.out",) + LOGS
+    result_files = ("np.out",)
+    metrics = OrderedDict([
+        ("bandwidth", Metric("Bandwidth (Mbps)", True, True)),
+        ("latency", Metric("Latency (usec)", False, True)),
+    ])
+
+    def parse(self, dirpath, filenames):
+        table = parse_np_file(os.path.join(dirpath, "np.out"))
+        return {"size": table[:, 0], "bandwidth": table[:, 1], "latency": table[:, 2]}
+
+    def progress(self, lines):
+        m = _last_match(NP_PROGRESS_RE, lines)
+        return {"size": int(m.group(1)), "Mbps": float(m.group(2)), "usec": float(m.group(3))} if m else {}
+
+
+@register
+class HPL(BenchmarkType):
+    name = "hpl"
+    programs = ("xhpl",)
+    collect = ("HPL.dat",) + LOGS
+    result_files = ("output.log",)
+    metrics = OrderedDict([("gflops", Metric("GFLOPS", True, False))])
+
+    def pre_steps(self, benchmark):
+        url = benchmark.params.get("hpl_dat")
+        return [f"wget -q {url} -O HPL.dat"] if url else []
+
+    def parse(self, dirpath, filenames):
+        hpl = parse_hpl_output(os.path.join(dirpath, "output.log"))
+        return {"gflops": hpl[:, 1]} if hpl.size else {}
+
+    def progress(self, lines):
+        """Progress lines of HPL builds with progress reports, and finished tests."""
+        out = {}
+        m = _last_match(HPL_PROGRESS_RE, lines)
+        if m:
+            out = {"done": f"{float(m.group(2)):.1f}%", "gflops": float(m.group(3))}
+        m = _last_match(HPL_RESULT_RE, lines)
+        if m:
+            out = {"N": int(m.group(2)), "gflops": float(m.group(7))}
+        return out
+
+
+@register
+class STREAM(BenchmarkType):
+    """
+    OpenMP STREAM on the target node itself, not through mpirun. The thread
+    count is params.threads, else mpi_processes, else every core of the node.
+    With params.source, stream.c is downloaded and compiled as a pre-step
+    (params.array_size sets STREAM_ARRAY_SIZE).
+    """
+    name = "stream"
+    programs = ("stream", "stream_c.exe")
+    collect = LOGS
+    result_files = ("output.log",)
+    metrics = OrderedDict(
+        (f"stream_{k}", Metric(f"STREAM {k.capitalize()} (MB/s)", True, False))
+        for k in ("copy", "scale", "add", "triad")
+    )
+
+    def pre_steps(self, benchmark):
+        source = benchmark.params.get("source")
+        if not source:
+            return []
+        size = benchmark.params.get("array_size")
+        define = f" -DSTREAM_ARRAY_SIZE={int(size)}" if size else ""
+        return [f"wget -q {source} -O stream.c",
+                f"gcc -O3 -fopenmp{define} stream.c -o stream"]
+
+    def command(self, benchmark):
+        cmd = super().command(benchmark)
+        return f"./{cmd}" if benchmark.params.get("source") else cmd
+
+    def build(self, builder):
+        bm = builder.benchmark
+        threads = (bm.params.get("threads") or bm.mpi_processes
+                   or builder.cores(bm.target_nodes[0] if bm.target_nodes else ""))
+        if not threads:
+            raise ValueError("No thread count for STREAM and no inventory to derive it from.")
+        steps = self.pre_steps(bm)
+        return {
+            "pre_cmd": builder.pre_cmd(steps) if steps else (bm.pre_cmd_exec or ""),
+            "command_line": f"OMP_NUM_THREADS={int(threads)} OMP_PROC_BIND=spread {self.command(bm)}",
+            "collect": list(self.collect),
+        }
+
+    def parse(self, dirpath, filenames):
+        rates = parse_stream_output(os.path.join(dirpath, "output.log"))
+        return {f"stream_{k}": [v] for k, v in rates.items()}
+
+    def progress(self, lines):
+        m = _last_match(STREAM_RE, lines)
+        return {m.group(1): f"{float(m.group(2)):.0f} MB/s"} if m else {}
+
+
+@register
+class OSU(BenchmarkType):
+    """OSU micro-benchmarks: point-to-point and collective latency, bandwidth."""
+    name = "osu"
+    programs = ("osu_latency", "osu_bw", "osu_bibw", "osu_allreduce", "osu_alltoall",
+                "osu_bcast", "osu_allgather", "osu_reduce", "osu_gather", "osu_scatter")
+    collect = LOGS
+    result_files = ("output.log",)
+    metrics = OrderedDict([
+        ("osu_latency", Metric("Latency (us)", False, True)),
+        ("osu_bandwidth", Metric("Bandwidth (MB/s)", True, True)),
+    ])
+
+    def parse(self, dirpath, filenames):
+        header, table = parse_osu_output(os.path.join(dirpath, "output.log"))
+        if header is None or not table.size:
+            return {}
+        metric = "osu_bandwidth" if "MB/s" in header else "osu_latency"
+        return {"size": table[:, 0], metric: table[:, 1]}
+
+    def progress(self, lines):
+        for line in reversed(lines):
+            words = line.split()
+            if len(words) >= 2 and words[0].isdigit():
+                return {"size": int(words[0]), "value": float(words[1])}
+        return {}
+
+
+# ========================= Results Model ============================
+def metrics() -> OrderedDict:
+    """Every metric declared by a plugin."""
+    out = OrderedDict()
+    for plugin in BENCHMARK_TYPES.values():
+        out.update(plugin.metrics)
+    return out
+
+
+def result_files() -> set:
+    """Names of the files that a plugin parser reads, and the agent summary."""
+    names = {name for plugin in BENCHMARK_TYPES.values() for name in plugin.result_files}
+    return names | {SUMMARY_FILE}
+
+
+def parse_benchmark_dir(dirpath: str, filenames=None) -> dict:
+    """
+    Runs every plugin parser on a benchmark result folder and merges what
+    they recognize. A folder holding only the agent's summary.json gives
+    the metrics reduced on the agent. Values are numpy arrays.
+    :raises ValueError: when a result file is malformed.
+    """
+    import numpy as np
+    filenames = os.listdir(dirpath) if filenames is None else filenames
+    data = {}
+    if SUMMARY_FILE in filenames and not (set(filenames) & result_files() - {SUMMARY_FILE}):
+        with open(os.path.join(dirpath, SUMMARY_FILE)) as f:
+            summary = json.load(f)
+        return {m: np.asarray(v, dtype=float) for m, v in summary.get("metrics", {}).items()}
+    for plugin in BENCHMARK_TYPES.values():
+        if not plugin.result_files or not all(f in filenames for f in plugin.result_files):
+            continue
+        for metric, values in plugin.parse(dirpath, filenames).items():
+            data[metric] = np.asarray(values, dtype=float)
+    return data
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 1:
+        for plugin in BENCHMARK_TYPES.values():
+            print(f"{plugin.name:<10} programs: {', '.join(plugin.programs)}")
+            print(f"{'':<10} metrics:  {', '.join(plugin.metrics)}")
+        sys.exit(0)
+    for metric, values in parse_benchmark_dir(sys.argv[1]).items():
+        print(f"{metric:<16} {len(values):>4} value(s): {values[:6].tolist()}")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Agent-side result reduction.
+
+When a task is launched with reduce enabled, the agent parses its outputs
+with the benchmark type parsers (plugins.py) as soon as it finishes, and
+writes a compact summary.json next to them:
+  {"metrics": {name: [values]}, "files": [{"name", "size", "sha256"}],
+   "reduce_s": seconds}
+The orchestrator then downloads only the summary (a few kB instead of the
+raw logs and tables); the raw files stay in the agent's task directory and
+can be fetched later with the 'fetch' command below, into a raw/ subfolder
+so that the journaled checksums of the result folder still hold. The
+analysis tools read summary.json when the raw files are absent.
+
+Usage:
+    python3 reducer.py reduce <task_dir>                 writes <task_dir>/summary.json
+    python3 reducer.py fetch <result_dir> [PATTERN ...]  downloads the raw files of a
+                                                        summarized benchmark result
+                                                        into <result_dir>/raw/
+"""
+import os
+import sys
+import json
+import time
+import fnmatch
+import hashlib
+
+from plugins import SUMMARY_FILE, RAW_DIR, parse_benchmark_dir
+
+
+def file_entry(path: str) -> dict:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return {"name": os.path.basename(path), "size": os.path.getsize(path), "sha256": h.hexdigest()}
+
+
+def reduce_dir(dirpath: str, collect=None, extra: dict = None) -> dict:
+    """
+    Parses the results of a task directory and writes its summary.json.
+    Only files matching the collect patterns are listed, when there are some.
+    extra holds additional entries for the summary (e.g. the agent's profile report).
+    :return: the summary.
+    """
+    start = time.monotonic()
+    names = sorted(n for n in os.listdir(dirpath)
+                   if os.path.isfile(os.path.join(dirpath, n)) and n != SUMMARY_FILE)
+    if collect:
+        names = [n for n in names if any(fnmatch.fnmatch(n, p) for p in collect)]
+    metrics = {name: values.tolist() for name, values in parse_benchmark_dir(dirpath, names).items()}
+    summary = {
+        "metrics": metrics,
+        "files": [file_entry(os.path.join(dirpath, n)) for n in names],
+        "reduce_s": time.monotonic() - start,
+    }
+    summary.update(extra or {})
+    with open(os.path.join(dirpath, SUMMARY_FILE), "w") as f:
+        json.dump(summary, f)
+    return summary
+
+
+def fetch_raw(result_dir: str, patterns=None, secret_key: str = "mySecret123"):
+    """
+    Downloads the raw files of a summarized result from the agent that still
+    holds them into <result_dir>/raw/, and checks them against the summary's
+    checksums.
+    :return: the list of files written.
+    """
+    from benchmark_api import BenchmarkAPI, agent_url
+
+    with open(os.path.join(result_dir, SUMMARY_FILE)) as f:
+        summary = json.load(f)
+    api = BenchmarkAPI(agent_url(summary["node"]), secret_key)
+    res = api.get_results(summary["task_id"], files=patterns)
+    if res.get("status") != "finished":
+        raise RuntimeError(f"Could not fetch the raw files: {res.get('message')}")
+    expected = {e["name"]: e["sha256"] for e in summary.get("files", [])}
+    raw_dir = os.path.join(result_dir, RAW_DIR)
+    os.makedirs(raw_dir, exist_ok=True)
+    written = []
+    for entry in res.get("results", []):
+        path = os.path.join(raw_dir, entry["filename"])
+        with open(path, "w") as f:
+            f.write(entry["content"])
+        if entry["filename"] in expected and file_entry(path)["sha256"] != expected[entry["filename"]]:
+            print(f"Warning: {entry['filename']} differs from the summarized file.")
+        written.append(path)
+    return written
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("reduce", "fetch"):
+        print("Usage: python3 reducer.py reduce <task_dir> | fetch <result_dir> [PATTERN ...]")
+        sys.exit(1)
+    if sys.argv[1] == "reduce":
+        s = reduce_dir(sys.argv[2])
+        print(f"{len(s['metrics'])} metric(s) from {len(s['files'])} file(s) in {s['reduce_s'] * 1e3:.1f} ms")
+    else:
+        for path in fetch_raw(sys.argv[2], sys.argv[3:] or None):
+            print(f"Fetched {path}")
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Content-addressed result store for the orchestrator.
+
+Benchmark result files are stored once per distinct content, gzip
+compressed, under <output_folder>/.store/blobs/<sha256[:2]>/<sha256>.gz.
+Each cluster run folder keeps a manifest.json instead of the files:
+  {"files": {"<benchmark_id>/<filename>": {"sha256", "size"}}}
+so identical pre-command logs, hostfiles or empty error logs cost one blob
+for the whole campaign. Resource captures (metrics.bin, nodes.npz, ...)
+stay plain files in the run folders.
+
+The analysis tools expect the usual <cluster>_<run>/<benchmark_id>/ files:
+'view' builds that tree in another folder, decompressing each blob once and
+hard-linking it at every place it appears.
+
+Usage:
+    python3 result_store.py stats <output_folder>
+    python3 result_store.py view <output_folder> <view_folder>
+    python3 result_store.py gc <output_folder>     removes unreferenced blobs
+"""
+import os
+import sys
+import gzip
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+STORE_DIR = ".store"
+MANIFEST = "manifest.json"
+
+
+def load_manifest(cluster_dir: str) -> dict:
+    path = os.path.join(cluster_dir, MANIFEST)
+    if not os.path.isfile(path):
+        return {"files": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def stored_digest(cluster_dir: str, benchmark_id: str):
+    """
+    Digest of a benchmark's stored files, over their names and content hashes.
+    :return: (hex digest, sorted file names), or None when nothing is stored for it.
+    """
+    prefix = benchmark_id + "/"
+    files = {k[len(prefix):]: v for k, v in load_manifest(cluster_dir)["files"].items()
+             if k.startswith(prefix)}
+    if not files:
+        return None
+    h = hashlib.sha256()
+    for name in sorted(files):
+        h.update(name.encode() + b"\0" + files[name]["sha256"].encode())
+    return h.hexdigest(), sorted(files)
+
+
+def _manifests(root: str):
+    """Yields the folders under root that hold a manifest."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d != STORE_DIR)
+        if MANIFEST in filenames:
+            yield dirpath
+
+
+class ResultStore:
+    def __init__(self, root: str):
+        self.root = root
+        self.blob_dir = os.path.join(root, STORE_DIR, "blobs")
+        self._lock = threading.Lock()
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.gz")
+
+    def put(self, data: bytes) -> str:
+        """Stores data unless a blob with the same content exists. :return: its sha256."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside then renamed, so a crash never leaves a truncated blob.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(gzip.compress(data, compresslevel=6))
+        os.replace(tmp, path)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        with gzip.open(self.blob_path(digest), "rb") as f:
+            return f.read()
+
+    def save(self, cluster_dir: str, benchmark_id: str, files) -> list:
+        """
+        Stores [(filename, content)] for a benchmark and records them in the
+        run's manifest. A name already used by other content gets a _<n>
+        suffix, as plain saving does.
+        :return: the recorded names.
+        """
+        blobs = [(name, self.put(content.encode()), len(content.encode())) for name, content in files]
+        with self._lock:
+            manifest = load_manifest(cluster_dir)
+            entries = manifest["files"]
+            names = []
+            for name, digest, size in blobs:
+                base, ext = os.path.splitext(name)
+                key, counter = f"{benchmark_id}/{name}", 1
+                while key in entries and entries[key]["sha256"] != digest:
+                    key = f"{benchmark_id}/{base}_{counter}{ext}"
+                    counter += 1
+                entries[key] = {"sha256": digest, "size": size}
+                names.append(key.split("/", 1)[1])
+            os.makedirs(cluster_dir, exist_ok=True)
+            tmp = os.path.join(cluster_dir, MANIFEST + ".tmp")
+            with open(tmp, "w") as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+            os.replace(tmp, os.path.join(cluster_dir, MANIFEST))
+        return names
+
+    def stats(self) -> dict:
+        logical, files, referenced = 0, 0, set()
+        for cluster_dir in _manifests(self.root):
+            for entry in load_manifest(cluster_dir)["files"].values():
+                logical += entry["size"]
+                files += 1
+                referenced.add(entry["sha256"])
+        stored = sum(os.path.getsize(self.blob_path(d)) for d in referenced
+                     if os.path.exists(self.blob_path(d)))
+        return {"files": files, "blobs": len(referenced), "logical_bytes": logical,
+                "stored_bytes": stored}
+
+    def view(self, view_root: str) -> int:
+        """
+        Materializes the plain layout of the output folder under view_root.
+        Stored files are decompressed once into view_root/.blobs and hard-linked;
+        the other files of the output folder are hard-linked (or copied).
+        :return: the number of files placed.
+        """
+        cache = os.path.join(view_root, ".blobs")
+        os.makedirs(cache, exist_ok=True)
+        placed = 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = sorted(d for d in dirnames if d != STORE_DIR)
+            rel = os.path.relpath(dirpath, self.root)
+            for name in filenames:
+                if name == MANIFEST:
+                    continue
+                _link(os.path.join(dirpath, name), os.path.join(view_root, rel, name))
+                placed += 1
+            if MANIFEST not in filenames:
+                continue
+            for key, entry in load_manifest(dirpath)["files"].items():
+                cached = os.path.join(cache, entry["sha256"])
+                if not os.path.exists(cached):
+                    with open(cached, "wb") as f:
+                        f.write(self.get(entry["sha256"]))
+                _link(cached, os.path.join(view_root, rel, key))
+                placed += 1
+        return placed
+
+    def gc(self) -> int:
+        """Removes the blobs that no manifest references. :return: the number removed."""
+        referenced = set()
+        for cluster_dir in _manifests(self.root):
+            referenced.update(e["sha256"] for e in load_manifest(cluster_dir)["files"].values())
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.blob_dir):
+            for name in filenames:
+                if name.split(".")[0] not in referenced:
+                    os.remove(os.path.join(dirpath, name))
+                    removed += 1
+        return removed
+
+
+def _link(src: str, dest: str):
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("stats", "view", "gc") \
+            or (sys.argv[1] == "view" and len(sys.argv) != 4):
+        print("Usage: python3 result_store.py stats|gc <output_folder> | view <output_folder> <view_folder>")
+        sys.exit(1)
+    store = ResultStore(sys.argv[2])
+    if sys.argv[1] == "stats":
+        s = store.stats()
+        ratio = s["logical_bytes"] / s["stored_bytes"] if s["stored_bytes"] else 0
+        print(f"{s['files']} file(s) in {s['blobs']} blob(s): {s['logical_bytes']} bytes "
+              f"stored in {s['stored_bytes']} ({ratio:.1f}x)")
+    elif sys.argv[1] == "view":
+        print(f"{store.view(sys.argv[3])} file(s) placed under {sys.argv[3]}")
+    else:
+        print(f"{store.gc()} unreferenced blob(s) removed")
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Low-overhead /proc sampler writing fixed-width binary records.
+
+File layout:
+  8 bytes   magic b"HPCSMPL1"
+  4 bytes   little-endian header length H
+  H bytes   JSON header: {"fields": [...], "interval": s, "start": epoch, ...},
+            padded with spaces so that records start on an 8-byte boundary
+  records   one little-endian float64 per field, back to back
+
+Counters are stored raw (cumulative jiffies, sectors, bytes), so a sample is
+only a few reads and a struct.pack; rates are derived when reading. The
+reader memory-maps the records straight into a NumPy structured array.
+
+Usage:
+    python3 sampler.py output.bin [--interval 1.0] [--align]
+Runs until SIGTERM/SIGINT.
+"""
+import os
+import json
+import time
+import struct
+import signal
+import argparse
+import threading
+
+MAGIC = b"HPCSMPL1"
+
+CPU_FIELDS = ["cpu_user", "cpu_nice", "cpu_system", "cpu_idle",
+              "cpu_iowait", "cpu_irq", "cpu_softirq", "cpu_steal"]
+MEM_KEYS = {"MemTotal:": "mem_total", "MemFree:": "mem_free", "MemAvailable:": "mem_available",
+            "Buffers:": "mem_buffers", "Cached:": "mem_cached"}
+DISK_FIELDS = ["disk_reads", "disk_read_sectors", "disk_writes", "disk_write_sectors"]
+NET_FIELDS = ["net_rx_bytes", "net_rx_packets", "net_tx_bytes", "net_tx_packets"]
+FIELDS = (["time", "mono"] + CPU_FIELDS + ["ctxt"] + list(MEM_KEYS.values())
+          + DISK_FIELDS + NET_FIELDS)
+
+
+def _block_devices():
+    """Whole disks only (partitions would be counted twice), without loop/ram devices."""
+    try:
+        return {d for d in os.listdir("/sys/block") if not d.startswith(("loop", "ram"))}
+    except OSError:
+        return set()
+
+
+class ProcReader:
+    """Keeps the /proc files open and parses one sample per call."""
+
+    source = "proc"
+    fields = FIELDS
+
+    def __init__(self):
+        self.files = {name: open(f"/proc/{name}", "rb") for name in
+                      ("stat", "meminfo", "diskstats", "net/dev")}
+        self.disks = _block_devices()
+
+    def _read(self, name) -> bytes:
+        f = self.files[name]
+        f.seek(0)
+        return f.read()
+
+    def sample(self) -> list:
+        values = [time.time(), time.monotonic()]
+
+        stat = self._read("stat").split(b"\n")
+        cpu = stat[0].split()[1:9]
+        values.extend(float(v) for v in cpu)
+        values.extend([0.0] * (8 - len(cpu)))
+        ctxt = next((l.split()[1] for l in stat if l.startswith(b"ctxt ")), b"0")
+        values.append(float(ctxt))
+
+        mem = dict.fromkeys(MEM_KEYS.values(), 0.0)
+        for line in self._read("meminfo").split(b"\n"):
+            parts = line.split()
+            if parts and parts[0].decode() in MEM_KEYS:
+                mem[MEM_KEYS[parts[0].decode()]] = float(parts[1])
+        values.extend(mem.values())
+
+        disk = [0.0] * 4
+        for line in self._read("diskstats").split(b"\n"):
+            parts = line.split()
+            if len(parts) > 9 and parts[2].decode() in self.disks:
+                disk[0] += float(parts[3])
+                disk[1] += float(parts[5])
+                disk[2] += float(parts[7])
+                disk[3] += float(parts[9])
+        values.extend(disk)
+
+        net = [0.0] * 4
+        for line in self._read("net/dev").split(b"\n")[2:]:
+            if b":" not in line:
+                continue
+            iface, counters = line.split(b":", 1)
+            if iface.strip() == b"lo":
+                continue
+            parts = counters.split()
+            net[0] += float(parts[0])
+            net[1] += float(parts[1])
+            net[2] += float(parts[8])
+            net[3] += float(parts[9])
+        values.extend(net)
+        return values
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+def write_header(f, fields, **meta):
+    header = dict(meta, fields=list(fields))
+    raw = json.dumps(header).encode()
+    pad = (-(len(MAGIC) + 4 + len(raw))) % 8
+    raw += b" " * pad
+    f.write(MAGIC + struct.pack("<I", len(raw)) + raw)
+
+
+class ProcSampler:
+    """
+    Samples /proc at a fixed rate in a background thread.
+    Sampling times follow an absolute schedule, so they do not drift with the
+    time spent reading and writing.
+
+    With align=True the first sample waits for the next multiple of the interval
+    in wall-clock time, so that samplers started on several NTP-synced nodes
+    take their samples at the same instants.
+
+    reader_factory builds the object that provides 'fields', 'source',
+    sample() and close(); it defaults to the system-wide ProcReader.
+    """
+
+    def __init__(self, output_file: str, interval: float = 1.0, align: bool = False,
+                 reader_factory=ProcReader):
+        self.output_file = output_file
+        self.interval = interval
+        self.align = align
+        self.reader_factory = reader_factory
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.output_file) or ".", exist_ok=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        reader = self.reader_factory()
+        pack = struct.Struct(f"<{len(reader.fields)}d").pack
+        with open(self.output_file, "wb") as f:
+            write_header(f, reader.fields, interval=self.interval, start=time.time(),
+                         source=reader.source)
+            next_time = time.monotonic()
+            if self.align:
+                now = time.time()
+                next_time += (-now) % self.interval
+                self._stop.wait(max(0.0, next_time - time.monotonic()))
+            while not self._stop.is_set():
+                f.write(pack(*reader.sample()))
+                f.flush()
+                next_time += self.interval
+                self._stop.wait(max(0.0, next_time - time.monotonic()))
+        reader.close()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+def read_header(path: str):
+    """
+    Reads the header of a sample file.
+    :return: (header dict, byte offset of the first record)
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a sample file.")
+        (length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length).decode())
+    return header, len(MAGIC) + 4 + length
+
+
+def read_samples(path: str):
+    """
+    Memory-maps the records of a sample file.
+    A partially written last record (sampler still running) is ignored.
+    :return: (header dict, NumPy structured array with one field per column)
+    """
+    import numpy as np
+
+    header, offset = read_header(path)
+    dtype = np.dtype([(name, "<f8") for name in header["fields"]])
+    count = (os.path.getsize(path) - offset) // dtype.itemsize
+    if count <= 0:
+        return header, np.zeros(0, dtype=dtype)
+    return header, np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+
+def merge_samples(files: dict, output_file: str, interval: float = None):
+    """
+    Aligns the captures of several nodes on one time grid and saves them as a
+    single .npz dataset keyed by node.
+    :param files: dict mapping node -> sample file.
+    :return: dict with 'time' and one '<node>/<field>' array per node and field.
+             Every field is linearly interpolated on the grid covering the time
+             range shared by all nodes.
+    """
+    import numpy as np
+
+    captures = {}
+    for node, path in files.items():
+        header, rec = read_samples(path)
+        if len(rec):
+            captures[node] = (header, rec)
+    if not captures:
+        return {}
+    step = interval or max(h.get("interval", 1.0) for h, _ in captures.values())
+    start = max(rec["time"][0] for _, rec in captures.values())
+    end = min(rec["time"][-1] for _, rec in captures.values())
+    grid = np.arange(start, end + step / 2, step) if end >= start else np.empty(0)
+
+    merged = {"time": grid}
+    for node, (header, rec) in captures.items():
+        for field in header["fields"]:
+            if field not in ("time", "mono"):
+                merged[f"{node}/{field}"] = np.interp(grid, rec["time"], rec[field])
+    np.savez_compressed(output_file, **merged)
+    return merged
+
+
+def live_rates(prev: list, cur: list, fields=FIELDS) -> dict:
+    """
+    Rates between two ProcReader samples: CPU busy and steal (%), memory
+    used (MB) and network receive/transmit (MB/s).
+    """
+    a, b = dict(zip(fields, prev)), dict(zip(fields, cur))
+    dt = (b["mono"] - a["mono"]) or 1e-9
+    total = sum(b[f] - a[f] for f in CPU_FIELDS) or 1e-9
+    idle = (b["cpu_idle"] - a["cpu_idle"]) + (b["cpu_iowait"] - a["cpu_iowait"])
+    return {
+        "cpu": 100.0 * (1.0 - idle / total),
+        "steal": 100.0 * (b["cpu_steal"] - a["cpu_steal"]) / total,
+        "mem_used": (b["mem_total"] - b["mem_available"]) / 1024.0,
+        "net_rx": (b["net_rx_bytes"] - a["net_rx_bytes"]) / dt / 1e6,
+        "net_tx": (b["net_tx_bytes"] - a["net_tx_bytes"]) / dt / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/proc sampler")
+    parser.add_argument("output", help="Binary sample file to write.")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between samples.")
+    parser.add_argument("--align", action="store_true",
+                        help="Sample on wall-clock multiples of the interval.")
+    args = parser.parse_args()
+
+    sampler = ProcSampler(args.output, args.interval, args.align).start()
+    done = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: done.set())
+    signal.signal(signal.SIGINT, lambda *_: done.set())
+    done.wait()
+    sampler.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Runs cluster instances concurrently when they use disjoint nodes.
+
+Each job has a node footprint (target nodes and MPI hosts of its
+benchmarks). A job starts once none of its nodes is held by a running job
+or wanted by an earlier pending job, so instances on distinct VMs proceed
+side by side while instances sharing a node keep their configuration order
+(a wide job is never overtaken by narrower ones on its nodes).
+
+Exclusive jobs are barriers: they wait for every earlier job to finish, run
+alone, and only then let later jobs start. Layout set-ups, which reconfigure
+the VMs (vm_layout) or run a host-side pre_process_cmd, are exclusive, since
+they affect more than their own nodes; so are the runs of clusters that set
+'exclusive: true'. A pre_process_cmd declared 'pre_process_local: true' only
+touches the cluster's own nodes: it runs in the cluster's jobs instead.
+When a layout set-up fails, the jobs after it, up to the next set-up, would
+run on the wrong layout: they are skipped and reported as failed.
+
+Campaigns can also go run by run (order_runs): the runs of the cluster
+instances of every config file that share a layout (VM layout and host-wide
+pre-process command) are kept together so that each layout is set up as
+few times as possible, while still spreading every instance's runs over
+the campaign.
+"""
+import threading
+import traceback
+from collections import namedtuple, OrderedDict
+
+Job = namedtuple("Job", ["name", "nodes", "exclusive", "fn", "setup"], defaults=(False,))
+
+
+def cluster_job(name: str, cluster, fn, setup: bool = False) -> Job:
+    """Builds a job on a cluster instance's nodes; setup jobs (its layout set-up) are exclusive."""
+    return Job(name, frozenset(cluster.nodes()), bool(setup or cluster.exclusive), fn, setup)
+
+
+def host_pre_process(cluster) -> str:
+    """The cluster's pre-process command when it runs host-wide, else ""."""
+    return "" if cluster.pre_process_local else (cluster.pre_process_cmd or "")
+
+
+NO_SETUP = (None, "")
+
+# An ordered run: item is what order_runs was given for the cluster instance,
+# layout the item whose layout must be in place for the run (None: any).
+Unit = namedtuple("Unit", ["item", "run", "layout"])
+
+
+def layout_key(cluster) -> tuple:
+    """What a cluster instance sets up before its runs: its VM layout and host-wide pre-process."""
+    layout = cluster.vm_layout
+    return (layout and (layout.cores, layout.memory, layout.count, tuple(layout.domains or ())),
+            host_pre_process(cluster))
+
+
+def order_runs(items, runs, rounds: int = 1, key=layout_key) -> list:
+    """
+    Orders the runs of cluster instances; runs[i] lists the pending runs of
+    items[i], whose layout is key(items[i]). Items are grouped by layout, in
+    order of first appearance; an item without set-up (NO_SETUP) joins the
+    layout of the item before it, the one it runs on in configuration order.
+    Runs are split into 'rounds' consecutive chunks. Each round visits every
+    layout once, forward on even rounds and backward on odd ones
+    (serpentine), so that going from one round to the next keeps the layout:
+    the campaign sets up about rounds x layouts times, whatever the order of
+    the config. Within a layout, the items take turns run by run, also in
+    serpentine order, so none of them is always measured first.
+    rounds=1 sets each layout up once; more rounds spread slow drifts (host
+    temperature, background load) over the layouts.
+    :return: [Unit]
+    """
+    groups = OrderedDict()  # layout key -> [item setting it up, [(item, runs)]]
+    current = NO_SETUP
+    for item, pending in zip(items, runs):
+        k = key(item)
+        if k != NO_SETUP:
+            current = k
+            groups.setdefault(k, [item, []])
+        group = groups.setdefault(current, [None, []])
+        if pending:
+            group[1].append((item, list(pending)))
+    rounds = max(1, rounds)
+    order = []
+    for r in range(rounds):
+        layouts = [g for g in groups.values() if g[1]]
+        for owner, members in (layouts[::-1] if r % 2 else layouts):
+            chunks = [(i, p[len(p) * r // rounds: len(p) * (r + 1) // rounds]) for i, p in members]
+            for turn in range(max(len(chunk) for _, chunk in chunks)):
+                for item, chunk in (chunks[::-1] if turn % 2 else chunks):
+                    if turn < len(chunk):
+                        order.append(Unit(item, chunk[turn], owner))
+    return order
+
+
+def file_order(items, runs, key=layout_key) -> list:
+    """The runs in configuration order, each instance setting its own layout up. :return: [Unit]"""
+    return [Unit(item, run, item if key(item) != NO_SETUP else None)
+            for item, pending in zip(items, runs) for run in pending]
+
+
+def layout_setups(units) -> int:
+    """Number of layout set-ups needed to go through the units in order."""
+    setups, current = 0, None
+    for unit in units:
+        if unit.layout is not None and unit.layout is not current:
+            setups, current = setups + 1, unit.layout
+    return setups
+
+
+class Scheduler:
+    def __init__(self, jobs):
+        self.jobs = list(jobs)
+        self.errors = []  # (job name, exception)
+        self._cond = threading.Condition()
+        self._busy = set()
+
+    def _run_job(self, job: Job) -> bool:
+        """Runs a job and releases its nodes. :return: whether it succeeded."""
+        try:
+            job.fn()
+            return True
+        except Exception as e:
+            traceback.print_exc()
+            self.errors.append((job.name, e))
+            return False
+        finally:
+            with self._cond:
+                self._busy -= job.nodes
+                self._cond.notify_all()
+
+    def _next_job(self, pending):
+        """The first pending job whose nodes are neither busy nor wanted by an earlier pending job."""
+        claimed = set(self._busy)
+        for job in pending:
+            if not (job.nodes & claimed):
+                return job
+            claimed |= job.nodes
+        return None
+
+    def _run_concurrent(self, jobs):
+        pending = list(jobs)
+        threads = []
+        with self._cond:
+            while pending:
+                job = self._next_job(pending)
+                if job is None:
+                    self._cond.wait()
+                    continue
+                pending.remove(job)
+                self._busy |= job.nodes
+                print(f"[Scheduler] Starting {job.name} on {', '.join(sorted(job.nodes)) or 'no node'}")
+                t = threading.Thread(target=self._run_job, args=(job,), name=job.name)
+                threads.append(t)
+                t.start()
+        for t in threads:
+            t.join()
+
+    def run(self):
+        """
+        Runs every job. A failing job does not stop the others, except a
+        failing set-up: the jobs after it are skipped up to the next set-up.
+        :raises RuntimeError: listing the failed jobs, once all jobs are done.
+        """
+        segment = []
+        failed_setup = None
+        for job in self.jobs:
+            if job.setup:
+                failed_setup = None
+            elif failed_setup:
+                print(f"[Scheduler] Skipping {job.name}: set-up {failed_setup} failed")
+                self.errors.append((job.name, RuntimeError(f"set-up {failed_setup} failed")))
+                continue
+            if not job.exclusive:
+                segment.append(job)
+                continue
+            self._run_concurrent(segment)
+            segment = []
+            print(f"[Scheduler] Running {job.name} exclusively")
+            if not self._run_job(job) and job.setup:
+                failed_setup = job.name
+        self._run_concurrent(segment)
+        if self.errors:
+            raise RuntimeError("Failed jobs: " + ", ".join(name for name, _ in self.errors))
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Scaling harness for the orchestrator, without real nodes.
+
+Starts N stand-in agents on consecutive localhost ports, all inside this
+process. They implement the agent contract (/api/benchmark/*, /api/health,
+/api/relay/*) with simulated init and run durations, response latency and
+failure rates, and count the requests they receive. A YAML config
+targeting them is generated, handler.py runs it in a subprocess, and the
+harness reports the orchestration wall time, the request counts and the
+CPU time and peak memory of the handler process, for every N.
+
+Usage:
+    python3 simulate.py 10 100 500 [--init 1] [--run 5] [--latency 0.01]
+                        [--init-failure 0] [--run-failure 0] [--relays 0]
+                        [--output scaling.json]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import yaml
+
+from benchmark_api import AgentPool
+
+SECRET_KEY = "mySecret123"
+HANDLER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "handler.py")
+COUNTS_LOCK = threading.Lock()
+NP_OUTPUT = "".join(f"{2 ** i} {0.1 * 2 ** i:.3f} {1.0 + i:.3f}\n" for i in range(12))
+
+
+class StandInProfile:
+    """Behaviour shared by all stand-in agents. Durations are in seconds."""
+
+    def __init__(self, init=1.0, run=5.0, latency=0.0, init_failure=0.0, run_failure=0.0, seed=0):
+        self.init = init
+        self.run = run
+        self.latency = latency
+        self.init_failure = init_failure
+        self.run_failure = run_failure
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def fails(self, rate: float) -> bool:
+        with self.lock:
+            return self.random.random() < rate
+
+
+class StandInAgent:
+    """One simulated agent: task state machine driven by timestamps, no subprocess."""
+
+    def __init__(self, port: int, profile: StandInProfile, counts: Counter):
+        self.port = port
+        self.profile = profile
+        self.counts = counts
+        self.tasks = {}
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def status(self, task):
+        now = time.time()
+        if task["status"] == "initializing" and now >= task["ready_at"]:
+            task["status"] = "error" if task["init_fails"] else "ready"
+        if task["status"] in ("armed", "running") and now >= task["done_at"]:
+            task["status"] = "error" if task["run_fails"] else "finished"
+        elif task["status"] == "armed" and now >= task["start_at"]:
+            task["status"] = "running"
+        return task["status"]
+
+    def handle(self, method: str, path: str, body: dict):
+        """Returns (http status, json payload)."""
+        p = self.profile
+        if p.latency:
+            time.sleep(p.latency)
+        parts = path.strip("/").split("/")
+        if method == "GET" and path == "/api/health":
+            return 200, {"status": "ok", "tasks": len(self.tasks),
+                         "inventory": {"cores": 4, "numa": [{"node": 0, "cpus": [0, 1, 2, 3]}]}}
+        if method == "POST" and body.get("secret_key") != SECRET_KEY:
+            return 403, {"status": "error", "message": "Invalid key"}
+        if method == "POST" and path == "/api/benchmark/init":
+            tid = str(uuid.uuid4())
+            self.tasks[tid] = {"status": "initializing", "ready_at": time.time() + p.init,
+                               "init_fails": p.fails(p.init_failure)}
+            return 202, {"status": "accepted", "task_id": tid}
+        if method == "POST" and path == "/api/benchmark/launch":
+            task = self.tasks.get(body.get("task_id"))
+            if not task:
+                return 404, {"status": "error", "message": "Task ID not found"}
+            if self.status(task) != "ready":
+                return 400, {"status": "error", "message": f"Not ready ({task['status']})"}
+            start_at = float(body.get("start_at") or time.time())
+            task.update(status="armed", start_at=start_at, done_at=start_at + p.run,
+                        run_fails=p.fails(p.run_failure))
+            return 202, {"status": "accepted", "task_id": body["task_id"]}
+        if method == "GET" and parts[:3] == ["api", "benchmark", "status"]:
+            task = self.tasks.get(parts[3])
+            if not task:
+                return 404, {"status": "not found", "message": "Task ID not found"}
+            return 200, {"task_id": parts[3], "status": self.status(task)}
+        if method == "GET" and parts[:3] == ["api", "benchmark", "results"]:
+            task = self.tasks.get(parts[3])
+            if not task or self.status(task) != "finished":
+                return 400, {"status": "error", "message": "Benchmark not finished"}
+            return 200, {"task_id": parts[3], "status": "finished",
+                         "results": [{"filename": "np.out", "content": NP_OUTPUT}]}
+        if method == "POST" and parts[:2] == ["api", "relay"]:
+            items = body.get("requests") or []
+            return 200, {"status": "ok", "responses": AgentPool(SECRET_KEY).call(parts[2], items)}
+        return 404, {"status": "error", "message": "Unknown endpoint"}
+
+    def _handler_class(agent):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                path = self.path.split("?")[0]
+                endpoint = "/".join(path.split("/")[:4]) if "/benchmark/" in path else path
+                with COUNTS_LOCK:
+                    agent.counts[f"{method} {endpoint}"] += 1
+                code, payload = agent.handle(method, path, body)
+                raw = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def generate_config(nodes, run_count: int = 1, benchmarks: int = 1) -> dict:
+    """A single cluster instance running 'benchmarks' custom commands on every node."""
+    return {"cluster_instances": [{
+        "name": f"sim-{len(nodes)}",
+        "pre_process_cmd": "",
+        "run_count": run_count,
+        "benchmark": [{"id": f"b{i}", "command_line": "simulated", "target_nodes": list(nodes)}
+                      for i in range(1, benchmarks + 1)],
+    }]}
+
+
+def run_scenario(n: int, profile: StandInProfile, base_port: int = 20000, relays: int = 0,
+                 launch_lead: float = 2.0, keep_dir: str = None) -> dict:
+    """Runs handler.py against n stand-in agents and returns the measurements."""
+    counts = Counter()
+    agents = [StandInAgent(base_port + i, profile, counts).start() for i in range(n)]
+    nodes = [f"127.0.0.1:{a.port}" for a in agents]
+    workdir = keep_dir or tempfile.mkdtemp(prefix=f"sim{n}-")
+    cfg_dir = os.path.join(workdir, "cfg")
+    os.makedirs(cfg_dir, exist_ok=True)
+    with open(os.path.join(cfg_dir, f"sim-{n}.yaml"), "w") as f:
+        yaml.safe_dump(generate_config(nodes), f)
+
+    cmd = [sys.executable, HANDLER, cfg_dir, "--no-node-metrics", "--fresh",
+           "--launch-lead", str(launch_lead)]
+    if relays:
+        cmd += ["--relays"] + nodes[:relays]
+    start = time.monotonic()
+    with open(os.path.join(workdir, "handler.log"), "w") as log:
+        proc = subprocess.Popen(cmd, cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 gives the resource usage of this child alone.
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.monotonic() - start
+    for a in agents:
+        a.stop()
+
+    result_dirs = os.path.join(workdir, f"sim-{n}", f"sim-{n}")
+    saved = (sum(os.path.isdir(os.path.join(result_dirs, d)) for d in os.listdir(result_dirs))
+             if os.path.isdir(result_dirs) else 0)
+    return {
+        "nodes": n,
+        "relays": relays,
+        "returncode": proc.returncode,
+        "wall_s": wall,
+        "master_cpu_s": usage.ru_utime + usage.ru_stime,
+        "master_maxrss_kb": usage.ru_maxrss,  # kB on Linux
+        "requests": sum(counts.values()),
+        "requests_by_endpoint": dict(counts),
+        "results_saved": saved,
+        "workdir": workdir,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Orchestrator scaling harness")
+    parser.add_argument("nodes", type=int, nargs="+", help="Numbers of stand-in agents to try.")
+    parser.add_argument("--init", type=float, default=1.0, help="Simulated init duration (s).")
+    parser.add_argument("--run", type=float, default=5.0, help="Simulated run duration (s).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Added latency per request (s).")
+    parser.add_argument("--init-failure", type=float, default=0.0, help="Init failure rate.")
+    parser.add_argument("--run-failure", type=float, default=0.0, help="Run failure rate.")
+    parser.add_argument("--relays", type=int, default=0,
+                        help="Number of stand-ins that also act as relays for the others.")
+    parser.add_argument("--base-port", type=int, default=20000)
+    parser.add_argument("--output", help="Write the measurements to this JSON file.")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'nodes':>6} {'wall (s)':>9} {'cpu (s)':>8} {'rss (MB)':>9} {'requests':>9} {'saved':>6}")
+    for n in args.nodes:
+        profile = StandInProfile(args.init, args.run, args.latency,
+                                 args.init_failure, args.run_failure)
+        r = run_scenario(n, profile, args.base_port, args.relays)
+        results.append(r)
+        print(f"{n:>6} {r['wall_s']:>9.1f} {r['master_cpu_s']:>8.2f} "
+              f"{r['master_maxrss_kb'] / 1024:>9.1f} {r['requests']:>9} {r['results_saved']:>6}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Measurements saved in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Tests of the concurrent job scheduler (run with: python -m pytest src/server)."""
+import time
+import threading
+
+import pytest
+
+from scheduler import Job, Scheduler
+
+
+def recording_job(name, nodes, started, duration=0.0, exclusive=False, setup=False, fail=False):
+    def fn():
+        started.append(name)
+        time.sleep(duration)
+        if fail:
+            raise RuntimeError(f"{name} failed")
+    return Job(name, frozenset(nodes), exclusive, fn, setup)
+
+
+def test_jobs_sharing_a_node_keep_their_order():
+    # B only needs n2, which is free while X runs, but A wants n2 first.
+    started = []
+    jobs = [recording_job("X", ["n1"], started, duration=0.2),
+            recording_job("A", ["n1", "n2"], started),
+            recording_job("B", ["n2"], started)]
+    Scheduler(jobs).run()
+    assert started == ["X", "A", "B"]
+
+
+def test_disjoint_jobs_run_side_by_side():
+    barrier = threading.Barrier(2, timeout=5)
+    jobs = [Job("A", frozenset(["n1"]), False, barrier.wait),
+            Job("B", frozenset(["n2"]), False, barrier.wait)]
+    Scheduler(jobs).run()  # would time out if A and B ran one after the other
+
+
+def test_failed_setup_skips_its_jobs_up_to_the_next_setup():
+    started = []
+    jobs = [recording_job("setup1", ["n1"], started, exclusive=True, setup=True, fail=True),
+            recording_job("run1", ["n1"], started),
+            recording_job("exclusive-run", ["n1"], started, exclusive=True),
+            recording_job("setup2", ["n1"], started, exclusive=True, setup=True),
+            recording_job("run2", ["n1"], started)]
+    scheduler = Scheduler(jobs)
+    with pytest.raises(RuntimeError):
+        scheduler.run()
+    assert started == ["setup1", "setup2", "run2"]
+    assert [name for name, _ in scheduler.errors] == ["setup1", "run1", "exclusive-run"]
+
+
+def test_failed_run_does_not_stop_the_others():
+    started = []
+    jobs = [recording_job("run1", ["n1"], started, fail=True),
+            recording_job("run2", ["n1"], started)]
+    scheduler = Scheduler(jobs)
+    with pytest.raises(RuntimeError):
+        scheduler.run()
+    assert started == ["run1", "run2"]
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Phase timing of a campaign, exported as a Chrome trace.
+
+Every phase is a span with monotonic start/end times on a named track: the
+orchestrator's own phases go on a "handler:<cluster>" track per cluster
+instance, and the phases reported by the agents (init, armed wait, run) on
+one track per task. Agents report
+wall-clock times; they are placed on the orchestrator's monotonic timeline
+through the wall/monotonic pair taken when the tracer is created.
+
+The exported file opens in chrome://tracing or https://ui.perfetto.dev.
+
+Usage:
+    python3 tracing.py trace.json    prints the summary of an exported trace
+"""
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+HANDLER_TRACK = "handler"
+BENCHMARK_PHASE = "run"
+
+
+def handler_track(cluster: str) -> str:
+    return f"{HANDLER_TRACK}:{cluster}"
+
+
+def is_handler_track(track: str) -> bool:
+    return track == HANDLER_TRACK or track.startswith(HANDLER_TRACK + ":")
+
+
+class Tracer:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.spans = []  # (track, name, start, end, args)
+        self._lock = threading.Lock()
+        self._mono0 = time.monotonic()
+        self._wall0 = time.time()
+
+    def add(self, name: str, start: float, end: float, track: str = HANDLER_TRACK, **args):
+        """Records a span given in monotonic seconds."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.spans.append((track, name, start, end, args))
+
+    def add_wall(self, name: str, start: float, end: float, track: str, **args):
+        """Records a span given in wall-clock seconds (e.g. reported by an agent)."""
+        offset = self._mono0 - self._wall0
+        self.add(name, start + offset, end + offset, track, **args)
+
+    @contextmanager
+    def span(self, name: str, track: str = HANDLER_TRACK, **args):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.monotonic(), track, **args)
+
+    def to_chrome(self) -> dict:
+        tracks = {}
+        events = []
+        for track, name, start, end, args in sorted(self.spans, key=lambda s: s[2]):
+            tid = tracks.setdefault(track, len(tracks) + 1)
+            events.append({
+                "name": name, "cat": track, "ph": "X", "pid": 1, "tid": tid,
+                "ts": (start - self._mono0) * 1e6, "dur": (end - start) * 1e6,
+                "args": args,
+            })
+        for track, tid in tracks.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid,
+                           "args": {"name": track}})
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"wall_start": self._wall0, "summary": self.summary()}}
+
+    def export(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_chrome(), f)
+
+    def summary(self) -> dict:
+        return summarize_spans(self.spans)
+
+
+def _union_length(intervals) -> float:
+    total, cur_start, cur_end = 0.0, None, None
+    for start, end in sorted(intervals):
+        if cur_end is None or start > cur_end:
+            if cur_end is not None:
+                total += cur_end - cur_start
+            cur_start, cur_end = start, end
+        else:
+            cur_end = max(cur_end, end)
+    if cur_end is not None:
+        total += cur_end - cur_start
+    return total
+
+
+def summarize_spans(spans) -> dict:
+    """
+    Splits the campaign wall time into benchmark time (union of the agents'
+    run phases) and orchestration overhead, and gives the share of each
+    handler phase. Handler phases are sequential unless cluster instances
+    were scheduled concurrently, so their shares add up to at most 100% in a
+    sequential campaign.
+    """
+    if not spans:
+        return {}
+    start = min(s[2] for s in spans)
+    end = max(s[3] for s in spans)
+    wall = max(end - start, 1e-9)
+    bench = _union_length([(s[2], s[3]) for s in spans if not is_handler_track(s[0])
+                           and s[1] == BENCHMARK_PHASE])
+    phases = {}
+    for track, name, s, e, args in spans:
+        if is_handler_track(track):
+            phases[name] = phases.get(name, 0.0) + (e - s)
+    return {
+        "wall_s": wall,
+        "benchmark_s": bench,
+        "overhead_s": wall - bench,
+        "benchmark_pct": 100.0 * bench / wall,
+        "overhead_pct": 100.0 * (wall - bench) / wall,
+        "phases": {name: {"seconds": d, "pct": 100.0 * d / wall}
+                   for name, d in sorted(phases.items(), key=lambda p: -p[1])},
+    }
+
+
+def format_summary(summary: dict) -> str:
+    if not summary:
+        return "No spans recorded."
+    lines = [
+        f"Campaign wall time: {summary['wall_s']:.1f}s",
+        f"  benchmark  {summary['benchmark_s']:10.1f}s  {summary['benchmark_pct']:5.1f}%",
+        f"  overhead   {summary['overhead_s']:10.1f}s  {summary['overhead_pct']:5.1f}%",
+        "Handler phases:",
+    ]
+    for name, p in summary["phases"].items():
+        lines.append(f"  {name:<20} {p['seconds']:10.1f}s  {p['pct']:5.1f}%")
+    return "\n".join(lines)
+
+
+NULL_TRACER = Tracer(enabled=False)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python3 tracing.py trace.json")
+        sys.exit(1)
+    with open(sys.argv[1]) as f:
+        print(format_summary(json.load(f).get("otherData", {}).get("summary", {})))
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+VM lifecycle controller: the Python counterpart of virt-tools/vm.sh.
+
+Applies a VM layout (cores, memory, number of VMs) to the libvirt domains:
+every domain is shut down, then the first <count> ones are reconfigured and
+started. Each step runs concurrently across domains instead of one VM after
+another, and shutdown completion is detected by polling 'virsh domstate'.
+
+All libvirt calls go through the 'virsh' executable given to the controller.
+In dry-run mode nothing is called: the commands are printed and recorded in
+the controller's log, and the domains' states are simulated (every domain
+starts running), so the sequence of a layout change can be checked without
+a hypervisor.
+
+Usage:
+    python3 vm_controller.py <cores> <memory_mb> <count> [--virsh PATH] [--dry-run]
+"""
+import os
+import re
+import time
+import tempfile
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_DOMAINS = [f"vm{i}" for i in range(1, 9)]
+VCPU_RE = re.compile(r"<vcpu[^>]*>[^<]*</vcpu>")
+
+
+class VMError(Exception):
+    """A virsh command failed or a domain did not reach the expected state."""
+
+
+class VMController:
+    def __init__(self, domains=None, virsh: str = "virsh",
+                 shutdown_timeout: float = 120.0, poll_interval: float = 1.0,
+                 dry_run: bool = False):
+        self.domains = list(domains or DEFAULT_DOMAINS)
+        self.virsh = virsh
+        self.shutdown_timeout = shutdown_timeout
+        self.poll_interval = poll_interval
+        self.dry_run = dry_run
+        self.log = []  # virsh arguments of every call, in order
+        self._states = {}  # dry run: simulated domain states
+
+    def _simulate(self, command: str, args) -> str:
+        """What a dry-run virsh call returns, updating the simulated domain states."""
+        domain = args[0] if args else ""
+        if command == "domstate":
+            return self._states.get(domain, "running") + "\n"
+        if command in ("shutdown", "destroy"):
+            self._states[domain] = "shut off"
+        elif command == "start":
+            self._states[domain] = "running"
+        elif command == "dumpxml":
+            return f"<domain><name>{domain}</name><vcpu placement='static'>1</vcpu></domain>\n"
+        return ""
+
+    def _run(self, *args) -> str:
+        self.log.append(args)
+        if self.dry_run:
+            if args[0] != "domstate":
+                print(f"[dry-run] {self.virsh} {' '.join(args)}")
+            return self._simulate(args[0], args[1:])
+        proc = subprocess.run([self.virsh, *args], capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise VMError(f"virsh {' '.join(args)}: {proc.stderr.strip() or proc.stdout.strip()}")
+        return proc.stdout
+
+    def state(self, domain: str) -> str:
+        return self._run("domstate", domain).strip()
+
+    def shutdown(self, domain: str):
+        """
+        Gracefully shuts a domain down and waits until it is off. A domain
+        still running after shutdown_timeout is forcefully stopped.
+        """
+        if self.state(domain) != "running":
+            return
+        print(f"Shutting down {domain}...")
+        self._run("shutdown", domain)
+        deadline = time.monotonic() + self.shutdown_timeout
+        while self.state(domain) == "running":
+            if time.monotonic() > deadline:
+                print(f"{domain} did not shut down in {self.shutdown_timeout}s, destroying it.")
+                self._run("destroy", domain)
+                break
+            time.sleep(self.poll_interval)
+        print(f"{domain} is now shut off.")
+
+    def configure(self, domain: str, cores: int, memory_mb: int):
+        """
+        Sets the vCPU count and memory of a stopped domain's persistent config.
+        vCPUs are set by rewriting the <vcpu> element, as vm.sh does, so that
+        both the maximum and the current count follow whether they grow or shrink.
+        """
+        print(f"Updating {domain}: {cores} CPU core(s) and {memory_mb} MB memory...")
+        xml = self._run("dumpxml", domain)
+        xml = VCPU_RE.sub(f'<vcpu placement="static" current="{cores}">{cores}</vcpu>', xml)
+        with tempfile.NamedTemporaryFile("w", suffix=f"-{domain}.xml", delete=False) as f:
+            f.write(xml)
+        try:
+            self._run("define", f.name)
+        finally:
+            os.remove(f.name)
+        mem_kib = str(memory_mb * 1024)
+        self._run("setmaxmem", domain, mem_kib, "--config")
+        self._run("setmem", domain, mem_kib, "--config")
+
+    def start(self, domain: str):
+        print(f"Starting {domain}...")
+        self._run("start", domain)
+
+    def _parallel(self, fn, domains, *args):
+        """Runs fn(domain, *args) for every domain concurrently; raises the first error."""
+        if not domains:
+            return
+        with ThreadPoolExecutor(max_workers=len(domains)) as pool:
+            futures = [pool.submit(fn, d, *args) for d in domains]
+            errors = [f.exception() for f in futures if f.exception()]
+        if errors:
+            raise VMError("; ".join(str(e) for e in errors))
+
+    def apply(self, cores: int, memory_mb: int, count: int):
+        """
+        Shuts every domain down, then reconfigures and starts the first count.
+        :return: the list of started domains.
+        """
+        if count > len(self.domains):
+            raise VMError(f"Only {len(self.domains)} VMs are available.")
+        self._parallel(self.shutdown, self.domains)
+        selected = self.domains[:count]
+        self._parallel(self._configure_and_start, selected, cores, memory_mb)
+        return selected
+
+    def _configure_and_start(self, domain: str, cores: int, memory_mb: int):
+        self.configure(domain, cores, memory_mb)
+        self.start(domain)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply a VM layout to the libvirt domains")
+    parser.add_argument("cores", type=int, help="vCPUs per VM.")
+    parser.add_argument("memory", type=int, help="Memory per VM in MB.")
+    parser.add_argument("count", type=int, help="Number of VMs to start.")
+    parser.add_argument("--virsh", default="virsh", help="virsh executable to use.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print the virsh commands instead of running them.")
+    args = parser.parse_args()
+    started = VMController(virsh=args.virsh, dry_run=args.dry_run).apply(
+        args.cores, args.memory, args.count)
+    print(f"Started: {', '.join(started) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()